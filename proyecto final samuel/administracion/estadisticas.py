@@ -0,0 +1,273 @@
+"""
+Estadísticas consolidadas por día (EstadisticaDiaria)
+
+El comando `consolidar_estadisticas` calcula, para cada día cerrado, los
+doctores creados, los usuarios registrados por tipo, las horas de atención
+ofrecidas, las excepciones creadas por tipo y las citas por estado. La
+primera ejecución recorre toda la historia; las siguientes agregan los días
+nuevos y recalculan los últimos días, porque el estado de las citas cambia
+después de atenderlas.
+
+La página de estadísticas suma filas de esa tabla por mes. Los días sin
+marca de consolidación (hoy, los posteriores a la última ejecución y los
+huecos que dejó un recálculo manual) se calculan en vivo con TruncMonth
+sobre las tablas de origen, así que el resultado es correcto aunque el
+comando no se haya ejecutado nunca.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import dateformat, timezone
+
+from citas.models import Cita
+from doctores.disponibilidad import inicio_del_dia, rango_fechas
+from doctores.models import Doctor, HorarioAtencion, ExcepcionHorario
+from .models import EstadisticaDiaria
+
+Usuario = get_user_model()
+
+# Días cerrados que se recalculan en cada ejecución del comando
+DIAS_RECALCULO = 7
+
+
+def inicio_de_mes(fecha, meses_atras=0):
+    """Primer día del mes de `fecha`, desplazado `meses_atras` meses calendario"""
+    indice = fecha.year * 12 + fecha.month - 1 - meses_atras
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def _a_fecha(periodo):
+    return periodo.date() if isinstance(periodo, datetime) else periodo
+
+
+def _contar(queryset, campo, truncar, desde, hasta, dimension=None):
+    """
+    Cuenta las filas cuyo `campo` cae entre los días desde y hasta (incluidos),
+    agrupadas por período (TruncDate o TruncMonth) y, opcionalmente, dimensión.
+    Retorna [(periodo, dimension, total)].
+    """
+    filas = queryset.filter(**{
+        f'{campo}__gte': inicio_del_dia(desde),
+        f'{campo}__lt': inicio_del_dia(hasta + timedelta(days=1)),
+    }).annotate(
+        periodo=truncar(campo, tzinfo=timezone.get_current_timezone())
+    ).values_list(
+        'periodo', *([dimension] if dimension else [])
+    ).annotate(total=Count('id')).order_by()
+
+    if dimension:
+        return [(_a_fecha(periodo), valor, total) for periodo, valor, total in filas]
+    return [(_a_fecha(periodo), '', total) for periodo, total in filas]
+
+
+def _horas_por_dia_semana():
+    """Horas de atención ofrecidas en cada día de la semana por los doctores activos"""
+    horas = defaultdict(Decimal)
+    horarios = HorarioAtencion.objects.filter(
+        activo=True,
+        doctor__activo=True
+    ).values_list('dia_semana', 'hora_inicio', 'hora_fin')
+    for dia_semana, hora_inicio, hora_fin in horarios:
+        minutos = (hora_fin.hour * 60 + hora_fin.minute) - (hora_inicio.hour * 60 + hora_inicio.minute)
+        horas[dia_semana] += Decimal(minutos) / 60
+    return horas
+
+
+def calcular_hechos(desde, hasta, truncar=TruncDate):
+    """
+    Calcula las métricas entre los días desde y hasta, agrupadas por día
+    (TruncDate) o por mes (TruncMonth). Usa una consulta por métrica sin
+    importar la amplitud del rango. Retorna {(periodo, metrica, dimension): valor}.
+
+    Las horas ofrecidas se calculan con los horarios vigentes al momento de
+    consolidar; no existe historial de cambios de horario.
+    """
+    hechos = defaultdict(Decimal)
+    consultas = [
+        (EstadisticaDiaria.METRICA_DOCTORES_CREADOS, Doctor.objects.all(), 'fecha_creacion', None),
+        (EstadisticaDiaria.METRICA_USUARIOS_REGISTRADOS, Usuario.objects.all(), 'date_joined', 'tipo_usuario'),
+        (EstadisticaDiaria.METRICA_EXCEPCIONES_CREADAS, ExcepcionHorario.objects.all(), 'fecha_creacion', 'tipo_excepcion'),
+        (EstadisticaDiaria.METRICA_CITAS, Cita.objects.all(), 'fecha_hora_inicio', 'estado'),
+    ]
+    for metrica, queryset, campo, dimension in consultas:
+        for periodo, valor_dimension, total in _contar(queryset, campo, truncar, desde, hasta, dimension):
+            hechos[(periodo, metrica, valor_dimension)] += total
+
+    horas = _horas_por_dia_semana()
+    for fecha in rango_fechas(desde, hasta):
+        periodo = fecha if truncar is TruncDate else inicio_de_mes(fecha)
+        hechos[(periodo, EstadisticaDiaria.METRICA_HORAS_OFRECIDAS, '')] += horas.get(fecha.weekday(), 0)
+
+    return hechos
+
+
+def ultimo_dia_cerrado():
+    """Ayer: hoy sigue cambiando y nunca se consolida"""
+    return timezone.localdate() - timedelta(days=1)
+
+
+def consolidar(desde, hasta):
+    """
+    Reescribe las filas de los días desde..hasta; retorna la cantidad de días.
+    `hasta` se recorta al último día cerrado.
+    """
+    hasta = min(hasta, ultimo_dia_cerrado())
+    if desde > hasta:
+        return 0
+
+    hechos = calcular_hechos(desde, hasta)
+    filas = [
+        EstadisticaDiaria(fecha=fecha, metrica=metrica, dimension=dimension, valor=valor)
+        for (fecha, metrica, dimension), valor in hechos.items()
+    ]
+    # Una marca por día permite saber hasta dónde llega la consolidación
+    dias = list(rango_fechas(desde, hasta))
+    filas.extend(
+        EstadisticaDiaria(fecha=fecha, metrica=EstadisticaDiaria.METRICA_DIA_CONSOLIDADO, valor=1)
+        for fecha in dias
+    )
+
+    with transaction.atomic():
+        EstadisticaDiaria.objects.filter(fecha__gte=desde, fecha__lte=hasta).delete()
+        EstadisticaDiaria.objects.bulk_create(filas, batch_size=1000)
+
+    return len(dias)
+
+
+def _marcas(desde=None, hasta=None):
+    """Marcas de consolidación de los días cerrados entre desde y hasta"""
+    marcas = EstadisticaDiaria.objects.filter(
+        metrica=EstadisticaDiaria.METRICA_DIA_CONSOLIDADO,
+        fecha__lte=min(hasta or date.max, ultimo_dia_cerrado())
+    )
+    if desde:
+        marcas = marcas.filter(fecha__gte=desde)
+    return marcas
+
+
+def _dias_consolidados(desde=None, hasta=None):
+    """Días cerrados con marca de consolidación, en orden"""
+    return _marcas(desde, hasta).order_by('fecha').values_list('fecha', flat=True)
+
+
+def consolidado_hasta(desde=None):
+    """
+    Último día del tramo continuo consolidado que empieza en la primera
+    marca (a partir de `desde`, si se indica), o None si no hay marcas. Un
+    recálculo manual de un rango posterior no lo extiende mientras quede un
+    hueco en medio.
+
+    Sin huecos, que es lo normal, basta una consulta agregada: el tramo es
+    continuo si tiene tantas marcas como días hay entre la primera y la
+    última. Solo con un hueco se recorren las marcas, y la página de
+    estadísticas las limita a los meses que muestra.
+    """
+    rango = _marcas(desde).aggregate(primera=Min('fecha'), ultima=Max('fecha'), dias=Count('id'))
+    if not rango['dias']:
+        return None
+    if (rango['ultima'] - rango['primera']).days + 1 == rango['dias']:
+        return rango['ultima']
+
+    ultimo = None
+    for fecha in _dias_consolidados(desde).iterator():
+        if ultimo is not None and fecha != ultimo + timedelta(days=1):
+            break
+        ultimo = fecha
+    return ultimo
+
+
+def _tramos_sin_consolidar(desde, hasta):
+    """Rangos [(inicio, fin)] de días entre desde y hasta sin marca de consolidación"""
+    tramos = []
+    siguiente = desde
+    for fecha in _dias_consolidados(desde, hasta):
+        if fecha > siguiente:
+            tramos.append((siguiente, fecha - timedelta(days=1)))
+        siguiente = fecha + timedelta(days=1)
+    if siguiente <= hasta:
+        tramos.append((siguiente, hasta))
+    return tramos
+
+
+def _primer_dia_con_datos():
+    """Día más antiguo con algún registro en las tablas de origen"""
+    fechas = [
+        Doctor.objects.aggregate(minimo=Min('fecha_creacion'))['minimo'],
+        Usuario.objects.aggregate(minimo=Min('date_joined'))['minimo'],
+        ExcepcionHorario.objects.aggregate(minimo=Min('fecha_creacion'))['minimo'],
+        Cita.objects.aggregate(minimo=Min('fecha_hora_inicio'))['minimo'],
+    ]
+    fechas = [timezone.localtime(fecha).date() for fecha in fechas if fecha]
+    return min(fechas) if fechas else None
+
+
+def consolidar_pendientes(dias_recalculo=DIAS_RECALCULO):
+    """
+    Consolida los días cerrados que faltan y recalcula los últimos
+    `dias_recalculo`. Retorna (desde, hasta, dias) con lo procesado.
+    """
+    ayer = ultimo_dia_cerrado()
+    ultimo = consolidado_hasta()
+    if ultimo is None:
+        desde = _primer_dia_con_datos() or ayer
+    else:
+        desde = min(ultimo + timedelta(days=1), ayer - timedelta(days=dias_recalculo - 1))
+    return desde, ayer, consolidar(desde, ayer)
+
+
+def resumen_mensual(meses=6):
+    """
+    Métricas de los últimos `meses` meses calendario (incluido el actual),
+    en orden cronológico. Suma filas de los días con marca de consolidación
+    y calcula en vivo cada tramo sin marca (como mínimo, hoy).
+    """
+    hoy = timezone.localdate()
+    primer_mes = inicio_de_mes(hoy, meses - 1)
+    totales = defaultdict(Decimal)
+
+    tramos_en_vivo = _tramos_sin_consolidar(primer_mes, hoy)
+    if tramos_en_vivo != [(primer_mes, hoy)]:
+        # consolidar() escribe las filas de un día junto con su marca, así
+        # que solo los días consolidados tienen filas
+        filas = EstadisticaDiaria.objects.filter(
+            fecha__gte=primer_mes,
+            fecha__lte=ultimo_dia_cerrado()
+        ).exclude(
+            metrica=EstadisticaDiaria.METRICA_DIA_CONSOLIDADO
+        ).annotate(
+            mes=TruncMonth('fecha')
+        ).values_list('mes', 'metrica', 'dimension').annotate(total=Sum('valor')).order_by()
+        for mes, metrica, dimension, total in filas:
+            totales[(_a_fecha(mes), metrica, dimension)] += total
+
+    for desde_en_vivo, hasta_en_vivo in tramos_en_vivo:
+        for clave, valor in calcular_hechos(desde_en_vivo, hasta_en_vivo, TruncMonth).items():
+            totales[clave] += valor
+
+    por_mes = defaultdict(lambda: defaultdict(dict))
+    for (mes, metrica, dimension), valor in totales.items():
+        por_mes[mes][metrica][dimension] = valor
+
+    resumen = []
+    for indice in range(meses - 1, -1, -1):
+        mes = inicio_de_mes(hoy, indice)
+        metricas = por_mes[mes]
+        usuarios = {tipo: int(total) for tipo, total in metricas[EstadisticaDiaria.METRICA_USUARIOS_REGISTRADOS].items()}
+        citas = {estado: int(total) for estado, total in metricas[EstadisticaDiaria.METRICA_CITAS].items()}
+        resumen.append({
+            'mes': mes,
+            'etiqueta': dateformat.format(mes, 'F Y').capitalize(),
+            'doctores': int(sum(metricas[EstadisticaDiaria.METRICA_DOCTORES_CREADOS].values())),
+            'usuarios': usuarios,
+            'usuarios_total': sum(usuarios.values()),
+            'horas': sum(metricas[EstadisticaDiaria.METRICA_HORAS_OFRECIDAS].values(), Decimal(0)),
+            'excepciones': int(sum(metricas[EstadisticaDiaria.METRICA_EXCEPCIONES_CREADAS].values())),
+            'citas': citas,
+            'citas_total': sum(citas.values()),
+        })
+    return resumen
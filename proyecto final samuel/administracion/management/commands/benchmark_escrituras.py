@@ -0,0 +1,191 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from agenda_medica.basedatos import PRAGMAS_SQLITE
+
+# Microbenchmark solo de SQLite: mide el efecto de PRAGMAS_SQLITE sobre la
+# contención del bloqueo de escritura con sqlite3 directo sobre un esquema
+# reducido, sin el ORM ni citas.services.agendar_cita (ni sus validaciones,
+# señales o caché). Sus cifras no son las de la aplicación; para medir las
+# vistas reales se usa `benchmark_vistas`.
+
+# Configuraciones comparadas: la de desarrollo (settings.py) y la de producción
+CONFIGURACIONES = [
+    ('desarrollo (journal DELETE)', []),
+    ('producción (WAL + PRAGMA)', PRAGMAS_SQLITE),
+]
+
+CITAS_INICIALES = 50000
+DOCTORES = 40
+
+
+def _conectar(ruta, pragmas):
+    # Igual que Django: timeout=20 y transacciones manuales (BEGIN IMMEDIATE)
+    conexion = sqlite3.connect(ruta, timeout=20, isolation_level=None)
+    for nombre, valor in pragmas:
+        conexion.execute(f'PRAGMA {nombre}={valor}')
+    return conexion
+
+
+def _preparar(ruta, pragmas):
+    conexion = _conectar(ruta, pragmas)
+    conexion.executescript('''
+        CREATE TABLE cita (
+            id INTEGER PRIMARY KEY,
+            doctor_id INTEGER NOT NULL,
+            paciente_id INTEGER NOT NULL,
+            inicio INTEGER NOT NULL,
+            fin INTEGER NOT NULL,
+            estado TEXT NOT NULL
+        );
+        CREATE INDEX cita_doctor_inicio ON cita (doctor_id, inicio);
+        CREATE TABLE doctor (id INTEGER PRIMARY KEY, agenda_actualizada INTEGER);
+    ''')
+    conexion.execute('BEGIN')
+    conexion.executemany('INSERT INTO doctor VALUES (?, 0)', [(i,) for i in range(DOCTORES)])
+    conexion.executemany(
+        'INSERT INTO cita (doctor_id, paciente_id, inicio, fin, estado) VALUES (?, ?, ?, ?, ?)',
+        [
+            (i % DOCTORES, i, i * 60, i * 60 + 1800, 'confirmada')
+            for i in range(CITAS_INICIALES)
+        ]
+    )
+    conexion.execute('COMMIT')
+    conexion.close()
+
+
+def _escritor(ruta, pragmas, segundos, semilla):
+    """Agenda citas como agendar_cita: verificar el cupo e insertar en una transacción"""
+    aleatorio = random.Random(semilla)
+    conexion = _conectar(ruta, pragmas)
+    latencias, errores = [], 0
+    fin = time.monotonic() + segundos
+    while time.monotonic() < fin:
+        doctor_id = aleatorio.randrange(DOCTORES)
+        inicio = aleatorio.randrange(CITAS_INICIALES * 60)
+        antes = time.monotonic()
+        try:
+            conexion.execute('BEGIN IMMEDIATE')
+            ocupada = conexion.execute(
+                'SELECT 1 FROM cita WHERE doctor_id = ? AND inicio > ? AND inicio < ? LIMIT 1',
+                (doctor_id, inicio - 1800, inicio + 1800)
+            ).fetchone()
+            if not ocupada:
+                conexion.execute(
+                    'INSERT INTO cita (doctor_id, paciente_id, inicio, fin, estado) VALUES (?, ?, ?, ?, ?)',
+                    (doctor_id, semilla, inicio, inicio + 1800, 'confirmada')
+                )
+            conexion.execute('UPDATE doctor SET agenda_actualizada = ? WHERE id = ?', (int(antes), doctor_id))
+            conexion.execute('COMMIT')
+            latencias.append(time.monotonic() - antes)
+        except sqlite3.OperationalError:
+            errores += 1
+            if conexion.in_transaction:
+                conexion.execute('ROLLBACK')
+    conexion.close()
+    return 'escritura', len(latencias), errores, latencias
+
+
+def _lector(ruta, pragmas, segundos, semilla):
+    """Consulta la agenda de un doctor en un rango, como el cálculo de disponibilidad"""
+    aleatorio = random.Random(semilla)
+    conexion = _conectar(ruta, pragmas)
+    latencias, errores = [], 0
+    fin = time.monotonic() + segundos
+    while time.monotonic() < fin:
+        inicio = aleatorio.randrange(CITAS_INICIALES * 60)
+        antes = time.monotonic()
+        try:
+            conexion.execute(
+                'SELECT id, inicio, fin FROM cita WHERE doctor_id = ? AND inicio >= ? AND inicio < ?',
+                (aleatorio.randrange(DOCTORES), inicio, inicio + 7 * 86400)
+            ).fetchall()
+            latencias.append(time.monotonic() - antes)
+        except sqlite3.OperationalError:
+            errores += 1
+    conexion.close()
+    return 'lectura', len(latencias), errores, latencias
+
+
+def _ejecutar(argumentos):
+    funcion, *resto = argumentos
+    return funcion(*resto)
+
+
+class Command(BaseCommand):
+    help = (
+        'Microbenchmark de SQLite (sqlite3 directo, esquema reducido): escrituras concurrentes '
+        'con y sin los PRAGMA de producción'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escritores', type=int, default=8, help='Procesos que agendan citas')
+        parser.add_argument('--lectores', type=int, default=4, help='Procesos que consultan agendas')
+        parser.add_argument('--segundos', type=float, default=5, help='Duración de cada medición')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'=== Microbenchmark SQLite (sqlite3 directo, esquema reducido): {options["escritores"]} escritores, '
+                f'{options["lectores"]} lectores, {options["segundos"]:g} s por configuración ===\n'
+            )
+        )
+
+        contexto = multiprocessing.get_context('spawn')
+        resultados = []
+        with tempfile.TemporaryDirectory() as directorio:
+            for indice, (nombre, pragmas) in enumerate(CONFIGURACIONES):
+                # Una base nueva por configuración para que ambas partan igual
+                ruta = os.path.join(directorio, f'benchmark_{indice}.sqlite3')
+                _preparar(ruta, pragmas)
+
+                tareas = [
+                    (_escritor, ruta, pragmas, options['segundos'], semilla)
+                    for semilla in range(options['escritores'])
+                ] + [
+                    (_lector, ruta, pragmas, options['segundos'], 1000 + semilla)
+                    for semilla in range(options['lectores'])
+                ]
+                with contexto.Pool(len(tareas)) as pool:
+                    medidas = pool.map(_ejecutar, tareas)
+
+                resultado = self._resumir(nombre, medidas, options['segundos'])
+                resultados.append(resultado)
+                self._mostrar(resultado)
+
+        base, produccion = resultados
+        if base['escrituras_s']:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'\n📊 Escrituras por segundo: {base["escrituras_s"]:.0f} -> {produccion["escrituras_s"]:.0f} '
+                    f'(x{produccion["escrituras_s"] / base["escrituras_s"]:.1f})\n'
+                )
+            )
+
+    def _resumir(self, nombre, medidas, segundos):
+        resumen = {'nombre': nombre}
+        for tipo in ('escritura', 'lectura'):
+            cantidad = sum(m[1] for m in medidas if m[0] == tipo)
+            latencias = sorted(latencia for m in medidas if m[0] == tipo for latencia in m[3])
+            resumen[f'{tipo}s_s'] = cantidad / segundos
+            resumen[f'errores_{tipo}'] = sum(m[2] for m in medidas if m[0] == tipo)
+            resumen[f'p95_{tipo}'] = (
+                statistics.quantiles(latencias, n=20)[-1] * 1000 if len(latencias) >= 20 else 0
+            )
+        return resumen
+
+    def _mostrar(self, resultado):
+        self.stdout.write(
+            f'{resultado["nombre"]}:\n'
+            f'   - Escrituras: {resultado["escrituras_s"]:.0f}/s, p95 {resultado["p95_escritura"]:.2f} ms, '
+            f'{resultado["errores_escritura"]} errores\n'
+            f'   - Lecturas: {resultado["lecturas_s"]:.0f}/s, p95 {resultado["p95_lectura"]:.2f} ms, '
+            f'{resultado["errores_lectura"]} errores'
+        )
@@ -0,0 +1,172 @@
+import json
+import platform
+import statistics
+import time
+from datetime import timedelta
+
+import django
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from citas.models import Cita
+from doctores.models import Doctor, Especialidad
+from usuarios.models import Usuario
+
+
+def escenarios():
+    """Retorna [(nombre, url)] de las vistas medidas, con parámetros realistas"""
+    hoy = timezone.localdate()
+    especialidad = Especialidad.objects.filter(activa=True, doctor__activo=True).order_by('pk').first()
+    semana = f'fecha_inicio={hoy}&fecha_fin={hoy + timedelta(days=6)}'
+    return [
+        ('consultar_disponibilidad', f'{reverse("doctores:consultar_disponibilidad")}?{semana}'
+                                     f'&especialidad={especialidad.pk if especialidad else ""}'),
+        ('calendario_citas', f'{reverse("doctores:calendario_citas")}?fecha={hoy}'),
+        ('dashboard_admin', reverse('administracion:dashboard')),
+        ('estadisticas', reverse('administracion:estadisticas')),
+        ('lista_doctores', reverse('doctores:lista_doctores')),
+        ('lista_doctores_busqueda', f'{reverse("doctores:lista_doctores")}?busqueda=ana'),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Medir tiempo y cantidad de consultas de las vistas principales y guardar un reporte JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=10, help='Mediciones por vista')
+        parser.add_argument(
+            '--salida',
+            default='benchmark_vistas.json',
+            help='Archivo JSON donde se guarda el reporte',
+        )
+        parser.add_argument('--comparar', help='Reporte JSON anterior contra el cual comparar')
+        parser.add_argument(
+            '--sin-cache',
+            action='store_true',
+            help='Vaciar las cachés antes de cada medición (peor caso)',
+        )
+        parser.add_argument(
+            '--vista',
+            action='append',
+            help='Medir solo esta vista (se puede repetir)',
+        )
+
+    def handle(self, *args, **options):
+        administrador = Usuario.objects.filter(tipo_usuario='administrador', is_active=True).first()
+        if not administrador:
+            raise CommandError('Se necesita un usuario administrador; ejecuta crear_admin.')
+
+        medibles = escenarios()
+        if options['vista']:
+            medibles = [(nombre, url) for nombre, url in medibles if nombre in options['vista']]
+            if not medibles:
+                raise CommandError('Ninguna vista coincide con --vista.')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'=== Benchmark de vistas: {len(medibles)} vistas, {options["repeticiones"]} repeticiones ===\n'
+            )
+        )
+
+        cliente = Client()
+        cliente.force_login(administrador)
+
+        resultados = {}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for nombre, url in medibles:
+                resultados[nombre] = self.medir(cliente, url, options['repeticiones'], options['sin_cache'])
+                self.mostrar(nombre, resultados[nombre])
+
+        reporte = {
+            'fecha': timezone.now().isoformat(),
+            'entorno': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'base_datos': connection.vendor,
+            },
+            'datos': {
+                'doctores': Doctor.objects.count(),
+                'pacientes': Usuario.objects.filter(tipo_usuario='paciente').count(),
+                'citas': Cita.objects.count(),
+            },
+            'repeticiones': options['repeticiones'],
+            'sin_cache': options['sin_cache'],
+            'vistas': resultados,
+        }
+        with open(options['salida'], 'w', encoding='utf-8') as archivo:
+            json.dump(reporte, archivo, indent=2, ensure_ascii=False)
+
+        if options['comparar']:
+            self.comparar(options['comparar'], resultados)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n📊 Resumen:\n'
+                f'   - Datos: {reporte["datos"]["doctores"]} doctores, '
+                f'{reporte["datos"]["pacientes"]} pacientes, {reporte["datos"]["citas"]} citas\n'
+                f'   - Reporte guardado en: {options["salida"]}\n'
+            )
+        )
+
+    def medir(self, cliente, url, repeticiones, sin_cache):
+        """Una petición de calentamiento y luego `repeticiones` medidas"""
+        cliente.get(url)
+        tiempos, consultas = [], []
+        for _ in range(repeticiones):
+            if sin_cache:
+                for cache in caches.all():
+                    cache.clear()
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                respuesta = cliente.get(url)
+                if getattr(respuesta, 'streaming', False):
+                    b''.join(respuesta.streaming_content)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas.append(len(capturadas))
+            if respuesta.status_code != 200:
+                raise CommandError(f'{url} respondió {respuesta.status_code}')
+
+        tiempos.sort()
+        return {
+            'url': url,
+            'mediana_ms': round(statistics.median(tiempos), 2),
+            'p95_ms': round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 2),
+            'minimo_ms': round(tiempos[0], 2),
+            'maximo_ms': round(tiempos[-1], 2),
+            'consultas': max(consultas),
+        }
+
+    def mostrar(self, nombre, resultado):
+        self.stdout.write(
+            f'{nombre}: mediana {resultado["mediana_ms"]:.1f} ms, '
+            f'p95 {resultado["p95_ms"]:.1f} ms, {resultado["consultas"]} consultas'
+        )
+
+    def comparar(self, ruta, resultados):
+        try:
+            with open(ruta, encoding='utf-8') as archivo:
+                anterior = json.load(archivo)['vistas']
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'No se pudo leer el reporte {ruta}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(f'\n=== Comparación con {ruta} ==='))
+        for nombre, actual in resultados.items():
+            if nombre not in anterior:
+                continue
+            previo = anterior[nombre]
+            cambio = 0
+            if previo['mediana_ms']:
+                cambio = (actual['mediana_ms'] - previo['mediana_ms']) / previo['mediana_ms'] * 100
+            linea = (
+                f'{nombre}: {previo["mediana_ms"]:.1f} -> {actual["mediana_ms"]:.1f} ms ({cambio:+.0f}%), '
+                f'consultas {previo["consultas"]} -> {actual["consultas"]}'
+            )
+            if cambio > 10 or actual['consultas'] > previo['consultas']:
+                self.stdout.write(self.style.WARNING(f'⚠️  {linea}'))
+            else:
+                self.stdout.write(f'   {linea}')
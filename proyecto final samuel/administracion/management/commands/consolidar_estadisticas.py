@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from administracion.estadisticas import DIAS_RECALCULO, consolidar, consolidar_pendientes, ultimo_dia_cerrado
+
+class Command(BaseCommand):
+    help = 'Consolidar las estadísticas diarias usadas por la página de estadísticas'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias-recalculo',
+            type=int,
+            default=DIAS_RECALCULO,
+            help='Días cerrados que se vuelven a calcular en cada ejecución',
+        )
+        parser.add_argument(
+            '--desde',
+            type=str,
+            help='Recalcular desde esta fecha (AAAA-MM-DD), junto con --hasta',
+        )
+        parser.add_argument(
+            '--hasta',
+            type=str,
+            help='Recalcular hasta esta fecha (AAAA-MM-DD), junto con --desde; como máximo ayer',
+        )
+    
+    def handle(self, *args, **options):
+        if options.get('desde') or options.get('hasta'):
+            desde = parse_date(options.get('desde') or '')
+            hasta = parse_date(options.get('hasta') or '')
+            if not desde or not hasta:
+                raise CommandError('--desde y --hasta deben indicarse juntos con formato AAAA-MM-DD.')
+            if hasta > ultimo_dia_cerrado():
+                # Hoy y los días futuros siguen cambiando; se calculan en vivo
+                hasta = ultimo_dia_cerrado()
+                self.stdout.write(self.style.WARNING(f'--hasta se recorta a {hasta:%d/%m/%Y} (último día cerrado).'))
+            dias = consolidar(desde, hasta)
+        else:
+            desde, hasta, dias = consolidar_pendientes(options['dias_recalculo'])
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n📊 Resumen:\n'
+                f'   - Rango consolidado: {desde:%d/%m/%Y} - {hasta:%d/%m/%Y}\n'
+                f'   - Días procesados: {dias}\n'
+            )
+        )
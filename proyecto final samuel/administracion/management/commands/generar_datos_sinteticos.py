@@ -0,0 +1,235 @@
+import random
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from citas.models import Cita
+from doctores.busqueda import asignar_documentos
+from doctores.disponibilidad import rango_fechas
+from doctores.materializacion import horizonte_dias, materializar_doctor
+from doctores.models import Doctor, Especialidad, ExcepcionHorario, HorarioAtencion
+from usuarios.models import Usuario
+
+# Todos los usuarios generados usan este dominio, así se pueden eliminar después
+DOMINIO = 'sintetico.test'
+CLAVE = 'sintetico123'
+
+NOMBRES = [
+    'Ana', 'Carlos', 'Diana', 'Andrés', 'Laura', 'Jorge', 'Valentina', 'Santiago',
+    'Camila', 'Felipe', 'Natalia', 'Mateo', 'Paula', 'Julián', 'Mariana', 'Sebastián',
+]
+APELLIDOS = [
+    'Gómez', 'Rodríguez', 'Martínez', 'López', 'García', 'Hernández', 'Ramírez', 'Torres',
+    'Díaz', 'Moreno', 'Vargas', 'Castro', 'Rojas', 'Ortiz', 'Jiménez', 'Suárez',
+]
+
+# (hora de inicio, hora de fin) de las jornadas posibles
+JORNADAS = [(time(7), time(12)), (time(8), time(17)), (time(13), time(18)), (time(9), time(15))]
+DURACIONES = [15, 20, 30, 45]
+
+# Estados de las citas pasadas y futuras, con su peso
+ESTADOS_PASADOS = [('completada', 75), ('no_asistio', 10), ('cancelada', 15)]
+ESTADOS_FUTUROS = [('confirmada', 90), ('cancelada', 10)]
+
+class Command(BaseCommand):
+    help = 'Generar una clínica sintética y reproducible para pruebas de rendimiento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctores', type=int, default=50, help='Cantidad de doctores')
+        parser.add_argument('--pacientes', type=int, default=1000, help='Cantidad de pacientes')
+        parser.add_argument('--citas', type=int, default=10000, help='Cantidad de citas')
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=30,
+            help='Las citas y excepciones se reparten entre hoy menos y hoy más esta cantidad de días',
+        )
+        parser.add_argument('--semilla', type=int, default=2025, help='Semilla del generador aleatorio')
+        parser.add_argument(
+            '--eliminar',
+            action='store_true',
+            help=f'Eliminar antes los datos generados previamente (usuarios @{DOMINIO})',
+        )
+
+    def handle(self, *args, **options):
+        aleatorio = random.Random(options['semilla'])
+        hoy = timezone.localdate()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'=== Generando clínica sintética (semilla {options["semilla"]}) ===\n'
+            )
+        )
+
+        if options['eliminar']:
+            eliminados = self.eliminar()
+            self.stdout.write(f'🗑️  Usuarios sintéticos eliminados: {eliminados}')
+        elif Usuario.objects.filter(email__endswith=f'@{DOMINIO}').exists():
+            raise CommandError('Ya existen datos sintéticos; usa --eliminar para regenerarlos.')
+
+        if not Especialidad.objects.filter(activa=True).exists():
+            call_command('crear_especialidades', stdout=self.stdout)
+        especialidades = list(Especialidad.objects.filter(activa=True).order_by('pk'))
+
+        # Un solo hash para todos: el costo del hasher se paga una vez
+        clave = make_password(CLAVE)
+
+        with transaction.atomic():
+            doctores = self.crear_doctores(aleatorio, options['doctores'], especialidades, clave)
+            horarios = self.crear_horarios(aleatorio, doctores)
+            excepciones = self.crear_excepciones(aleatorio, doctores, hoy, options['dias'])
+            pacientes = self.crear_pacientes(aleatorio, options['pacientes'], clave)
+            citas = self.crear_citas(
+                aleatorio, horarios, excepciones, pacientes, hoy, options['dias'], options['citas']
+            )
+
+        # bulk_create no dispara señales: se materializan las franjas aquí
+        hasta = hoy + timedelta(days=horizonte_dias())
+        franjas = sum(materializar_doctor(doctor.pk, hasta) for doctor in doctores)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n📊 Resumen:\n'
+                f'   - Doctores: {len(doctores)}\n'
+                f'   - Horarios de atención: {len(horarios)}\n'
+                f'   - Excepciones: {len(excepciones)}\n'
+                f'   - Pacientes: {len(pacientes)}\n'
+                f'   - Citas: {len(citas)}\n'
+                f'   - Franjas materializadas: {franjas}\n'
+                f'   - Contraseña de todos los usuarios: {CLAVE}\n'
+            )
+        )
+
+    def eliminar(self):
+        """Elimina los usuarios sintéticos y todo lo que depende de ellos"""
+        usuarios = Usuario.objects.filter(email__endswith=f'@{DOMINIO}')
+        with transaction.atomic():
+            # Cita.doctor es PROTECT: las citas se borran antes que los doctores
+            Cita.objects.filter(doctor__usuario__in=usuarios).delete()
+            eliminados = usuarios.count()
+            usuarios.delete()
+        return eliminados
+
+    def crear_usuarios(self, aleatorio, tipo, cantidad, clave):
+        usuarios = []
+        for numero in range(1, cantidad + 1):
+            email = f'{tipo}{numero:05d}@{DOMINIO}'
+            usuarios.append(Usuario(
+                username=email,
+                email=email,
+                first_name=aleatorio.choice(NOMBRES),
+                last_name=f'{aleatorio.choice(APELLIDOS)} {aleatorio.choice(APELLIDOS)}',
+                telefono=f'3{aleatorio.randrange(10 ** 9):09d}',
+                tipo_usuario=tipo,
+                password=clave
+            ))
+        return Usuario.objects.bulk_create(usuarios, batch_size=500)
+
+    def crear_doctores(self, aleatorio, cantidad, especialidades, clave):
+        doctores = []
+        for numero, usuario in enumerate(self.crear_usuarios(aleatorio, 'doctor', cantidad, clave), start=1):
+            doctor = Doctor(
+                usuario=usuario,
+                especialidad=aleatorio.choice(especialidades),
+                numero_licencia=f'SIN-{numero:05d}',
+                consultorio=f'Consultorio {aleatorio.randint(101, 520)}'
+            )
+            asignar_documentos(doctor)
+            doctores.append(doctor)
+        return Doctor.objects.bulk_create(doctores, batch_size=500)
+
+    def crear_horarios(self, aleatorio, doctores):
+        """De lunes a viernes, y algunos sábados, con una jornada y duración por doctor"""
+        horarios = []
+        for doctor in doctores:
+            hora_inicio, hora_fin = aleatorio.choice(JORNADAS)
+            duracion = aleatorio.choice(DURACIONES)
+            dias = list(range(5)) + ([5] if aleatorio.random() < 0.3 else [])
+            horarios.extend(
+                HorarioAtencion(
+                    doctor=doctor,
+                    dia_semana=dia,
+                    hora_inicio=hora_inicio,
+                    hora_fin=hora_fin,
+                    duracion_cita=duracion
+                )
+                for dia in dias
+            )
+        return HorarioAtencion.objects.bulk_create(horarios, batch_size=500)
+
+    def crear_excepciones(self, aleatorio, doctores, hoy, dias):
+        """Hasta dos excepciones por doctor: ausencias de unas horas o de días completos"""
+        tipos = [valor for valor, _ in ExcepcionHorario.TIPO_EXCEPCION_CHOICES]
+        excepciones = []
+        for doctor in doctores:
+            for _ in range(aleatorio.choice([0, 0, 1, 1, 2])):
+                fecha = hoy + timedelta(days=aleatorio.randint(-dias, dias))
+                todo_el_dia = aleatorio.random() < 0.5
+                if todo_el_dia:
+                    inicio = timezone.make_aware(datetime.combine(fecha, time.min))
+                    fin = inicio + timedelta(days=aleatorio.randint(1, 3))
+                else:
+                    inicio = timezone.make_aware(datetime.combine(fecha, time(aleatorio.randint(7, 15))))
+                    fin = inicio + timedelta(hours=aleatorio.randint(1, 3))
+                excepciones.append(ExcepcionHorario(
+                    doctor=doctor,
+                    fecha_inicio=inicio,
+                    fecha_fin=fin,
+                    tipo_excepcion=aleatorio.choice(tipos),
+                    motivo='Excepción sintética',
+                    todo_el_dia=todo_el_dia,
+                    notificado=True
+                ))
+        return ExcepcionHorario.objects.bulk_create(excepciones, batch_size=500)
+
+    def crear_pacientes(self, aleatorio, cantidad, clave):
+        return self.crear_usuarios(aleatorio, 'paciente', cantidad, clave)
+
+    def crear_citas(self, aleatorio, horarios, excepciones, pacientes, hoy, dias, cantidad):
+        """Toma al azar franjas libres de los horarios, sin repetir ni cruzar excepciones"""
+        if not pacientes:
+            return []
+
+        bloqueos = {}
+        for excepcion in excepciones:
+            bloqueos.setdefault(excepcion.doctor_id, []).append((excepcion.fecha_inicio, excepcion.fecha_fin))
+
+        horarios_por_dia = {}
+        for horario in horarios:
+            horarios_por_dia.setdefault(horario.dia_semana, []).append(horario)
+
+        franjas = []
+        for fecha in rango_fechas(hoy - timedelta(days=dias), hoy + timedelta(days=dias)):
+            for horario in horarios_por_dia.get(fecha.weekday(), []):
+                inicio = timezone.make_aware(datetime.combine(fecha, horario.hora_inicio))
+                fin_jornada = timezone.make_aware(datetime.combine(fecha, horario.hora_fin))
+                duracion = timedelta(minutes=horario.duracion_cita)
+                while inicio + duracion <= fin_jornada:
+                    fin = inicio + duracion
+                    if not any(
+                        inicio < bloqueo_fin and fin > bloqueo_inicio
+                        for bloqueo_inicio, bloqueo_fin in bloqueos.get(horario.doctor_id, [])
+                    ):
+                        franjas.append((horario.doctor_id, inicio, fin))
+                    inicio = fin
+
+        ahora = timezone.now()
+        citas = []
+        for doctor_id, inicio, fin in aleatorio.sample(franjas, min(cantidad, len(franjas))):
+            estados = ESTADOS_PASADOS if inicio < ahora else ESTADOS_FUTUROS
+            citas.append(Cita(
+                paciente=aleatorio.choice(pacientes),
+                doctor_id=doctor_id,
+                fecha_hora_inicio=inicio,
+                fecha_hora_fin=fin,
+                estado=aleatorio.choices(
+                    [estado for estado, _ in estados],
+                    weights=[peso for _, peso in estados]
+                )[0],
+                motivo='Cita sintética'
+            ))
+        return Cita.objects.bulk_create(citas, batch_size=500)
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+class Command(BaseCommand):
+    help = 'Actualizar las estadísticas del planificador de consultas (ANALYZE / PRAGMA optimize)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='ANALYZE completo de todas las tablas (en SQLite, en lugar de PRAGMA optimize)',
+        )
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help='Además compactar la base de datos (VACUUM); bloquea las escrituras mientras corre',
+        )
+    
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        sentencias = []
+        
+        if connection.vendor == 'sqlite':
+            if options['completo']:
+                sentencias.append('ANALYZE')
+            else:
+                # Solo analiza las tablas cuyas estadísticas lo necesitan
+                sentencias.extend(['PRAGMA analysis_limit=1000', 'PRAGMA optimize'])
+            if options['vacuum']:
+                sentencias.append('VACUUM')
+            # Devuelve al archivo principal las páginas acumuladas en el WAL
+            sentencias.append('PRAGMA wal_checkpoint(TRUNCATE)')
+        elif connection.vendor == 'postgresql':
+            sentencias.append('VACUUM ANALYZE' if options['vacuum'] else 'ANALYZE')
+        else:
+            sentencias.append('ANALYZE')
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'=== Optimizando base de datos ({connection.vendor}) ===\n')
+        )
+        
+        with connection.cursor() as cursor:
+            for sentencia in sentencias:
+                self.stdout.write(f'   {sentencia}')
+                cursor.execute(sentencia)
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n📊 Resumen:\n'
+                f'   - Sentencias ejecutadas: {len(sentencias)}\n'
+                f'   - Duración: {time.monotonic() - inicio:.2f} s\n'
+            )
+        )
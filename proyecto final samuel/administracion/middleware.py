@@ -0,0 +1,172 @@
+"""
+Perfilado de una petición a solicitud de un administrador (ver perfilado.py)
+
+cProfile y tracemalloc son globales al proceso, así que se perfila una sola
+petición a la vez: si llega otra mientras tanto, se atiende sin perfilar.
+En las respuestas por streaming el perfil incluye la generación del cuerpo
+y la petición cuenta como en curso hasta que el cuerpo termina.
+"""
+import cProfile
+import logging
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import reverse
+from django.utils import timezone
+
+from . import perfilado
+
+logger = logging.getLogger(__name__)
+
+_perfilando = threading.Lock()
+
+
+class PerfiladoMiddleware:
+    """Debe ir después de AuthenticationMiddleware"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFILADO_ACTIVO', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.GET.get(perfilado.PARAMETRO) or request.META.get(perfilado.CABECERA)
+        # Un token inválido se ignora: la petición sigue sin perfilar
+        if not token or not perfilado.token_valido(token, request.user):
+            return self.get_response(request)
+        if not _perfilando.acquire(blocking=False):
+            logger.warning('Perfilado omitido en %s: ya hay otra petición perfilándose', request.path)
+            return self.get_response(request)
+        return self.perfilar(request)
+
+    def perfilar(self, request):
+        """
+        Perfila la petición y libera el candado al guardar el perfil. En una
+        respuesta por streaming el cuerpo se genera después de la vista, así
+        que el perfil sigue abierto hasta que termina de enviarse.
+        """
+        try:
+            captura = Captura()
+            response = captura.medir(self.get_response, request)
+        except BaseException:
+            _perfilando.release()
+            raise
+
+        # El nombre ya está decidido; el detalle existe al guardar el perfil
+        response['X-Perfil'] = reverse('administracion:detalle_perfil', args=[captura.nombre])
+        if response.streaming and not getattr(response, 'is_async', False):
+            response.streaming_content = CuerpoPerfilado(captura, request, response)
+        else:
+            captura.terminar(request, response)
+        return response
+
+
+class Captura:
+    """Perfil, consultas y memoria de una petición mientras se atiende"""
+
+    def __init__(self):
+        self.nombre = perfilado.nuevo_nombre()
+        self.consultas = perfilado.ConsultasLentas(settings.PERFILADO_UMBRAL_CONSULTA_MS)
+        self.perfil = cProfile.Profile()
+        self.duracion = 0.0
+
+        self.iniciar_tracemalloc = not tracemalloc.is_tracing()
+        if self.iniciar_tracemalloc:
+            tracemalloc.start(settings.PERFILADO_MARCOS_TRACEMALLOC)
+        tracemalloc.reset_peak()
+        self.memoria_antes = tracemalloc.take_snapshot()
+
+    def medir(self, funcion, *args):
+        """Ejecuta la función dentro del perfil y suma su duración"""
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(self.consultas))
+            inicio = time.perf_counter()
+            self.perfil.enable()
+            try:
+                return funcion(*args)
+            finally:
+                self.perfil.disable()
+                self.duracion += time.perf_counter() - inicio
+
+    def terminar(self, request, response):
+        """Guarda el perfil y libera el candado"""
+        try:
+            self._guardar(request, response)
+        finally:
+            _perfilando.release()
+
+    def _guardar(self, request, response):
+        memoria_despues = tracemalloc.take_snapshot()
+        _, pico = tracemalloc.get_traced_memory()
+        if self.iniciar_tracemalloc:
+            tracemalloc.stop()
+        diferencias = memoria_despues.compare_to(self.memoria_antes, 'lineno')
+
+        # Los EXPLAIN se ejecutan después, fuera de la medición
+        explicadas = [
+            {
+                'duracion_ms': round(duracion_consulta * 1000, 2),
+                'sql': sql,
+                'plan': perfilado.explicar(conexion, sql, params),
+            }
+            for conexion, sql, params, duracion_consulta in self.consultas.consultas
+        ]
+
+        perfilado.guardar_perfil(self.nombre, self.perfil, {
+            'fecha': timezone.now().isoformat(),
+            'usuario': request.user.email,
+            'metodo': request.method,
+            'ruta': request.get_full_path(),
+            'vista': getattr(request.resolver_match, 'view_name', None),
+            'estado': response.status_code,
+            'duracion_ms': round(self.duracion * 1000, 2),
+            'consultas': self.consultas.total,
+            'umbral_consulta_ms': settings.PERFILADO_UMBRAL_CONSULTA_MS,
+            'consultas_lentas': explicadas,
+            'memoria_pico_kb': round(pico / 1024, 1),
+            'memoria': [
+                {
+                    'linea': str(diferencia.traceback),
+                    'kb': round(diferencia.size_diff / 1024, 1),
+                    'bloques': diferencia.count_diff,
+                }
+                for diferencia in diferencias[:perfilado.LINEAS_MEMORIA]
+            ],
+        })
+
+
+class CuerpoPerfilado:
+    """
+    Cuerpo de una respuesta por streaming que se genera dentro del perfil.
+    Es un iterador con close() y no un generador: el servidor llama a
+    close() aunque el cuerpo no se haya empezado a recorrer, y así el
+    candado se libera también si el cliente se desconecta.
+    """
+
+    def __init__(self, captura, request, response):
+        self.captura = captura
+        self.request = request
+        self.response = response
+        self.contenido = iter(response.streaming_content)
+        self.terminado = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return self.captura.medir(next, self.contenido)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        if not self.terminado:
+            self.terminado = True
+            self.captura.terminar(self.request, self.response)
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('metrica', models.CharField(choices=[('dia_consolidado', 'Día consolidado'), ('doctores_creados', 'Doctores creados'), ('usuarios_registrados', 'Usuarios registrados'), ('horas_ofrecidas', 'Horas de atención ofrecidas'), ('excepciones_creadas', 'Excepciones creadas'), ('citas', 'Citas')], max_length=30, verbose_name='Métrica')),
+                ('dimension', models.CharField(blank=True, default='', help_text='Desglose de la métrica (tipo de usuario, estado, tipo de excepción)', max_length=30, verbose_name='Dimensión')),
+                ('valor', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Valor')),
+            ],
+            options={
+                'verbose_name': 'Estadística Diaria',
+                'verbose_name_plural': 'Estadísticas Diarias',
+                'ordering': ['fecha', 'metrica', 'dimension'],
+                'indexes': [models.Index(fields=['metrica', 'fecha'], name='estadistica_metrica_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'metrica', 'dimension'), name='estadistica_unica_fecha_metrica')],
+            },
+        ),
+    ]
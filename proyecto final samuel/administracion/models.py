@@ -1,3 +1,68 @@
 from django.db import models
 
-# Create your models here.
+
+class EstadisticaDiaria(models.Model):
+    """
+    Hechos diarios precalculados para la página de estadísticas.
+    Cada fila es el valor de una métrica en un día, opcionalmente desglosada
+    por una dimensión (tipo de usuario, estado de la cita, tipo de excepción).
+    La llena el comando `consolidar_estadisticas` (ver estadisticas.py).
+    """
+    METRICA_DIA_CONSOLIDADO = 'dia_consolidado'
+    METRICA_DOCTORES_CREADOS = 'doctores_creados'
+    METRICA_USUARIOS_REGISTRADOS = 'usuarios_registrados'
+    METRICA_HORAS_OFRECIDAS = 'horas_ofrecidas'
+    METRICA_EXCEPCIONES_CREADAS = 'excepciones_creadas'
+    METRICA_CITAS = 'citas'
+
+    METRICA_CHOICES = [
+        (METRICA_DIA_CONSOLIDADO, 'Día consolidado'),
+        (METRICA_DOCTORES_CREADOS, 'Doctores creados'),
+        (METRICA_USUARIOS_REGISTRADOS, 'Usuarios registrados'),
+        (METRICA_HORAS_OFRECIDAS, 'Horas de atención ofrecidas'),
+        (METRICA_EXCEPCIONES_CREADAS, 'Excepciones creadas'),
+        (METRICA_CITAS, 'Citas'),
+    ]
+
+    fecha = models.DateField(
+        verbose_name='Fecha'
+    )
+
+    metrica = models.CharField(
+        max_length=30,
+        choices=METRICA_CHOICES,
+        verbose_name='Métrica'
+    )
+
+    dimension = models.CharField(
+        max_length=30,
+        blank=True,
+        default='',
+        verbose_name='Dimensión',
+        help_text='Desglose de la métrica (tipo de usuario, estado, tipo de excepción)'
+    )
+
+    valor = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='Valor'
+    )
+
+    class Meta:
+        verbose_name = 'Estadística Diaria'
+        verbose_name_plural = 'Estadísticas Diarias'
+        ordering = ['fecha', 'metrica', 'dimension']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'metrica', 'dimension'],
+                name='estadistica_unica_fecha_metrica'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['metrica', 'fecha'], name='estadistica_metrica_fecha_idx'),
+        ]
+
+    def __str__(self):
+        dimension = f' ({self.dimension})' if self.dimension else ''
+        return f"{self.fecha} - {self.get_metrica_display()}{dimension}: {self.valor}"
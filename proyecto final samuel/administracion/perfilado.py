@@ -0,0 +1,161 @@
+"""
+Perfilado bajo demanda de peticiones individuales
+
+Un administrador genera un token firmado (válido PERFILADO_VIGENCIA_TOKEN
+segundos) y lo agrega a cualquier URL como `?perfilar=<token>` o en la
+cabecera `X-Perfilar`. PerfiladoMiddleware ejecuta esa única petición con
+cProfile y tracemalloc, y guarda en PERFILADO_DIRECTORIO:
+
+- `<nombre>.prof`: estadísticas de cProfile (pstats, snakeviz, etc.);
+- `<nombre>.json`: resumen con las funciones más costosas, las líneas que
+  más memoria asignaron y el plan (EXPLAIN) de cada consulta que tardó más
+  de PERFILADO_UMBRAL_CONSULTA_MS.
+
+Solo se conservan los PERFILADO_MAXIMO_PERFILES más recientes; al guardar
+uno nuevo se borran los más antiguos.
+
+tracemalloc es global al proceso: con varios hilos atendiendo peticiones,
+las asignaciones de las demás peticiones concurrentes también aparecen.
+"""
+import io
+import json
+import pstats
+import re
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+SAL_TOKEN = 'administracion.perfilado'
+PARAMETRO = 'perfilar'
+CABECERA = 'HTTP_X_PERFILAR'
+
+# Funciones y líneas de memoria que se guardan en el resumen
+FUNCIONES_RESUMEN = 40
+LINEAS_MEMORIA = 20
+
+_NOMBRE_VALIDO = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{8}$')
+
+
+def token_perfilado(usuario):
+    """Token firmado y con vencimiento que autoriza a perfilar peticiones del usuario"""
+    return signing.TimestampSigner(salt=SAL_TOKEN).sign(str(usuario.pk))
+
+
+def token_valido(token, usuario):
+    """Indica si el token es vigente, es del usuario y el usuario es administrador"""
+    if not usuario.is_authenticated or not usuario.es_administrador():
+        return False
+    try:
+        usuario_id = signing.TimestampSigner(salt=SAL_TOKEN).unsign(
+            token, max_age=settings.PERFILADO_VIGENCIA_TOKEN
+        )
+    except signing.BadSignature:
+        return False
+    return usuario_id == str(usuario.pk)
+
+
+def directorio():
+    return Path(settings.PERFILADO_DIRECTORIO)
+
+
+def nuevo_nombre():
+    return f'{timezone.localtime():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}'
+
+
+def ruta_perfil(nombre, extension):
+    """Ruta del archivo del perfil, o None si el nombre no es válido"""
+    if not _NOMBRE_VALIDO.match(nombre):
+        return None
+    return directorio() / f'{nombre}.{extension}'
+
+
+class ConsultasLentas:
+    """Envoltorio de execute_wrapper que guarda las consultas que superan el umbral"""
+
+    def __init__(self, umbral_ms):
+        self.umbral = umbral_ms / 1000
+        self.consultas = []
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.total += 1
+            if duracion >= self.umbral and not many:
+                self.consultas.append((context['connection'], sql, params, duracion))
+
+
+def explicar(conexion, sql, params):
+    """Plan de ejecución de una consulta de lectura, como lista de líneas"""
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return ['(solo se explican consultas de lectura)']
+    if conexion.vendor == 'sqlite':
+        prefijo = 'EXPLAIN QUERY PLAN '
+    elif conexion.vendor == 'postgresql':
+        prefijo = 'EXPLAIN '
+    else:
+        return [f'(EXPLAIN no disponible en {conexion.vendor})']
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute(prefijo + sql, params)
+            return [' | '.join(str(valor) for valor in fila) for fila in cursor.fetchall()]
+    except Exception as error:
+        return [f'(no se pudo explicar: {error})']
+
+
+def resumen_funciones(perfil):
+    salida = io.StringIO()
+    pstats.Stats(perfil, stream=salida).strip_dirs().sort_stats('cumulative').print_stats(FUNCIONES_RESUMEN)
+    return salida.getvalue()
+
+
+def guardar_perfil(nombre, perfil, datos):
+    """Guarda el .prof y el resumen JSON del perfil"""
+    directorio().mkdir(parents=True, exist_ok=True)
+    perfil.dump_stats(ruta_perfil(nombre, 'prof'))
+    datos = dict(datos, nombre=nombre, funciones=resumen_funciones(perfil))
+    with open(ruta_perfil(nombre, 'json'), 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo, indent=2, ensure_ascii=False)
+    limpiar_perfiles()
+    return datos
+
+
+def limpiar_perfiles(conservar=None):
+    """Borra los perfiles más antiguos y deja los `conservar` más recientes"""
+    if conservar is None:
+        conservar = settings.PERFILADO_MAXIMO_PERFILES
+    # El nombre empieza con la fecha, así que el orden alfabético es el cronológico
+    nombres = sorted({
+        archivo.stem for archivo in directorio().glob('*.*')
+        if archivo.suffix in ('.prof', '.json') and _NOMBRE_VALIDO.match(archivo.stem)
+    }, reverse=True)
+    for nombre in nombres[conservar:]:
+        for extension in ('prof', 'json'):
+            ruta_perfil(nombre, extension).unlink(missing_ok=True)
+
+
+def cargar_perfil(nombre):
+    """Resumen JSON del perfil, o None si no existe"""
+    ruta = ruta_perfil(nombre, 'json')
+    if ruta is None or not ruta.exists():
+        return None
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def listar_perfiles(limite=50):
+    """Resúmenes de los perfiles guardados, del más reciente al más antiguo"""
+    archivos = sorted(directorio().glob('*.json'), reverse=True)[:limite]
+    perfiles = []
+    for archivo in archivos:
+        datos = cargar_perfil(archivo.stem)
+        if datos:
+            perfiles.append(datos)
+    return perfiles
@@ -0,0 +1,34 @@
+"""
+Señales de la app administracion
+
+Invalidan el resumen del dashboard cuando cambian los datos que lo componen.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from doctores.models import Doctor, Especialidad, HorarioAtencion, ExcepcionHorario
+from .tablero import invalidar_resumen
+
+Usuario = get_user_model()
+
+
+@receiver(post_save, sender=Usuario)
+def usuario_guardado(sender, instance, update_fields=None, **kwargs):
+    # Cada inicio de sesión guarda last_login; eso no cambia el dashboard
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidar_resumen()
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_save, sender=Especialidad)
+@receiver(post_save, sender=HorarioAtencion)
+@receiver(post_save, sender=ExcepcionHorario)
+@receiver(post_delete, sender=Usuario)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_delete, sender=Especialidad)
+@receiver(post_delete, sender=HorarioAtencion)
+@receiver(post_delete, sender=ExcepcionHorario)
+def datos_tablero_modificados(sender, **kwargs):
+    invalidar_resumen()
@@ -0,0 +1,125 @@
+"""
+Resumen del dashboard administrativo
+
+Todas las cifras se obtienen con unas pocas consultas agregadas y el
+resultado se guarda por un tiempo corto (TABLERO_CACHE_TIMEOUT) en la caché
+TABLERO_CACHE, que es la misma caché compartida de la disponibilidad: con
+varios trabajadores de gunicorn, una invalidación llega a todos.
+Las señales de la app lo invalidan cuando cambian usuarios, doctores,
+especialidades, horarios o excepciones, así que muchos administradores y
+recepcionistas refrescando la página comparten el mismo cálculo. Las
+citas no lo invalidan (cambian con cada reserva): sus cifras pueden tener
+hasta TABLERO_CACHE_TIMEOUT segundos de atraso.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from citas.models import Cita
+from doctores.disponibilidad import inicio_del_dia
+from doctores.models import Doctor, Especialidad, HorarioAtencion, ExcepcionHorario
+
+Usuario = get_user_model()
+
+CLAVE_TABLERO = 'administracion:tablero'
+
+# Claves del resumen por tipo de usuario, en el orden de Usuario.TIPO_USUARIO_CHOICES
+CLAVES_TIPO_USUARIO = {
+    'administrador': 'administradores',
+    'doctor': 'doctores',
+    'recepcion': 'recepcion',
+    'paciente': 'pacientes',
+}
+
+
+def calcular_resumen():
+    """Calcula las cifras del dashboard con siete consultas"""
+    ahora = timezone.now()
+    hoy = timezone.localdate()
+
+    # Doctores activos y cuántos no tienen horarios, en una sola consulta
+    doctores = Doctor.objects.filter(activo=True).aggregate(
+        total=Count('id'),
+        sin_horarios=Count('id', filter=~Exists(
+            HorarioAtencion.objects.filter(doctor=OuterRef('pk'))
+        )),
+    )
+
+    # Especialidades activas con su cantidad de doctores
+    doctores_por_especialidad = list(Especialidad.objects.filter(
+        activa=True
+    ).annotate(
+        total_doctores=Count('doctor', filter=Q(doctor__activo=True))
+    ).order_by('-total_doctores'))
+
+    # Usuarios activos por tipo, agrupados en una consulta
+    usuarios_por_tipo = {clave: 0 for clave in CLAVES_TIPO_USUARIO.values()}
+    for tipo, total in Usuario.objects.filter(is_active=True).values_list(
+        'tipo_usuario'
+    ).annotate(total=Count('id')).order_by():
+        if tipo in CLAVES_TIPO_USUARIO:
+            usuarios_por_tipo[CLAVES_TIPO_USUARIO[tipo]] = total
+
+    # Excepciones que se cruzan con el día de hoy (rango sobre columnas indexadas)
+    excepciones_hoy = ExcepcionHorario.objects.filter(
+        fecha_inicio__lt=inicio_del_dia(hoy + timedelta(days=1)),
+        fecha_fin__gte=inicio_del_dia(hoy)
+    ).count()
+
+    # Citas de hoy en adelante (índice cita_inicio_idx), en una sola consulta
+    manana = inicio_del_dia(hoy + timedelta(days=1))
+    vigente = ~Q(estado__in=Cita.ESTADOS_LIBERADOS)
+    citas = Cita.objects.filter(fecha_hora_inicio__gte=inicio_del_dia(hoy)).aggregate(
+        hoy=Count('id', filter=vigente & Q(fecha_hora_inicio__lt=manana)),
+        proxima_semana=Count('id', filter=vigente & Q(fecha_hora_inicio__lt=manana + timedelta(days=7))),
+        por_reprogramar=Count('id', filter=Q(estado='por_reprogramar')),
+    )
+
+    ultimos_doctores = list(Doctor.objects.filter(
+        activo=True
+    ).select_related('usuario', 'especialidad').order_by('-fecha_creacion')[:5])
+
+    excepciones_proximas = list(ExcepcionHorario.objects.filter(
+        fecha_inicio__gte=ahora,
+        fecha_inicio__lte=ahora + timedelta(days=7)
+    ).select_related('doctor', 'doctor__usuario').order_by('fecha_inicio')[:5])
+
+    return {
+        'total_doctores': doctores['total'],
+        'total_especialidades': len(doctores_por_especialidad),
+        'total_usuarios': sum(usuarios_por_tipo.values()),
+        'doctores_sin_horarios': doctores['sin_horarios'],
+        'excepciones_hoy': excepciones_hoy,
+        'citas_hoy': citas['hoy'],
+        'citas_proxima_semana': citas['proxima_semana'],
+        'citas_por_reprogramar': citas['por_reprogramar'],
+        'doctores_por_especialidad': doctores_por_especialidad,
+        'ultimos_doctores': ultimos_doctores,
+        'excepciones_proximas': excepciones_proximas,
+        'usuarios_por_tipo': usuarios_por_tipo,
+    }
+
+
+def obtener_cache():
+    """Backend configurado para el resumen (TABLERO_CACHE)"""
+    return caches[getattr(settings, 'TABLERO_CACHE', 'default')]
+
+
+def obtener_resumen():
+    """Retorna el resumen desde la caché, calculándolo si no está"""
+    cache = obtener_cache()
+    resumen = cache.get(CLAVE_TABLERO)
+    if resumen is None:
+        resumen = calcular_resumen()
+        cache.set(CLAVE_TABLERO, resumen, getattr(settings, 'TABLERO_CACHE_TIMEOUT', 60))
+    return resumen
+
+
+def invalidar_resumen():
+    """Descarta el resumen cuando la transacción actual se confirme"""
+    transaction.on_commit(lambda: obtener_cache().delete(CLAVE_TABLERO))
@@ -1,3 +1,731 @@
-from django.test import TestCase
+import json
+import pstats
+import re
+import tempfile
+from collections import Counter
+from datetime import datetime, time, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from administracion import estadisticas, perfilado, tablero
+from administracion import middleware as middleware_perfilado
+from administracion.models import EstadisticaDiaria
+from citas.models import Cita
+from citas.services import agendar_cita
+from agenda_medica import metricas, middleware
+from doctores import calendario_ical
+from doctores.models import Doctor, Especialidad, ExcepcionHorario, HorarioAtencion
+from notificaciones.services import encolar
+from usuarios.models import Usuario
+
+
+def normalizar_sql(sql):
+    """Reemplaza los valores literales para agrupar las consultas repetidas"""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    return re.sub(r'\(\?(?:, \?)*\)', '(...)', sql)
+
+
+def consultas_repetidas(capturadas):
+    """Consultas que se ejecutaron más de una vez con distintos valores (N+1)"""
+    conteo = Counter(normalizar_sql(consulta['sql']) for consulta in capturadas)
+    return [(veces, sql) for sql, veces in conteo.most_common() if veces > 1]
+
+
+class PresupuestoConsultasTest(TestCase):
+    """
+    Cada vista tiene un presupuesto de consultas. Se mide con dos tamaños de
+    datos: si la cantidad de consultas crece con los datos (N+1) o supera el
+    presupuesto, la prueba falla y muestra las consultas repetidas.
+    """
+
+    # (nombre de la URL, usuario, argumentos, parámetros GET, presupuesto)
+    VISTAS_DOCTORES = [
+        ('doctores:lista_doctores', 'administrador', None, {}, 4),
+        ('doctores:lista_doctores', 'administrador', None, {'busqueda': 'doctor'}, 4),
+        ('doctores:crear_doctor', 'administrador', None, {}, 3),
+        ('doctores:editar_doctor', 'administrador', lambda t: [t.doctor.pk], {}, 7),
+        # eliminar_doctor no se mide: solo recibe el POST del formulario de edición
+        ('doctores:gestionar_horarios', 'medico', None, {}, 4),
+        ('doctores:gestionar_horarios', 'administrador', None, {'doctor_id': 'doctor'}, 4),
+        ('doctores:editar_horario', 'medico', lambda t: [t.horario.pk], {}, 3),
+        ('doctores:eliminar_horario', 'medico', lambda t: [t.horario.pk], {}, 3),
+        ('doctores:gestionar_excepciones', 'medico', None, {}, 4),
+        ('doctores:eliminar_excepcion', 'medico', lambda t: [t.excepcion.pk], {}, 3),
+        ('doctores:calendario_citas', 'recepcion', None, {'fecha': 'lunes'}, 7),
+        ('doctores:calendario_ical_doctor', None, lambda t: [calendario_ical.token_doctor(t.doctor)], {}, 4),
+        ('doctores:consultar_disponibilidad', None, None, {'fecha_inicio': 'hoy', 'fecha_fin': 'semana'}, 6),
+        ('doctores:exportar_disponibilidad', 'recepcion', None, {'fecha_inicio': 'hoy', 'fecha_fin': 'semana'}, 6),
+        ('doctores:directorio_doctores', None, None, {}, 2),
+        ('doctores:obtener_horarios_doctor', 'paciente', lambda t: [t.doctor.pk], {}, 5),
+        ('doctores:obtener_excepciones_doctor', 'paciente', lambda t: [t.doctor.pk], {}, 5),
+        ('doctores:proximas_franjas_disponibles', 'paciente', None, {'especialidad': 'especialidad'}, 13),
+        ('doctores:estadisticas_cache_disponibilidad', 'administrador', None, {}, 2),
+    ]
+
+    VISTAS_ADMINISTRACION = [
+        ('administracion:dashboard', 'administrador', None, {}, 9),
+        ('administracion:gestion_usuarios', 'administrador', None, {}, 10),
+        ('administracion:gestion_usuarios', 'administrador', None, {'busqueda': 'paciente'}, 10),
+        ('administracion:estadisticas', 'administrador', None, {}, 10),
+        # detalle_perfil y descargar_perfil necesitan un perfil guardado (ver PerfiladoTest)
+        ('administracion:perfiles', 'administrador', None, {}, 2),
+    ]
+
+    VISTAS_USUARIOS = [
+        ('usuarios:home', None, None, {}, 0),
+        ('usuarios:login', None, None, {}, 0),
+        ('usuarios:registro', None, None, {}, 0),
+        ('usuarios:registro_exitoso', None, None, {}, 0),
+        ('usuarios:dashboard', 'paciente', None, {}, 2),
+        ('usuarios:logout', 'paciente', None, {}, 4),
+    ]
+
+    # Presupuesto de cada listado del admin de Django
+    PRESUPUESTO_ADMIN = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre='Cardiología')
+        cls.administrador = Usuario.objects.create_superuser(
+            email='admin@agenda.com', username='admin', password='clave',
+            first_name='Ana', last_name='Admin', tipo_usuario='administrador'
+        )
+        cls.recepcion = Usuario.objects.create_user(
+            email='recepcion@agenda.com', username='recepcion',
+            first_name='Rita', last_name='Recepción', tipo_usuario='recepcion'
+        )
+        cls.paciente = Usuario.objects.create_user(
+            email='paciente@agenda.com', username='paciente',
+            first_name='Pedro', last_name='Paciente', tipo_usuario='paciente'
+        )
+        hoy = timezone.localdate()
+        # Próximo lunes, para que todos los doctores tengan horario ese día
+        cls.lunes = hoy + timedelta(days=7 - hoy.weekday())
+        cls.cantidad = 0
+
+        cls.doctor = cls.crear_doctor()
+        cls.medico = cls.doctor.usuario
+        cls.horario = cls.doctor.horarios_atencion.get(dia_semana=0)
+        cls.excepcion = cls.doctor.excepciones_horario.first()
+
+    @classmethod
+    def crear_doctor(cls):
+        """Un doctor con horario de lunes a viernes, una excepción, dos citas y sus avisos"""
+        cls.cantidad += 1
+        numero = cls.cantidad
+        usuario = Usuario.objects.create_user(
+            email=f'doctor{numero}@agenda.com', username=f'doctor{numero}',
+            first_name='Doctor', last_name=str(numero), tipo_usuario='doctor'
+        )
+        doctor = Doctor.objects.create(
+            usuario=usuario, especialidad=cls.especialidad, numero_licencia=f'LIC-{numero}'
+        )
+        for dia in range(5):
+            HorarioAtencion.objects.create(
+                doctor=doctor, dia_semana=dia, hora_inicio=time(8), hora_fin=time(12), duracion_cita=30
+            )
+        inicio = timezone.make_aware(datetime.combine(cls.lunes + timedelta(days=1), time(10)))
+        ExcepcionHorario.objects.create(
+            doctor=doctor, fecha_inicio=inicio, fecha_fin=inicio + timedelta(hours=1),
+            tipo_excepcion='personal', motivo=f'Trámite {numero}', creado_por=cls.administrador
+        )
+        for hora in (8, 9):
+            paciente = Usuario.objects.create_user(
+                email=f'paciente{numero}-{hora}@agenda.com', username=f'paciente{numero}-{hora}',
+                first_name='Paciente', last_name=f'{numero}-{hora}', tipo_usuario='paciente'
+            )
+            agendar_cita(paciente, doctor, timezone.make_aware(datetime.combine(cls.lunes, time(hora))))
+            encolar(paciente.email, 'Aviso de prueba', asunto='Aviso', tipo='otro')
+        return doctor
+
+    def parametros(self, parametros):
+        valores = {
+            'doctor': self.doctor.pk,
+            'especialidad': self.especialidad.pk,
+            'lunes': self.lunes,
+            'hoy': timezone.localdate(),
+            'semana': timezone.localdate() + timedelta(days=6),
+        }
+        return {clave: valores.get(valor, valor) for clave, valor in parametros.items()}
+
+    def medir(self, url, usuario, parametros=None):
+        """
+        Retorna las consultas capturadas de un GET a la URL. Se pide dos veces
+        y se conserva la segunda: la primera llena los cachés del proceso
+        (p. ej. la detección de FTS5), que no dependen de los datos.
+        """
+        for _ in range(2):
+            for alias in ('default', 'disponibilidad'):
+                caches[alias].clear()
+            self.client.logout()
+            if usuario:
+                self.client.force_login(getattr(self, usuario))
+            with CaptureQueriesContext(connection) as capturadas:
+                response = self.client.get(url, parametros or {})
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+            self.assertLess(response.status_code, 400, f'{url} respondió {response.status_code}')
+        return capturadas.captured_queries
+
+    def mensaje(self, url, pocas, muchas, presupuesto):
+        repetidas = '\n'.join(f'  {veces}x {sql}' for veces, sql in consultas_repetidas(muchas))
+        return (
+            f'{url}: {len(pocas)} consultas con pocos datos, {len(muchas)} con más datos '
+            f'(presupuesto {presupuesto}).\nConsultas repetidas:\n{repetidas or "  (ninguna)"}'
+        )
+
+    def verificar(self, casos):
+        """Mide todos los casos, agrega datos, vuelve a medir y compara"""
+        urls = [
+            (reverse(nombre, args=argumentos(self) if argumentos else None), usuario, parametros, presupuesto)
+            for nombre, usuario, argumentos, parametros, presupuesto in casos
+        ]
+        pocas = [self.medir(url, usuario, self.parametros(parametros)) for url, usuario, parametros, _ in urls]
+
+        for _ in range(4):
+            self.crear_doctor()
+        # El doctor medido también tiene más excepciones
+        inicio = timezone.make_aware(datetime.combine(self.lunes + timedelta(days=2), time(8)))
+        for hora in range(3):
+            ExcepcionHorario.objects.create(
+                doctor=self.doctor, fecha_inicio=inicio + timedelta(hours=hora),
+                fecha_fin=inicio + timedelta(hours=hora, minutes=30), tipo_excepcion='personal',
+                motivo='Reunión', creado_por=self.administrador
+            )
+
+        for (url, usuario, parametros, presupuesto), antes in zip(urls, pocas):
+            with self.subTest(url=url, usuario=usuario, parametros=parametros):
+                despues = self.medir(url, usuario, self.parametros(parametros))
+                mensaje = self.mensaje(url, antes, despues, presupuesto)
+                self.assertLessEqual(len(despues), len(antes), mensaje)
+                self.assertLessEqual(max(len(antes), len(despues)), presupuesto, mensaje)
+
+    def test_vistas_doctores(self):
+        self.verificar(self.VISTAS_DOCTORES)
+
+    def test_vistas_administracion(self):
+        self.verificar(self.VISTAS_ADMINISTRACION)
+
+    def test_vistas_usuarios(self):
+        self.verificar(self.VISTAS_USUARIOS)
+
+    def test_listados_admin(self):
+        casos = [
+            (f'admin:{modelo._meta.app_label}_{modelo._meta.model_name}_changelist',
+             'administrador', None, {}, self.PRESUPUESTO_ADMIN)
+            for modelo in admin.site._registry
+        ]
+        self.verificar(casos)
+
+
+class TableroTest(TestCase):
+    """Cifras agregadas del dashboard y su caché"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiologia = Especialidad.objects.create(nombre='Cardiología')
+        cls.pediatria = Especialidad.objects.create(nombre='Pediatría')
+        Especialidad.objects.create(nombre='Cerrada', activa=False)
+        Usuario.objects.create_user(
+            email='recepcion@agenda.com', username='recepcion',
+            first_name='Rita', last_name='Recepción', tipo_usuario='recepcion'
+        )
+        Usuario.objects.create_user(
+            email='inactivo@agenda.com', username='inactivo',
+            first_name='Iván', last_name='Inactivo', tipo_usuario='paciente', is_active=False
+        )
+        cls.doctores = []
+        for numero, (especialidad, activo) in enumerate(
+            [(cls.cardiologia, True), (cls.cardiologia, True), (cls.pediatria, False)], start=1
+        ):
+            usuario = Usuario.objects.create_user(
+                email=f'doctor{numero}@agenda.com', username=f'doctor{numero}',
+                first_name='Doctor', last_name=str(numero), tipo_usuario='doctor'
+            )
+            cls.doctores.append(Doctor.objects.create(
+                usuario=usuario, especialidad=especialidad, numero_licencia=f'LIC-{numero}', activo=activo
+            ))
+        # Solo el primer doctor tiene horarios
+        HorarioAtencion.objects.create(
+            doctor=cls.doctores[0], dia_semana=0, hora_inicio=time(8), hora_fin=time(12), duracion_cita=30
+        )
+        ahora = timezone.now()
+        hoy = ExcepcionHorario.objects.create(
+            doctor=cls.doctores[0], fecha_inicio=ahora + timedelta(minutes=1),
+            fecha_fin=ahora + timedelta(minutes=2), motivo='Hoy'
+        )
+        # Una excepción que empezó ayer y sigue hoy (save() no admite fechas pasadas)
+        ExcepcionHorario.objects.filter(pk=hoy.pk).update(fecha_inicio=ahora - timedelta(days=1))
+        ExcepcionHorario.objects.create(
+            doctor=cls.doctores[1], fecha_inicio=ahora + timedelta(days=3),
+            fecha_fin=ahora + timedelta(days=3, hours=1), motivo='Próxima'
+        )
+        paciente = Usuario.objects.create_user(
+            email='paciente@agenda.com', username='paciente',
+            first_name='Pedro', last_name='Paciente', tipo_usuario='paciente', is_active=False
+        )
+        # Hoy, en 3 días, en 10 días, una cancelada hoy y una por reprogramar en 20 días
+        hoy = timezone.localdate()
+        for dias, estado in [(0, 'confirmada'), (3, 'confirmada'), (10, 'confirmada'), (0, 'cancelada'), (20, 'por_reprogramar')]:
+            inicio = timezone.make_aware(datetime.combine(hoy + timedelta(days=dias), time(10)))
+            Cita.objects.create(
+                paciente=paciente, doctor=cls.doctores[0], estado=estado,
+                fecha_hora_inicio=inicio, fecha_hora_fin=inicio + timedelta(minutes=30)
+            )
+
+    def setUp(self):
+        tablero.obtener_cache().clear()
+
+    def test_cifras(self):
+        with self.assertNumQueries(7):
+            resumen = tablero.calcular_resumen()
+
+        self.assertEqual(resumen['total_doctores'], 2)
+        self.assertEqual(resumen['doctores_sin_horarios'], 1)
+        self.assertEqual(resumen['total_especialidades'], 2)
+        self.assertEqual(
+            [(especialidad.nombre, especialidad.total_doctores) for especialidad in resumen['doctores_por_especialidad']],
+            [('Cardiología', 2), ('Pediatría', 0)]
+        )
+        self.assertEqual(resumen['usuarios_por_tipo'], {
+            'administradores': 0, 'doctores': 3, 'recepcion': 1, 'pacientes': 0,
+        })
+        self.assertEqual(resumen['total_usuarios'], 4)
+        self.assertEqual(resumen['excepciones_hoy'], 1)
+        self.assertEqual([excepcion.motivo for excepcion in resumen['excepciones_proximas']], ['Próxima'])
+        self.assertEqual(len(resumen['ultimos_doctores']), 2)
+        self.assertEqual(
+            (resumen['citas_hoy'], resumen['citas_proxima_semana'], resumen['citas_por_reprogramar']), (1, 2, 1)
+        )
+
+    def test_resumen_en_cache_hasta_que_cambian_los_datos(self):
+        tablero.obtener_resumen()
+        with self.assertNumQueries(0):
+            self.assertEqual(tablero.obtener_resumen()['total_doctores'], 2)
+
+        doctor = self.doctores[2]
+        doctor.activo = True
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor.save()
+        self.assertEqual(tablero.obtener_resumen()['total_doctores'], 3)
+
+
+class EstadisticasTest(TestCase):
+    """Consolidación diaria: solo el tramo continuo cuenta como consolidado"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hoy = timezone.localdate()
+        for numero, dias_atras in enumerate([10, 5, 2, 0], start=1):
+            usuario = Usuario.objects.create_user(
+                email=f'paciente{numero}@agenda.com', username=f'paciente{numero}',
+                first_name='Paciente', last_name=str(numero), tipo_usuario='paciente'
+            )
+            fecha = timezone.make_aware(datetime.combine(cls.hoy - timedelta(days=dias_atras), time(12)))
+            Usuario.objects.filter(pk=usuario.pk).update(date_joined=fecha)
+
+    def dia(self, dias_atras):
+        return self.hoy - timedelta(days=dias_atras)
+
+    def test_un_hueco_corta_el_tramo_consolidado(self):
+        estadisticas.consolidar(self.dia(12), self.dia(8))
+        estadisticas.consolidar(self.dia(3), self.dia(1))
+
+        self.assertEqual(estadisticas.consolidado_hasta(), self.dia(8))
+        self.assertEqual(estadisticas.consolidado_hasta(desde=self.dia(4)), self.dia(1))
+        # El usuario del hueco (hace 5 días) y el de hoy se calculan en vivo
+        resumen = estadisticas.resumen_mensual()
+        self.assertEqual(sum(mes['usuarios_total'] for mes in resumen), 4)
+
+    def test_pendientes_rellenan_el_hueco(self):
+        estadisticas.consolidar(self.dia(12), self.dia(8))
+        estadisticas.consolidar(self.dia(3), self.dia(1))
+
+        desde, hasta, _ = estadisticas.consolidar_pendientes(dias_recalculo=1)
+        self.assertEqual((desde, hasta), (self.dia(7), self.dia(1)))
+        # Sin huecos basta una consulta agregada, sin leer las marcas
+        with self.assertNumQueries(1):
+            self.assertEqual(estadisticas.consolidado_hasta(), self.dia(1))
+        self.assertEqual(sum(mes['usuarios_total'] for mes in estadisticas.resumen_mensual()), 4)
+
+    def test_no_consolida_hoy_ni_dias_futuros(self):
+        self.assertEqual(estadisticas.consolidar(self.dia(2), self.hoy + timedelta(days=3)), 2)
+
+        self.assertFalse(EstadisticaDiaria.objects.filter(fecha__gte=self.hoy).exists())
+        self.assertEqual(estadisticas.consolidado_hasta(), self.dia(1))
+        # Un usuario que se registra hoy después de consolidar aparece de inmediato
+        Usuario.objects.create_user(
+            email='nuevo@agenda.com', username='nuevo',
+            first_name='Nuevo', last_name='Paciente', tipo_usuario='paciente'
+        )
+        self.assertEqual(sum(mes['usuarios_total'] for mes in estadisticas.resumen_mensual()), 5)
+
+
+class MedicionPeticionesTest(TestCase):
+    """Cabecera Server-Timing y línea JSON por petición"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.administrador = Usuario.objects.create_user(
+            email='admin@agenda.com', username='admin',
+            first_name='Ana', last_name='Admin', tipo_usuario='administrador', is_staff=True
+        )
+        usuario = Usuario.objects.create_user(
+            email='doctor@agenda.com', username='doctor',
+            first_name='Doctor', last_name='Uno', tipo_usuario='doctor'
+        )
+        doctor = Doctor.objects.create(
+            usuario=usuario, especialidad=Especialidad.objects.create(nombre='Cardiología'),
+            numero_licencia='LIC-1'
+        )
+        HorarioAtencion.objects.create(
+            doctor=doctor, dia_semana=0, hora_inicio=time(8), hora_fin=time(12), duracion_cita=30
+        )
+        hoy = timezone.localdate()
+        cls.rango = {'fecha_inicio': hoy.isoformat(), 'fecha_fin': (hoy + timedelta(days=7)).isoformat()}
+
+    def setUp(self):
+        for alias in ('default', 'disponibilidad'):
+            caches[alias].clear()
+
+    def test_server_timing_solo_para_el_personal(self):
+        url = reverse('doctores:directorio_doctores')
+        self.assertNotIn('Server-Timing', self.client.get(url))
+
+        self.client.force_login(self.administrador)
+        cabecera = self.client.get(url)['Server-Timing']
+        self.assertRegex(cabecera, r'^db;dur=[\d.]+;desc="\d+ consultas", vista;dur=[\d.]+, plantillas;dur=[\d.]+, total;dur=[\d.]+$')
+
+    @override_settings(DEBUG=True)
+    def test_server_timing_con_debug(self):
+        self.assertIn('Server-Timing', self.client.get(reverse('doctores:directorio_doctores')))
+
+    def test_linea_json(self):
+        with self.assertLogs('agenda_medica.peticiones', 'INFO') as registro:
+            self.client.get(reverse('doctores:directorio_doctores'), {'busqueda': 'doctor'})
+
+        linea = json.loads(registro.records[0].getMessage())
+        self.assertEqual(linea['vista'], 'doctores:directorio_doctores')
+        self.assertEqual((linea['metodo'], linea['ruta'], linea['estado']), ('GET', '/doctores/directorio/', 200))
+        self.assertGreater(linea['consultas'], 0)
+
+    def test_sin_info_no_arma_la_linea(self):
+        with mock.patch.object(middleware, 'json', wraps=json) as modulo_json:
+            self.client.get(reverse('doctores:directorio_doctores'))
+        modulo_json.dumps.assert_not_called()
+
+    def test_streaming_se_registra_al_terminar_el_cuerpo(self):
+        self.client.force_login(self.administrador)
+        with self.assertLogs('agenda_medica.peticiones', 'INFO') as registro:
+            response = self.client.get(reverse('doctores:exportar_disponibilidad'), self.rango)
+            self.assertEqual(registro.records, [])
+            lineas = b''.join(response.streaming_content).splitlines()
+
+        self.assertTrue(lineas)
+        linea = json.loads(registro.records[0].getMessage())
+        self.assertEqual(linea['vista'], 'doctores:exportar_disponibilidad')
+        # Las consultas del generador cuentan aunque ocurran después de la vista
+        self.assertGreater(linea['consultas'], 1)
+
+
+class PerfiladoTest(TestCase):
+    """Captura de un perfil con token firmado y su consulta desde la administración"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.administrador = Usuario.objects.create_superuser(
+            email='admin@agenda.com', username='admin', password='clave',
+            first_name='Ana', last_name='Admin', tipo_usuario='administrador'
+        )
+        cls.paciente = Usuario.objects.create_user(
+            email='paciente@agenda.com', username='paciente',
+            first_name='Pedro', last_name='Paciente', tipo_usuario='paciente'
+        )
+        Especialidad.objects.create(nombre='Cardiología')
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(PERFILADO_DIRECTORIO=directorio.name, PERFILADO_UMBRAL_CONSULTA_MS=0)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_captura_y_descarga(self):
+        self.client.force_login(self.administrador)
+        response = self.client.get(reverse('administracion:perfiles'), {'ruta': reverse('doctores:consultar_disponibilidad')})
+        response = self.client.get(response['Location'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Perfil', response)
+
+        perfil = perfilado.listar_perfiles()[0]
+        self.assertEqual(perfil['vista'], 'doctores:consultar_disponibilidad')
+        # Con umbral 0 todas las consultas de lectura llevan su plan
+        self.assertTrue(perfil['consultas_lentas'])
+        self.assertTrue(all(consulta['plan'] for consulta in perfil['consultas_lentas']))
+
+        self.assertEqual(self.client.get(response['X-Perfil']).status_code, 200)
+        descarga = self.client.get(reverse('administracion:descargar_perfil', args=[perfil['nombre']]))
+        self.assertEqual(descarga.status_code, 200)
+        self.assertIn('attachment', descarga['Content-Disposition'])
+
+    def test_token_de_no_administrador_se_ignora(self):
+        self.client.force_login(self.paciente)
+        token = perfilado.token_perfilado(self.paciente)
+        response = self.client.get(reverse('doctores:consultar_disponibilidad'), {'perfilar': token})
+        self.assertNotIn('X-Perfil', response)
+        self.assertEqual(perfilado.listar_perfiles(), [])
+
+    def test_token_de_otro_usuario_se_ignora(self):
+        self.client.force_login(self.administrador)
+        token = perfilado.token_perfilado(self.paciente)
+        response = self.client.get(reverse('doctores:consultar_disponibilidad'), HTTP_X_PERFILAR=token)
+        self.assertNotIn('X-Perfil', response)
+
+    def test_ruta_externa_no_se_redirige(self):
+        self.client.force_login(self.administrador)
+        response = self.client.get(reverse('administracion:perfiles'), {'ruta': 'https://otro.sitio/'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_un_perfil_a_la_vez(self):
+        self.client.force_login(self.administrador)
+        token = perfilado.token_perfilado(self.administrador)
+        with middleware_perfilado._perfilando:
+            with self.assertLogs('administracion.middleware', 'WARNING'):
+                response = self.client.get(reverse('doctores:consultar_disponibilidad'), {'perfilar': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Perfil', response)
+        self.assertEqual(perfilado.listar_perfiles(), [])
+
+        # Al terminar el perfil anterior se vuelve a perfilar
+        response = self.client.get(reverse('doctores:consultar_disponibilidad'), {'perfilar': token})
+        self.assertIn('X-Perfil', response)
+
+    def test_streaming_se_perfila_hasta_el_final_del_cuerpo(self):
+        self.client.force_login(self.administrador)
+        hoy = timezone.localdate()
+        parametros = {
+            'fecha_inicio': hoy, 'fecha_fin': hoy + timedelta(days=20),
+            'perfilar': perfilado.token_perfilado(self.administrador),
+        }
+        response = self.client.get(reverse('doctores:exportar_disponibilidad'), parametros)
+        self.assertIn('X-Perfil', response)
+        self.assertEqual(perfilado.listar_perfiles(), [])
+        self.assertTrue(middleware_perfilado._perfilando.locked())
+
+        b''.join(response.streaming_content)
+
+        self.assertFalse(middleware_perfilado._perfilando.locked())
+        perfil = perfilado.listar_perfiles()[0]
+        self.assertEqual(response['X-Perfil'], reverse('administracion:detalle_perfil', args=[perfil['nombre']]))
+        # El generador del cuerpo corre después de la vista y también queda en el perfil
+        estadisticas_perfil = pstats.Stats(str(perfilado.ruta_perfil(perfil['nombre'], 'prof')))
+        self.assertIn(
+            'generar_lineas_disponibilidad', {funcion for _, _, funcion in estadisticas_perfil.stats}
+        )
+
+    def test_streaming_sin_recorrer_libera_el_candado(self):
+        self.client.force_login(self.administrador)
+        response = self.client.get(reverse('doctores:exportar_disponibilidad'), {
+            'fecha_inicio': timezone.localdate(), 'fecha_fin': timezone.localdate(),
+            'perfilar': perfilado.token_perfilado(self.administrador),
+        })
+        response.close()
+
+        self.assertFalse(middleware_perfilado._perfilando.locked())
+        self.assertEqual(len(perfilado.listar_perfiles()), 1)
+
+    @override_settings(PERFILADO_MAXIMO_PERFILES=2)
+    def test_conserva_los_perfiles_mas_recientes(self):
+        self.client.force_login(self.administrador)
+        token = perfilado.token_perfilado(self.administrador)
+        enlaces = [
+            self.client.get(reverse('doctores:directorio_doctores'), {'perfilar': token})['X-Perfil']
+            for _ in range(3)
+        ]
+        nombres = sorted(enlace.rstrip('/').rsplit('/', 1)[-1] for enlace in enlaces)
+
+        self.assertEqual([perfil['nombre'] for perfil in perfilado.listar_perfiles()], nombres[:0:-1])
+        self.assertEqual(len(list(perfilado.directorio().iterdir())), 4)
+
+
+class MetricasTest(TestCase):
+    """Acceso a /metrics y contadores del dominio en formato Prometheus"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.administrador = Usuario.objects.create_user(
+            email='admin@agenda.com', username='admin',
+            first_name='Ana', last_name='Admin', tipo_usuario='administrador', is_staff=True
+        )
+        cls.paciente = Usuario.objects.create_user(
+            email='paciente@agenda.com', username='paciente',
+            first_name='Pedro', last_name='Paciente', tipo_usuario='paciente'
+        )
+        usuario = Usuario.objects.create_user(
+            email='doctor@agenda.com', username='doctor',
+            first_name='Doctor', last_name='Uno', tipo_usuario='doctor'
+        )
+        cls.doctor = Doctor.objects.create(
+            usuario=usuario, especialidad=Especialidad.objects.create(nombre='Cardiología'),
+            numero_licencia='LIC-1'
+        )
+        for dia in range(7):
+            HorarioAtencion.objects.create(
+                doctor=cls.doctor, dia_semana=dia, hora_inicio=time(8), hora_fin=time(12), duracion_cita=30
+            )
+
+    def setUp(self):
+        metricas.registro.reiniciar()
+
+    def test_adopta_los_archivos_de_procesos_terminados(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        terminado = Path(directorio.name) / 'metricas-99999-0123abcd.json'
+        terminado.write_text(json.dumps({'agenda_citas_total': [[['agendada'], 3]]}), encoding='utf-8')
+        vivo = Path(directorio.name) / 'metricas-88888-0123abcd.json'
+        vivo.write_text(json.dumps({'agenda_citas_total': [[['agendada'], 2]]}), encoding='utf-8')
+
+        with override_settings(METRICAS_DIRECTORIO=directorio.name), \
+                mock.patch.object(metricas, '_proceso_vivo', side_effect=lambda pid: pid != 99999):
+            for _ in range(2):
+                self.assertIn('agenda_citas_total{evento="agendada"} 5\n', metricas.registro.exponer())
+
+        self.assertFalse(terminado.exists())
+        self.assertEqual(
+            sorted(archivo.name for archivo in Path(directorio.name).iterdir()),
+            sorted([vivo.name, metricas.registro.archivo])
+        )
+
+    def test_solo_con_token_o_personal(self):
+        # La dirección de origen no autoriza: detrás de un proxy siempre es local
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(self.paciente)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.logout()
+
+        with override_settings(METRICAS_TOKEN='secreto'):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Basic secreto').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto').status_code, 200)
+
+        self.client.force_login(self.administrador)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_exposicion(self):
+        manana = timezone.localdate() + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            agendar_cita(self.paciente, self.doctor, timezone.make_aware(datetime.combine(manana, time(9))))
+        self.client.get(reverse('doctores:consultar_disponibilidad'))
+
+        self.client.force_login(self.administrador)
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], metricas.TIPO_CONTENIDO)
+        texto = response.content.decode()
+        self.assertIn('agenda_citas_total{evento="agendada"} 1\n', texto)
+        self.assertIn('# TYPE agenda_peticion_duracion_segundos histogram', texto)
+        self.assertIn(
+            'agenda_peticion_duracion_segundos_count{vista="doctores:consultar_disponibilidad",metodo="GET"} 1', texto
+        )
+        self.assertRegex(texto, r'agenda_franjas_calculadas_total [1-9]')
+
+
+class ComandosRendimientoTest(TestCase):
+    """Datos sintéticos reproducibles y reporte del benchmark de vistas"""
+
+    CANTIDADES = ['--doctores=3', '--pacientes=5', '--citas=12', '--dias=3', '--semilla=7']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.administrador = Usuario.objects.create_user(
+            email='admin@agenda.com', username='admin',
+            first_name='Ana', last_name='Admin', tipo_usuario='administrador'
+        )
+        Especialidad.objects.create(nombre='Cardiología')
+
+    def generar(self, *opciones):
+        call_command('generar_datos_sinteticos', *self.CANTIDADES, *opciones, stdout=StringIO())
+
+    def foto(self):
+        """Datos generados sin ids, que cambian de una ejecución a otra"""
+        return (
+            list(Usuario.objects.filter(email__endswith='@sintetico.test').order_by('email').values_list(
+                'email', 'first_name', 'last_name', 'telefono', 'tipo_usuario'
+            )),
+            list(Doctor.objects.order_by('numero_licencia').values_list(
+                'usuario__email', 'especialidad__nombre', 'numero_licencia', 'consultorio'
+            )),
+            list(HorarioAtencion.objects.order_by('doctor__usuario__email', 'dia_semana').values_list(
+                'doctor__usuario__email', 'dia_semana', 'hora_inicio', 'hora_fin', 'duracion_cita'
+            )),
+            list(ExcepcionHorario.objects.order_by('doctor__usuario__email', 'fecha_inicio').values_list(
+                'doctor__usuario__email', 'fecha_inicio', 'fecha_fin', 'tipo_excepcion', 'todo_el_dia'
+            )),
+            list(Cita.objects.order_by('doctor__usuario__email', 'fecha_hora_inicio').values_list(
+                'doctor__usuario__email', 'paciente__email', 'fecha_hora_inicio', 'estado'
+            )),
+        )
+
+    def test_misma_semilla_mismos_datos(self):
+        self.generar()
+        primera = self.foto()
+        self.generar('--eliminar')
+
+        self.assertEqual(self.foto(), primera)
+        self.assertEqual(len(primera[1]), 3)
+        self.assertEqual(len(primera[4]), 12)
+
+    def test_eliminar_solo_borra_lo_sintetico(self):
+        especialidad = Especialidad.objects.get()
+        medico = Usuario.objects.create_user(
+            email='doctor@agenda.com', username='doctor',
+            first_name='Doctor', last_name='Real', tipo_usuario='doctor'
+        )
+        doctor = Doctor.objects.create(usuario=medico, especialidad=especialidad, numero_licencia='LIC-1')
+        paciente = Usuario.objects.create_user(
+            email='paciente@agenda.com', username='paciente',
+            first_name='Pedro', last_name='Paciente', tipo_usuario='paciente'
+        )
+        inicio = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=1), time(9)))
+        cita = Cita.objects.create(
+            paciente=paciente, doctor=doctor, fecha_hora_inicio=inicio,
+            fecha_hora_fin=inicio + timedelta(minutes=30), motivo='Control'
+        )
+        self.generar()
+
+        call_command('generar_datos_sinteticos', '--eliminar', '--doctores=0', '--pacientes=0', '--citas=0',
+                     stdout=StringIO())
+
+        self.assertFalse(Usuario.objects.filter(email__endswith='@sintetico.test').exists())
+        self.assertEqual(
+            set(Usuario.objects.values_list('email', flat=True)),
+            {'admin@agenda.com', 'doctor@agenda.com', 'paciente@agenda.com'}
+        )
+        self.assertEqual(list(Doctor.objects.all()), [doctor])
+        self.assertEqual(list(Cita.objects.all()), [cita])
+
+    def test_benchmark_guarda_el_reporte(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        salida = Path(directorio.name) / 'reporte.json'
+
+        call_command(
+            'benchmark_vistas', '--repeticiones=2', '--vista=dashboard_admin', '--vista=lista_doctores',
+            f'--salida={salida}', stdout=StringIO()
+        )
+
+        reporte = json.loads(salida.read_text(encoding='utf-8'))
+        self.assertEqual(set(reporte['vistas']), {'dashboard_admin', 'lista_doctores'})
+        self.assertEqual(reporte['repeticiones'], 2)
+        self.assertEqual(reporte['entorno']['base_datos'], connection.vendor)
+        self.assertGreater(reporte['vistas']['dashboard_admin']['consultas'], 0)
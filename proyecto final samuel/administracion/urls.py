@@ -12,4 +12,9 @@ urlpatterns = [
     
     # Estadísticas
     path('estadisticas/', views.estadisticas, name='estadisticas'),
+    
+    # Perfilado de peticiones
+    path('perfiles/', views.perfiles, name='perfiles'),
+    path('perfiles/<str:nombre>/', views.detalle_perfil, name='detalle_perfil'),
+    path('perfiles/<str:nombre>/descargar/', views.descargar_perfil, name='descargar_perfil'),
 ] 
\ No newline at end of file
@@ -1,4 +1,9 @@
+import secrets
+
+from django.conf import settings
 from django.shortcuts import render, redirect
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.db.models import Count, Q
@@ -6,11 +11,17 @@ from django.utils import timezone
 from datetime import datetime, timedelta
 from django.contrib.auth import get_user_model
 
+from agenda_medica import metricas as registro_metricas
 from doctores.models import Doctor, Especialidad, HorarioAtencion, ExcepcionHorario
-# from citas.models import Cita  # Se descomentará cuando se implemente
+from usuarios.busqueda import buscar_usuarios
+from .tablero import obtener_resumen
+from . import estadisticas as estadisticas_diarias
+from . import perfilado
 
 Usuario = get_user_model()
 
+USUARIOS_POR_PAGINA = 25
+
 def es_administrador(user):
     """Verifica si el usuario es administrador"""
     return user.is_authenticated and user.es_administrador()
@@ -20,79 +31,50 @@ def es_administrador(user):
 def dashboard_admin(request):
     """
     Dashboard principal para administradores
+    Las cifras se calculan con consultas agregadas y se comparten vía caché (ver tablero.py).
     """
-    # Estadísticas generales
-    total_doctores = Doctor.objects.filter(activo=True).count()
-    total_especialidades = Especialidad.objects.filter(activa=True).count()
-    total_usuarios = Usuario.objects.filter(is_active=True).count()
-    
-    # Doctores sin horarios configurados
-    doctores_sin_horarios = Doctor.objects.filter(
-        activo=True,
-        horarios_atencion__isnull=True
-    ).distinct().count()
-    
-    # Excepciones activas hoy
-    hoy = timezone.now().date()
-    excepciones_hoy = ExcepcionHorario.objects.filter(
-        fecha_inicio__date__lte=hoy,
-        fecha_fin__date__gte=hoy
-    ).count()
-    
-    # Doctores por especialidad
-    doctores_por_especialidad = Especialidad.objects.filter(
-        activa=True
-    ).annotate(
-        total_doctores=Count('doctor', filter=Q(doctor__activo=True))
-    ).order_by('-total_doctores')
-    
-    # Últimos doctores registrados
-    ultimos_doctores = Doctor.objects.filter(
-        activo=True
-    ).select_related('usuario', 'especialidad').order_by('-fecha_creacion')[:5]
-    
-    # Excepciones próximas (próximos 7 días)
-    fecha_limite = timezone.now() + timedelta(days=7)
-    excepciones_proximas = ExcepcionHorario.objects.filter(
-        fecha_inicio__gte=timezone.now(),
-        fecha_inicio__lte=fecha_limite
-    ).select_related('doctor', 'doctor__usuario').order_by('fecha_inicio')[:5]
-    
-    # Usuarios por tipo
-    usuarios_por_tipo = {
-        'administradores': Usuario.objects.filter(tipo_usuario='administrador', is_active=True).count(),
-        'doctores': Usuario.objects.filter(tipo_usuario='doctor', is_active=True).count(),
-        'recepcion': Usuario.objects.filter(tipo_usuario='recepcion', is_active=True).count(),
-        'pacientes': Usuario.objects.filter(tipo_usuario='paciente', is_active=True).count(),
-    }
-    
-    # TODO: Cuando se implemente el modelo Cita, agregar estas estadísticas:
-    # - Total de citas del día
-    # - Citas pendientes
-    # - Citas por estado
-    # - Gráfico de citas por mes
-    
-    context = {
-        'total_doctores': total_doctores,
-        'total_especialidades': total_especialidades,
-        'total_usuarios': total_usuarios,
-        'doctores_sin_horarios': doctores_sin_horarios,
-        'excepciones_hoy': excepciones_hoy,
-        'doctores_por_especialidad': doctores_por_especialidad,
-        'ultimos_doctores': ultimos_doctores,
-        'excepciones_proximas': excepciones_proximas,
-        'usuarios_por_tipo': usuarios_por_tipo,
-    }
+    context = obtener_resumen()
     
     return render(request, 'administracion/dashboard.html', context)
 
+def paginar_por_id(queryset, despues=None, antes=None, por_pagina=USUARIOS_POR_PAGINA):
+    """
+    Paginación por cursor en orden de id descendente (los más recientes primero).
+    `despues` trae la página siguiente a ese id y `antes` la anterior; ninguna
+    de las dos usa OFFSET ni COUNT(*). Retorna (filas, cursor_anterior, cursor_siguiente).
+    """
+    try:
+        despues = int(despues) if despues else None
+        antes = int(antes) if antes else None
+    except ValueError:
+        despues = antes = None
+    
+    if antes is not None:
+        filas = list(queryset.filter(id__gt=antes).order_by('id')[:por_pagina + 1])
+        hay_mas = len(filas) > por_pagina
+        filas = filas[:por_pagina][::-1]
+        anterior = filas[0].id if hay_mas and filas else None
+        siguiente = filas[-1].id if filas else None
+        return filas, anterior, siguiente
+    
+    if despues is not None:
+        queryset = queryset.filter(id__lt=despues)
+    filas = list(queryset.order_by('-id')[:por_pagina + 1])
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+    anterior = filas[0].id if despues is not None and filas else None
+    siguiente = filas[-1].id if hay_mas else None
+    return filas, anterior, siguiente
+
 @login_required
 @user_passes_test(es_administrador)
 def gestion_usuarios(request):
     """
     Vista para gestionar usuarios del sistema
+    La lista se pagina por cursor sobre el id y la búsqueda usa el índice
+    de texto de usuarios (ver usuarios/busqueda.py).
     """
-    usuarios = Usuario.objects.filter(is_active=True).order_by('-date_joined')
+    usuarios = Usuario.objects.filter(is_active=True).select_related('doctor')
     
     # Filtros
     tipo_usuario = request.GET.get('tipo', '')
@@ -102,14 +84,23 @@ def gestion_usuarios(request):
         usuarios = usuarios.filter(tipo_usuario=tipo_usuario)
     
     if busqueda:
-        usuarios = usuarios.filter(
-            Q(first_name__icontains=busqueda) |
-            Q(last_name__icontains=busqueda) |
-            Q(email__icontains=busqueda)
-        )
+        usuarios = buscar_usuarios(usuarios, busqueda)
+    
+    pagina, anterior, siguiente = paginar_por_id(
+        usuarios,
+        despues=request.GET.get('despues'),
+        antes=request.GET.get('antes'),
+    )
+    
+    # Totales del resumen compartido con el dashboard (en caché)
+    resumen = obtener_resumen()
     
     context = {
-        'usuarios': usuarios,
+        'usuarios': pagina,
+        'cursor_anterior': anterior,
+        'cursor_siguiente': siguiente,
+        'total_usuarios': resumen['total_usuarios'],
+        'usuarios_por_tipo': resumen['usuarios_por_tipo'],
         'tipo_seleccionado': tipo_usuario,
         'busqueda': busqueda,
         'tipos_usuario': Usuario.TIPO_USUARIO_CHOICES,
@@ -122,46 +113,95 @@ def gestion_usuarios(request):
 def estadisticas(request):
     """
     Vista para mostrar estadísticas detalladas del sistema
+    Las cifras por mes salen de la tabla de estadísticas diarias (ver estadisticas.py).
     """
-    # Estadísticas por mes (últimos 6 meses)
-    fecha_inicio = timezone.now() - timedelta(days=180)
-    
-    # Doctores registrados por mes
-    doctores_por_mes = []
-    for i in range(6):
-        fecha = timezone.now() - timedelta(days=30*i)
-        inicio_mes = fecha.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        if i == 0:
-            fin_mes = timezone.now()
-        else:
-            fin_mes = inicio_mes.replace(month=inicio_mes.month+1) if inicio_mes.month < 12 else inicio_mes.replace(year=inicio_mes.year+1, month=1)
-        
-        count = Doctor.objects.filter(
-            fecha_creacion__gte=inicio_mes,
-            fecha_creacion__lt=fin_mes
-        ).count()
-        
-        doctores_por_mes.append({
-            'mes': inicio_mes.strftime('%B %Y'),
-            'count': count
-        })
-    
-    doctores_por_mes.reverse()
-    
-    # Horarios por día de la semana
-    horarios_por_dia = []
-    dias_semana = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-    
-    for i, dia in enumerate(dias_semana):
-        count = HorarioAtencion.objects.filter(dia_semana=i, activo=True).count()
-        horarios_por_dia.append({
-            'dia': dia,
-            'count': count
-        })
+    # Actividad de los últimos 6 meses calendario
+    resumen_mensual = estadisticas_diarias.resumen_mensual(meses=6)
+    
+    doctores_por_mes = [
+        {'mes': item['etiqueta'], 'count': item['doctores']}
+        for item in resumen_mensual
+    ]
+    
+    # Horarios por día de la semana, en una sola consulta agrupada
+    conteo_por_dia = dict(
+        HorarioAtencion.objects.filter(activo=True).values_list('dia_semana').annotate(
+            total=Count('id')
+        ).order_by()
+    )
+    horarios_por_dia = [
+        {'dia': dia, 'count': conteo_por_dia.get(numero, 0)}
+        for numero, dia in HorarioAtencion.DIAS_SEMANA
+    ]
     
     context = {
         'doctores_por_mes': doctores_por_mes,
         'horarios_por_dia': horarios_por_dia,
+        'resumen_mensual': resumen_mensual,
+        'consolidado_hasta': estadisticas_diarias.consolidado_hasta(desde=resumen_mensual[0]['mes']),
     }
     
     return render(request, 'administracion/estadisticas.html', context)
+
+@login_required
+@user_passes_test(es_administrador)
+def perfiles(request):
+    """
+    Perfiles de peticiones guardados
+    Con ?ruta=/... redirige a esa ruta con un token de perfilado, para capturar esa petición.
+    """
+    token = perfilado.token_perfilado(request.user)
+    ruta = request.GET.get('ruta', '').strip()
+    
+    if ruta:
+        if ruta.startswith('/') and url_has_allowed_host_and_scheme(ruta, allowed_hosts={request.get_host()}):
+            separador = '&' if '?' in ruta else '?'
+            return redirect(f'{ruta}{separador}{perfilado.PARAMETRO}={token}')
+        messages.error(request, 'La ruta a perfilar debe ser una ruta local del sitio.')
+    
+    context = {
+        'perfiles': perfilado.listar_perfiles(),
+        'token': token,
+        'vigencia_minutos': settings.PERFILADO_VIGENCIA_TOKEN // 60,
+        'umbral_consulta_ms': settings.PERFILADO_UMBRAL_CONSULTA_MS,
+    }
+    
+    return render(request, 'administracion/perfiles.html', context)
+
+@login_required
+@user_passes_test(es_administrador)
+def detalle_perfil(request, nombre):
+    """Resumen de un perfil: funciones más costosas, memoria y consultas lentas con su plan"""
+    perfil = perfilado.cargar_perfil(nombre)
+    if perfil is None:
+        raise Http404('Perfil no encontrado')
+    
+    return render(request, 'administracion/detalle_perfil.html', {'perfil': perfil})
+
+@login_required
+@user_passes_test(es_administrador)
+def descargar_perfil(request, nombre):
+    """Descarga el .prof del perfil (se abre con pstats o snakeviz)"""
+    ruta = perfilado.ruta_perfil(nombre, 'prof')
+    if ruta is None or not ruta.exists():
+        raise Http404('Perfil no encontrado')
+    
+    return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=ruta.name)
+
+def _token_metricas_valido(request):
+    token = getattr(settings, 'METRICAS_TOKEN', None)
+    if not token:
+        return False
+    tipo, _, credencial = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return tipo.lower() == 'bearer' and secrets.compare_digest(credencial.encode(), token.encode())
+
+def metricas(request):
+    """
+    Métricas en formato de exposición de Prometheus
+    Accesible para el personal (is_staff) o sin sesión con la cabecera
+    `Authorization: Bearer <METRICAS_TOKEN>`.
+    """
+    if not (request.user.is_authenticated and request.user.is_staff) and not _token_metricas_valido(request):
+        return HttpResponseForbidden()
+    
+    return HttpResponse(registro_metricas.registro.exponer(), content_type=registro_metricas.TIPO_CONTENIDO)
@@ -0,0 +1,107 @@
+"""
+Configuración de la conexión a la base de datos para producción
+
+La usan settings_produccion.py y los comandos `optimizar_base_datos` y
+`benchmark_escrituras`, para que el benchmark mida exactamente los mismos
+PRAGMA que se aplican en producción.
+
+transaccion_inmediata() abre con BEGIN IMMEDIATE en SQLite las pocas
+transacciones que leen filas disputadas antes de escribirlas (reservas y
+agendamiento de citas, conflictos de excepciones, reclamo de
+notificaciones); el resto conserva el modo por defecto (DEFERRED) y no toma
+el bloqueo de escritura antes de escribir.
+"""
+from contextlib import contextmanager
+
+from django.db import transaction
+
+# PRAGMA que se ejecutan al abrir cada conexión SQLite
+PRAGMAS_SQLITE = [
+    # Los lectores no bloquean al escritor ni el escritor a los lectores
+    ('journal_mode', 'WAL'),
+    # Con WAL, NORMAL solo sincroniza en los checkpoints y sigue siendo seguro
+    # ante caídas de la aplicación
+    ('synchronous', 'NORMAL'),
+    # Milisegundos de espera por el bloqueo de escritura antes de fallar
+    ('busy_timeout', '20000'),
+    # 128 MiB del archivo mapeados en memoria
+    ('mmap_size', str(128 * 1024 * 1024)),
+    # Caché de páginas de ~64 MiB por conexión (negativo = KiB)
+    ('cache_size', '-65536'),
+    ('temp_store', 'MEMORY'),
+]
+
+
+def init_command_sqlite(pragmas=PRAGMAS_SQLITE):
+    """Texto para OPTIONS['init_command'] del backend sqlite3"""
+    return ';'.join(f'PRAGMA {nombre}={valor}' for nombre, valor in pragmas)
+
+
+def configuracion_sqlite(nombre):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': nombre,
+        # Conexiones persistentes: los PRAGMA se aplican una vez por conexión
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'init_command': init_command_sqlite(),
+        },
+    }
+
+
+def configuracion_postgresql(entorno):
+    """
+    Con DB_POOL=1 usa el pool de conexiones de psycopg 3 (requiere
+    psycopg[pool]); si no, conexiones persistentes. Django no permite
+    combinar ambos.
+    """
+    configuracion = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': entorno.get('DB_NAME', 'agenda_medica'),
+        'USER': entorno.get('DB_USER', 'agenda_medica'),
+        'PASSWORD': entorno.get('DB_PASSWORD', ''),
+        'HOST': entorno.get('DB_HOST', 'localhost'),
+        'PORT': entorno.get('DB_PORT', '5432'),
+        'OPTIONS': {},
+    }
+    if entorno.get('DB_POOL') == '1':
+        configuracion['CONN_MAX_AGE'] = 0
+        configuracion['OPTIONS']['pool'] = {
+            'min_size': int(entorno.get('DB_POOL_MIN', 2)),
+            'max_size': int(entorno.get('DB_POOL_MAX', 10)),
+            'timeout': 10,
+        }
+    else:
+        configuracion['CONN_MAX_AGE'] = int(entorno.get('DB_CONN_MAX_AGE', 600))
+        configuracion['CONN_HEALTH_CHECKS'] = True
+    return configuracion
+
+
+@contextmanager
+def transaccion_inmediata(using=None):
+    """
+    transaction.atomic() que en SQLite toma el bloqueo de escritura al
+    empezar. Es para las transacciones que leen antes de escribir y compiten
+    por las mismas filas (reservar una franja, agendar una cita): en modo
+    DEFERRED la segunda en pasar de lectura a escritura falla con "database
+    is locked" sin esperar el timeout; con IMMEDIATE espera su turno en el
+    BEGIN. Dentro de una transacción ya abierta es un savepoint, como atomic.
+    """
+    conexion = transaction.get_connection(using)
+    if conexion.vendor != 'sqlite' or conexion.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    # connect() vuelve a leer transaction_mode de OPTIONS: se conecta antes
+    conexion.ensure_connection()
+    anterior = conexion.transaction_mode
+    conexion.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            conexion.transaction_mode = anterior
+            yield
+    finally:
+        conexion.transaction_mode = anterior
@@ -0,0 +1,96 @@
+"""
+Medición del tiempo de cada petición (ver middleware.MedicionPeticionesMiddleware)
+
+La medición en curso vive en una variable de contexto, así que cada hilo
+(o tarea asíncrona) acumula solo lo suyo. Las consultas se miden con
+connection.execute_wrapper y el render de plantillas con el backend
+DjangoTemplatesMedidos; fuera de una petición medida ambos solo consultan
+la variable de contexto.
+"""
+import heapq
+import time
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from . import metricas
+
+# Consultas más lentas que se conservan por petición para el registro de lentas
+CONSULTAS_CONSERVADAS = 5
+# Caracteres del SQL que se conservan de cada una
+LARGO_MAXIMO_SQL = 1000
+
+medicion_actual = ContextVar('medicion_actual', default=None)
+
+
+class Medicion:
+    """Tiempos acumulados de una petición, en segundos"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.tiempo_plantillas = 0.0
+        self.inicio_vista = None
+        self.fin_vista = None
+        self.mas_lentas = []
+
+    def registrar_consulta(self, sql, duracion):
+        self.consultas += 1
+        self.tiempo_db += duracion
+        # Montículo de tamaño fijo: conserva las consultas más lentas
+        entrada = (duracion, self.consultas, sql)
+        if len(self.mas_lentas) < CONSULTAS_CONSERVADAS:
+            heapq.heappush(self.mas_lentas, entrada)
+        elif duracion > self.mas_lentas[0][0]:
+            heapq.heapreplace(self.mas_lentas, entrada)
+
+    @property
+    def tiempo_vista(self):
+        if self.inicio_vista is None:
+            return 0.0
+        return (self.fin_vista or time.perf_counter()) - self.inicio_vista
+
+    def consultas_lentas(self):
+        """[(milisegundos, sql)] de las consultas más lentas, de mayor a menor"""
+        return [
+            (round(duracion * 1000, 2), sql[:LARGO_MAXIMO_SQL])
+            for duracion, _, sql in sorted(self.mas_lentas, reverse=True)
+        ]
+
+
+def medir_consulta(execute, sql, params, many, context):
+    """Envoltorio de connection.execute_wrapper que acumula la consulta en la medición"""
+    medicion = medicion_actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracion = time.perf_counter() - inicio
+        medicion.registrar_consulta(sql, duracion)
+        metricas.consultas.observar(duracion, base=context['connection'].alias)
+
+
+class PlantillaMedida(Template):
+    def render(self, context=None, request=None):
+        medicion = medicion_actual.get()
+        if medicion is None:
+            return super().render(context, request)
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicion.tiempo_plantillas += time.perf_counter() - inicio
+
+
+class DjangoTemplatesMedidos(DjangoTemplates):
+    """Backend de plantillas de Django que acumula el tiempo de render en la medición"""
+
+    def from_string(self, template_code):
+        return PlantillaMedida(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        plantilla = super().get_template(template_name)
+        return PlantillaMedida(plantilla.template, self)
@@ -0,0 +1,307 @@
+"""
+Registro de métricas en memoria y su exposición en formato Prometheus
+
+Las métricas se definen al final de este módulo y se actualizan desde los
+servicios (`metricas.citas.inc(evento='agendada')`). Un único candado
+protege todos los valores, así que es seguro con varios hilos por proceso.
+
+Con varios procesos (p. ej. trabajadores de gunicorn, o comandos de cron
+que envían notificaciones) cada uno tiene su propio registro. Si se define
+METRICAS_DIRECTORIO, cada proceso vuelca su estado a un archivo propio en
+ese directorio cada METRICAS_INTERVALO_VOLCADO segundos y al terminar, y
+`/metrics` suma los archivos de todos los procesos. El directorio debe
+vaciarse antes de arrancar el servidor, como en prometheus_client.
+
+Cada ejecución de cron deja un archivo nuevo; al exponer, el proceso que
+atiende /metrics adopta los archivos de procesos que ya terminaron (suma
+sus valores a los propios y los borra), así que el directorio no crece sin
+límite. Por eso debe ser local a la máquina: se usa el pid para saber si
+el proceso sigue vivo.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+import re
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+TIPO_CONTENIDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Límites de los histogramas, en segundos
+LIMITES_PETICION = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LIMITES_CONSULTA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+LIMITES_CANTIDAD = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_ARCHIVO_PROCESO = re.compile(r'^metricas-(\d+)-[0-9a-f]{8}\.json$')
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(valor)
+
+
+def _etiquetas(nombres, valores, extra=None):
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _proceso_vivo(pid):
+    if os.name != 'posix':
+        # En Windows os.kill termina el proceso: no se adopta nada
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Metrica:
+    tipo = None
+
+    def __init__(self, registro, nombre, ayuda, etiquetas=()):
+        self.registro = registro
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.valores = {}
+
+    def _clave(self, etiquetas):
+        return tuple(str(etiquetas[nombre]) for nombre in self.etiquetas)
+
+
+class Contador(Metrica):
+    tipo = 'counter'
+
+    def inc(self, cantidad=1, **etiquetas):
+        if not cantidad:
+            return
+        clave = self._clave(etiquetas)
+        with self.registro.candado:
+            self.valores[clave] = self.valores.get(clave, 0) + cantidad
+
+    @staticmethod
+    def combinar(actual, otro):
+        return (actual or 0) + otro
+
+    def lineas(self, valores):
+        for clave, valor in sorted(valores.items()):
+            yield f'{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}'
+
+
+class Histograma(Metrica):
+    """Guarda por cada combinación de etiquetas [conteos por límite, suma]"""
+    tipo = 'histogram'
+
+    def __init__(self, registro, nombre, ayuda, etiquetas=(), limites=LIMITES_PETICION):
+        super().__init__(registro, nombre, ayuda, etiquetas)
+        self.limites = tuple(float(limite) for limite in limites) + (float('inf'),)
+
+    def observar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        indice = bisect_left(self.limites, valor)
+        with self.registro.candado:
+            datos = self.valores.get(clave)
+            if datos is None:
+                datos = self.valores[clave] = [[0] * len(self.limites), 0.0]
+            datos[0][indice] += 1
+            datos[1] += valor
+
+    @staticmethod
+    def combinar(actual, otro):
+        if actual is None:
+            return [list(otro[0]), otro[1]]
+        return [[a + b for a, b in zip(actual[0], otro[0])], actual[1] + otro[1]]
+
+    def lineas(self, valores):
+        for clave, (conteos, suma) in sorted(valores.items()):
+            acumulado = 0
+            for limite, conteo in zip(self.limites, conteos):
+                acumulado += conteo
+                etiquetas = _etiquetas(self.etiquetas, clave, ('le', _numero(limite)))
+                yield f'{self.nombre}_bucket{etiquetas} {acumulado}'
+            etiquetas = _etiquetas(self.etiquetas, clave)
+            yield f'{self.nombre}_sum{etiquetas} {_numero(float(suma))}'
+            yield f'{self.nombre}_count{etiquetas} {acumulado}'
+
+
+class Registro:
+    def __init__(self):
+        self.candado = threading.Lock()
+        self.metricas = {}
+        self._reiniciar_proceso()
+        os.register_at_fork(after_in_child=self._reiniciar_proceso)
+        atexit.register(self.volcar)
+
+    def _reiniciar_proceso(self):
+        """
+        En un proceso hijo (gunicorn --preload) los valores heredados ya
+        están contados en el archivo del padre: se empieza de cero.
+        """
+        self.candado = threading.Lock()
+        self.candado_volcado = threading.Lock()
+        for metrica in self.metricas.values():
+            metrica.valores = {}
+        self.archivo = f'metricas-{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+        self.ultimo_volcado = time.monotonic()
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        self.metricas[nombre] = Contador(self, nombre, ayuda, etiquetas)
+        return self.metricas[nombre]
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=LIMITES_PETICION):
+        self.metricas[nombre] = Histograma(self, nombre, ayuda, etiquetas, limites)
+        return self.metricas[nombre]
+
+    def estado(self):
+        """Copia de los valores de este proceso: {nombre: {etiquetas: valor}}"""
+        with self.candado:
+            return {
+                nombre: {
+                    clave: Histograma.combinar(None, valor) if isinstance(valor, list) else valor
+                    for clave, valor in metrica.valores.items()
+                }
+                for nombre, metrica in self.metricas.items()
+            }
+
+    def reiniciar(self):
+        with self.candado:
+            for metrica in self.metricas.values():
+                metrica.valores = {}
+
+    # Varios procesos
+
+    @staticmethod
+    def directorio():
+        directorio = settings.configured and getattr(settings, 'METRICAS_DIRECTORIO', None)
+        return Path(directorio) if directorio else None
+
+    def volcar(self):
+        """Escribe el estado de este proceso en su archivo del directorio compartido"""
+        directorio = self.directorio()
+        if directorio is None:
+            return
+        with self.candado_volcado:
+            self.ultimo_volcado = time.monotonic()
+            contenido = {
+                nombre: [[list(clave), valor] for clave, valor in valores.items()]
+                for nombre, valores in self.estado().items()
+            }
+            directorio.mkdir(parents=True, exist_ok=True)
+            temporal = directorio / f'{self.archivo}.tmp'
+            temporal.write_text(json.dumps(contenido), encoding='utf-8')
+            os.replace(temporal, directorio / self.archivo)
+
+    def volcar_si_corresponde(self):
+        intervalo = getattr(settings, 'METRICAS_INTERVALO_VOLCADO', 5)
+        if time.monotonic() - self.ultimo_volcado >= intervalo:
+            self.volcar()
+
+    def adoptar_terminados(self, directorio):
+        """
+        Suma a este proceso los archivos de los procesos que ya terminaron y
+        los borra. Cada archivo se renombra antes de leerlo, así que aunque
+        dos procesos lo intenten a la vez, solo uno lo adopta.
+        """
+        adoptados = []
+        for archivo in directorio.glob('metricas-*.json'):
+            coincidencia = _ARCHIVO_PROCESO.match(archivo.name)
+            if archivo.name == self.archivo or not coincidencia or _proceso_vivo(int(coincidencia[1])):
+                continue
+            reclamado = archivo.with_name(f'{archivo.name}.adoptado-{self.archivo}')
+            try:
+                os.rename(archivo, reclamado)
+                contenido = json.loads(reclamado.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+            with self.candado:
+                for nombre, valores in contenido.items():
+                    metrica = self.metricas.get(nombre)
+                    if metrica is None:
+                        continue
+                    for clave, valor in valores:
+                        clave = tuple(clave)
+                        metrica.valores[clave] = metrica.combinar(metrica.valores.get(clave), valor)
+            adoptados.append(reclamado)
+        if adoptados:
+            # Se borran después de que el archivo propio ya incluye sus valores
+            self.volcar()
+            for reclamado in adoptados:
+                reclamado.unlink(missing_ok=True)
+        return len(adoptados)
+
+    def estado_combinado(self):
+        """Suma de los archivos de todos los procesos, o el estado propio sin directorio"""
+        directorio = self.directorio()
+        if directorio is None:
+            return self.estado()
+        self.adoptar_terminados(directorio)
+        self.volcar()
+        combinado = {nombre: {} for nombre in self.metricas}
+        for archivo in directorio.glob('metricas-*.json'):
+            try:
+                contenido = json.loads(archivo.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+            for nombre, valores in contenido.items():
+                metrica = self.metricas.get(nombre)
+                if metrica is None:
+                    continue
+                for clave, valor in valores:
+                    clave = tuple(clave)
+                    combinado[nombre][clave] = metrica.combinar(combinado[nombre].get(clave), valor)
+        return combinado
+
+    def exponer(self):
+        """Texto en formato de exposición de Prometheus"""
+        estado = self.estado_combinado()
+        lineas = []
+        for nombre, metrica in self.metricas.items():
+            lineas.append(f'# HELP {nombre} {metrica.ayuda}')
+            lineas.append(f'# TYPE {nombre} {metrica.tipo}')
+            lineas.extend(metrica.lineas(estado.get(nombre, {})))
+        return '\n'.join(lineas) + '\n'
+
+
+registro = Registro()
+
+peticiones = registro.histograma(
+    'agenda_peticion_duracion_segundos', 'Duración de las peticiones por vista',
+    etiquetas=('vista', 'metodo'), limites=LIMITES_PETICION
+)
+consultas_por_peticion = registro.histograma(
+    'agenda_peticion_consultas', 'Consultas a la base de datos por petición',
+    etiquetas=('vista',), limites=LIMITES_CANTIDAD
+)
+consultas = registro.histograma(
+    'agenda_consulta_db_duracion_segundos', 'Duración de cada consulta a la base de datos durante una petición',
+    etiquetas=('base',), limites=LIMITES_CONSULTA
+)
+franjas_calculadas = registro.contador(
+    'agenda_franjas_calculadas_total', 'Franjas generadas en memoria a partir de los horarios'
+)
+cache_disponibilidad = registro.contador(
+    'agenda_cache_disponibilidad_total', 'Lecturas de la caché de disponibilidad por (doctor, fecha)',
+    etiquetas=('resultado',)
+)
+citas = registro.contador(
+    'agenda_citas_total', 'Citas agendadas y canceladas', etiquetas=('evento',)
+)
+notificaciones = registro.contador(
+    'agenda_notificaciones_total', 'Notificaciones encoladas, enviadas, reintentadas y fallidas',
+    etiquetas=('evento',)
+)
@@ -0,0 +1,134 @@
+"""
+Middleware de observabilidad de las peticiones
+
+MedicionPeticionesMiddleware mide cada petición: cantidad y tiempo de las
+consultas, tiempo de la vista y del render de plantillas, y tiempo total.
+Los publica en la cabecera Server-Timing (visible en las herramientas de
+desarrollo del navegador; solo con DEBUG o para el personal, porque revela
+cuánto trabajo hace cada vista) y en una línea JSON del logger
+`agenda_medica.peticiones` (nivel INFO; si el logger no la va a emitir, no
+se arma). Las peticiones que superan MEDICION_UMBRAL_LENTO_MS se
+registran, según MEDICION_MUESTREO_LENTAS, en
+`agenda_medica.peticiones_lentas` junto con sus consultas más lentas.
+
+En las respuestas por streaming (StreamingHttpResponse) el cuerpo se genera
+después de que el middleware retorna: la medición continúa mientras se
+recorre el contenido y el registro se escribe al terminar. La cabecera
+Server-Timing ya se envió, así que solo cubre hasta que la vista retornó.
+
+También alimenta los histogramas de peticiones y consultas de metricas.py.
+
+Con MEDICION_PETICIONES = False el middleware se retira de la cadena al
+arrancar y no agrega ningún costo (ni esas métricas).
+"""
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metricas
+from .medicion import Medicion, medicion_actual, medir_consulta
+
+logger = logging.getLogger('agenda_medica.peticiones')
+logger_lentas = logging.getLogger('agenda_medica.peticiones_lentas')
+
+
+def _ms(segundos):
+    return round(segundos * 1000, 2)
+
+
+class MedicionPeticionesMiddleware:
+    """Debe ir primero en MIDDLEWARE para que el tiempo total cubra toda la cadena"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'MEDICION_PETICIONES', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.umbral_lento = getattr(settings, 'MEDICION_UMBRAL_LENTO_MS', 500) / 1000
+        self.muestreo_lentas = getattr(settings, 'MEDICION_MUESTREO_LENTAS', 1.0)
+
+    def __call__(self, request):
+        medicion = Medicion()
+        token = medicion_actual.set(medicion)
+        try:
+            with self._medir_consultas():
+                response = self.get_response(request)
+                medicion.fin_vista = time.perf_counter()
+        finally:
+            medicion_actual.reset(token)
+
+        if self._mostrar_server_timing(request):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={_ms(medicion.tiempo_db)};desc="{medicion.consultas} consultas"',
+                f'vista;dur={_ms(medicion.tiempo_vista)}',
+                f'plantillas;dur={_ms(medicion.tiempo_plantillas)}',
+                f'total;dur={_ms(time.perf_counter() - medicion.inicio)}',
+            ])
+
+        if response.streaming and not getattr(response, 'is_async', False):
+            response.streaming_content = self._medir_contenido(
+                request, response, medicion, response.streaming_content
+            )
+        else:
+            self._registrar(request, response, medicion)
+        return response
+
+    def _medir_consultas(self):
+        pila = ExitStack()
+        for conexion in connections.all():
+            pila.enter_context(conexion.execute_wrapper(medir_consulta))
+        return pila
+
+    def _mostrar_server_timing(self, request):
+        if settings.DEBUG:
+            return True
+        usuario = getattr(request, 'user', None)
+        return usuario is not None and usuario.is_staff
+
+    def _medir_contenido(self, request, response, medicion, contenido):
+        """Recorre el cuerpo de una respuesta por streaming sin dejar de medir"""
+        token = medicion_actual.set(medicion)
+        try:
+            with self._medir_consultas():
+                yield from contenido
+        finally:
+            medicion_actual.reset(token)
+            self._registrar(request, response, medicion)
+
+    def _registrar(self, request, response, medicion):
+        total = time.perf_counter() - medicion.inicio
+        vista = getattr(request.resolver_match, 'view_name', None)
+        lenta = total >= self.umbral_lento and random.random() < self.muestreo_lentas
+
+        if lenta or logger.isEnabledFor(logging.INFO):
+            registro = {
+                'metodo': request.method,
+                'ruta': request.path,
+                'vista': vista,
+                'estado': response.status_code,
+                'total_ms': _ms(total),
+                'vista_ms': _ms(medicion.tiempo_vista),
+                'db_ms': _ms(medicion.tiempo_db),
+                'consultas': medicion.consultas,
+                'plantillas_ms': _ms(medicion.tiempo_plantillas),
+            }
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(json.dumps(registro, ensure_ascii=False))
+            if lenta:
+                registro['consultas_lentas'] = medicion.consultas_lentas()
+                logger_lentas.warning(json.dumps(registro, ensure_ascii=False))
+
+        vista = vista or 'sin_vista'
+        metricas.peticiones.observar(total, vista=vista, metodo=request.method)
+        metricas.consultas_por_peticion.observar(medicion.consultas, vista=vista)
+        metricas.registro.volcar_si_corresponde()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        medicion = medicion_actual.get()
+        if medicion is not None:
+            medicion.inicio_vista = time.perf_counter()
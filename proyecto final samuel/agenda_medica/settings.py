@@ -53,20 +53,52 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'agenda_medica.middleware.MedicionPeticionesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'doctores.middleware.DoctorActualMiddleware',
+    'administracion.middleware.PerfiladoMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Medición de peticiones: cabecera Server-Timing y registro (ver agenda_medica.middleware)
+MEDICION_PETICIONES = True
+# Peticiones más lentas que esto (ms) van al registro de peticiones lentas
+MEDICION_UMBRAL_LENTO_MS = 500
+# Fracción de las peticiones lentas que se registran
+MEDICION_MUESTREO_LENTAS = 1.0
+
+# Perfilado de peticiones a solicitud de un administrador (ver administracion.perfilado)
+PERFILADO_ACTIVO = True
+PERFILADO_DIRECTORIO = BASE_DIR / 'perfiles'
+# Perfiles que se conservan en PERFILADO_DIRECTORIO; los más antiguos se borran
+PERFILADO_MAXIMO_PERFILES = 50
+# Segundos de validez del token de perfilado
+PERFILADO_VIGENCIA_TOKEN = 600
+# Consultas más lentas que esto (ms) se guardan con su EXPLAIN
+PERFILADO_UMBRAL_CONSULTA_MS = 20
+# Marcos de pila que tracemalloc guarda por asignación
+PERFILADO_MARCOS_TRACEMALLOC = 10
+
+# Métricas en formato Prometheus en /metrics (ver agenda_medica.metricas)
+# Token que Prometheus envía como `Authorization: Bearer <token>` para leerlas sin
+# sesión (además del personal con is_staff); None = solo el personal
+METRICAS_TOKEN = None
+# Directorio compartido para sumar las métricas de varios procesos (gunicorn, cron); None = solo este proceso
+METRICAS_DIRECTORIO = None
+# Segundos entre volcados de cada proceso al directorio compartido
+METRICAS_INTERVALO_VOLCADO = 5
+
 ROOT_URLCONF = 'agenda_medica.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que además mide el tiempo de render (ver agenda_medica.medicion)
+        'BACKEND': 'agenda_medica.medicion.DjangoTemplatesMedidos',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -90,10 +122,52 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Las reservas abren su transacción con BEGIN IMMEDIATE
+            # (agenda_medica.basedatos.transaccion_inmediata)
+            # Segundos de espera cuando la base de datos está bloqueada
+            'timeout': 20,
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Franjas de disponibilidad por doctor y fecha (doctores/cache_disponibilidad.py).
+    # La memoria local solo sirve con un proceso (runserver): las versiones por
+    # doctor viven en esta caché y otro proceso no vería las invalidaciones.
+    # settings_produccion usa archivos o redis.
+    'disponibilidad': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'disponibilidad',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
+}
+
+DISPONIBILIDAD_CACHE = 'disponibilidad'
+DISPONIBILIDAD_CACHE_TIMEOUT = 3600
+
+# Resumen del dashboard administrativo: caché compartida por los procesos, para
+# que las señales lo invaliden en todos, y segundos que se reutiliza
+TABLERO_CACHE = 'disponibilidad'
+TABLERO_CACHE_TIMEOUT = 60
+
+# Días hacia adelante que revisa la búsqueda de próximas franjas libres
+DISPONIBILIDAD_BUSQUEDA_DIAS = 90
+
+# Rango de días (hacia atrás y hacia adelante) del calendario iCalendar de cada doctor
+CALENDARIO_ICAL_DIAS_ATRAS = 30
+CALENDARIO_ICAL_DIAS_ADELANTE = 90
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -143,6 +217,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # La API de doctores define su propia paginación por cursor (doctores/api.py)
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
 }
@@ -152,10 +227,41 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 # Configuración de tareas programadas con django-crontab
 CRONJOBS = [
-    # Envío de recordatorios cada hora
+    # Recordatorios a la bandeja de salida cada hora
     ('0 * * * *', 'notificaciones.cron.enviar_recordatorios'),
+    # Extender el horizonte de franjas precalculadas cada noche
+    ('30 2 * * *', 'django.core.management.call_command', ['extender_franjas']),
+    # Limpieza de reservas temporales vencidas
+    ('0 3 * * *', 'citas.cron.purgar_reservas_vencidas'),
+    # Consolidar las estadísticas del día anterior
+    ('15 3 * * *', 'django.core.management.call_command', ['consolidar_estadisticas']),
+    # Actualizar las estadísticas del planificador de consultas
+    ('45 3 * * *', 'django.core.management.call_command', ['optimizar_base_datos']),
 ]
 
+# Días hacia adelante que se mantienen en la tabla de franjas precalculadas
+FRANJAS_HORIZONTE_DIAS = 60
+
+# Segundos que se retiene una franja mientras el paciente confirma la cita
+CITAS_RESERVA_TTL_SEGUNDOS = 300
+
+# Recordatorios de citas: citas que se encolan en la bandeja de salida por lote
+RECORDATORIOS_POR_LOTE = 200
+
+# Bandeja de salida de notificaciones (ver notificaciones/services.py)
+NOTIFICACIONES_BACKENDS = {
+    'email': 'notificaciones.backends.CorreoBackend',
+    'sms': 'notificaciones.backends.ConsolaSMSBackend',
+}
+NOTIFICACIONES_LOTE = 100
+NOTIFICACIONES_HILOS = 4
+NOTIFICACIONES_MAX_INTENTOS = 6
+NOTIFICACIONES_REINTENTO_BASE_SEGUNDOS = 30
+NOTIFICACIONES_REINTENTO_MAX_SEGUNDOS = 3600
+# Un lote reclamado sin latido durante este tiempo vuelve a la cola (el
+# trabajador lo renueva cada tercio del plazo mientras envía)
+NOTIFICACIONES_RECLAMO_SEGUNDOS = 300
+
 # Configuración de archivos estáticos
 STATICFILES_DIRS = [
     BASE_DIR / "static",
@@ -172,3 +278,28 @@ AUTH_USER_MODEL = 'usuarios.Usuario'
 LOGIN_URL = 'usuarios:login'
 LOGIN_REDIRECT_URL = 'usuarios:dashboard'
 LOGOUT_REDIRECT_URL = 'usuarios:login'
+
+# Registro: las líneas JSON de la medición de peticiones van a la consola
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'consola': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # Una línea JSON por petición en nivel INFO; con WARNING la línea ni
+        # siquiera se arma (ver agenda_medica.middleware)
+        'agenda_medica.peticiones': {
+            'handlers': ['consola'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'agenda_medica.peticiones_lentas': {
+            'handlers': ['consola'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
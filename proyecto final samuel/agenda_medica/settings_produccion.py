@@ -0,0 +1,60 @@
+"""
+Perfil de producción de agenda_medica
+
+Se activa con DJANGO_SETTINGS_MODULE=agenda_medica.settings_produccion y se
+configura con variables de entorno:
+
+- DJANGO_SECRET_KEY (obligatoria), DJANGO_ALLOWED_HOSTS (separadas por coma)
+- DB_ENGINE: 'sqlite' (por defecto) o 'postgresql'
+- SQLite: DB_PATH (por defecto db.sqlite3 en BASE_DIR)
+- PostgreSQL: DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT y, para usar
+  el pool de psycopg 3, DB_POOL=1 (DB_POOL_MIN, DB_POOL_MAX)
+- CACHE_REDIS_URL: caché compartida en redis (requiere el paquete redis); sin
+  ella la caché de disponibilidad usa archivos en CACHE_DIRECTORIO (por
+  defecto BASE_DIR/cache). Nunca memoria local: cada trabajador de gunicorn
+  tendría sus propias versiones y no vería las invalidaciones de los demás
+- METRICAS_DIRECTORIO: directorio compartido para sumar las métricas de los
+  trabajadores de gunicorn (vaciarlo antes de arrancar)
+- METRICAS_TOKEN: token bearer con el que Prometheus lee /metrics
+- REGISTRO_PETICIONES: nivel del logger agenda_medica.peticiones (por
+  defecto INFO, una línea JSON por petición; WARNING la desactiva)
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .basedatos import configuracion_postgresql, configuracion_sqlite
+
+DEBUG = False
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+ALLOWED_HOSTS = [
+    host.strip() for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host.strip()
+]
+
+if os.environ.get('DB_ENGINE', 'sqlite') == 'postgresql':
+    DATABASES = {'default': configuracion_postgresql(os.environ)}
+else:
+    DATABASES = {'default': configuracion_sqlite(os.environ.get('DB_PATH', BASE_DIR / 'db.sqlite3'))}
+
+# Las versiones de la caché de disponibilidad viven en la misma caché, así
+# que debe ser compartida por todos los procesos
+if os.environ.get('CACHE_REDIS_URL'):
+    CACHES['disponibilidad'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['CACHE_REDIS_URL'],
+        'KEY_PREFIX': 'disponibilidad',
+    }
+else:
+    CACHES['disponibilidad'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(os.environ.get('CACHE_DIRECTORIO', BASE_DIR / 'cache'), 'disponibilidad'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    }
+
+METRICAS_DIRECTORIO = os.environ.get('METRICAS_DIRECTORIO') or None
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN') or None
+
+LOGGING['loggers']['agenda_medica.peticiones']['level'] = os.environ.get('REGISTRO_PETICIONES', 'INFO')
@@ -19,13 +19,17 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from administracion.views import metricas
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('usuarios.urls')),
     path('dashboard/', include('administracion.urls')),
     path('usuarios/', include('usuarios.urls')),
     path('doctores/', include('doctores.urls')),
-    # path('citas/', include('citas.urls')),  # Se descomentará cuando se implemente
+    path('citas/', include('citas.urls')),
+    path('api/', include('doctores.api_urls')),
+    path('metrics', metricas, name='metricas'),
     # path('notificaciones/', include('notificaciones.urls')),  # Se descomentará cuando se implemente
 ]
 
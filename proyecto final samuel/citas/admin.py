@@ -1,3 +1,34 @@
 from django.contrib import admin
+from .models import Cita
 
-# Register your models here.
+@admin.register(Cita)
+class CitaAdmin(admin.ModelAdmin):
+    list_display = [
+        'codigo', 'paciente', 'doctor', 'fecha_hora_inicio', 'estado', 'fecha_creacion'
+    ]
+    list_filter = ['estado', 'fecha_hora_inicio', 'doctor__especialidad']
+    search_fields = [
+        'codigo', 'paciente__first_name', 'paciente__last_name', 'paciente__email',
+        'doctor__usuario__first_name', 'doctor__usuario__last_name'
+    ]
+    list_select_related = ['paciente', 'doctor__usuario', 'doctor__especialidad']
+    raw_id_fields = ['paciente', 'doctor']
+    ordering = ['-fecha_hora_inicio']
+    
+    fieldsets = (
+        ('Cita', {
+            'fields': ('paciente', 'doctor', 'motivo')
+        }),
+        ('Fecha y Hora', {
+            'fields': ('fecha_hora_inicio', 'fecha_hora_fin')
+        }),
+        ('Estado', {
+            'fields': ('estado',)
+        }),
+        ('Auditoría', {
+            'fields': ('codigo', 'fecha_creacion', 'fecha_actualizacion'),
+            'classes': ('collapse',)
+        }),
+    )
+    
+    readonly_fields = ['codigo', 'fecha_creacion', 'fecha_actualizacion']
@@ -0,0 +1,152 @@
+"""
+Citas afectadas por excepciones de horario (HU0008)
+
+Al registrar una excepción (o un bloqueo de varios doctores, o de toda la
+clínica) las citas confirmadas que se cruzan con el intervalo bloqueado se
+marcan como por reprogramar o se cancelan, y cada paciente recibe un aviso
+por la bandeja de salida de notificaciones.
+
+El trabajo es por conjuntos, sin importar cuántas citas haya:
+
+- una consulta encuentra todas las citas afectadas. El índice
+  (doctor, fecha_hora_inicio) acota el rango porque una cita nunca dura más
+  de un día (sus franjas salen de un horario diario);
+- un UPDATE cambia su estado;
+- un INSERT en bloque encola los avisos;
+- un UPDATE marca las excepciones como notificadas.
+
+Los UPDATE no disparan las señales de Cita, así que la caché de
+disponibilidad y la marca de agenda de los doctores se actualizan aquí.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import get_template
+from django.utils import timezone
+
+from agenda_medica import metricas
+from agenda_medica.basedatos import transaccion_inmediata
+from doctores.cache_disponibilidad import invalidar_doctor_al_confirmar
+from doctores.materializacion import actualizar_por_excepcion
+from doctores.models import Doctor, ExcepcionHorario
+from notificaciones.models import Notificacion
+from notificaciones.services import encolar_varias
+from .models import Cita
+
+ACCION_REPROGRAMAR = 'reprogramar'
+ACCION_CANCELAR = 'cancelar'
+
+ACCION_CHOICES = [
+    (ACCION_REPROGRAMAR, 'Marcar las citas afectadas para reprogramar'),
+    (ACCION_CANCELAR, 'Cancelar las citas afectadas'),
+]
+
+ESTADO_POR_ACCION = {
+    ACCION_REPROGRAMAR: 'por_reprogramar',
+    ACCION_CANCELAR: 'cancelada',
+}
+
+# Duración máxima de una cita: sus franjas nunca cruzan de un día al otro
+DURACION_MAXIMA_CITA = timedelta(days=1)
+
+
+def citas_afectadas(excepciones):
+    """Citas confirmadas que se cruzan con alguna de las excepciones, en una consulta"""
+    doctores_por_intervalo = defaultdict(set)
+    for excepcion in excepciones:
+        doctores_por_intervalo[(excepcion.fecha_inicio, excepcion.fecha_fin)].add(excepcion.doctor_id)
+
+    filtro = Q()
+    for (inicio, fin), doctor_ids in doctores_por_intervalo.items():
+        filtro |= Q(
+            doctor_id__in=doctor_ids,
+            fecha_hora_inicio__gt=inicio - DURACION_MAXIMA_CITA,
+            fecha_hora_inicio__lt=fin,
+            fecha_hora_fin__gt=inicio
+        )
+    if not filtro:
+        return Cita.objects.none()
+
+    return Cita.objects.filter(filtro, estado='confirmada').select_related(
+        'paciente', 'doctor__usuario', 'doctor__especialidad'
+    ).order_by('fecha_hora_inicio')
+
+
+def _aviso(plantilla, cita, accion):
+    inicio = timezone.localtime(cita.fecha_hora_inicio)
+    titulo = 'cancelada' if accion == ACCION_CANCELAR else 'por reprogramar'
+    return Notificacion(
+        tipo='excepcion',
+        destinatario=cita.paciente.email,
+        asunto=f'Cita {titulo}: {inicio:%d/%m/%Y} a las {inicio:%H:%M}',
+        cuerpo=plantilla.render({'cita': cita, 'inicio': inicio, 'accion': accion})
+    )
+
+
+def resolver_conflictos(excepciones, accion=ACCION_REPROGRAMAR):
+    """
+    Actualiza las citas afectadas por las excepciones y encola los avisos a
+    los pacientes. Retorna la lista de citas afectadas.
+    """
+    excepciones = list(excepciones)
+    nuevo_estado = ESTADO_POR_ACCION[accion]
+    plantilla = get_template('notificaciones/excepcion_cita.txt')
+
+    # Lee las citas antes de actualizarlas, igual que una reserva
+    with transaccion_inmediata():
+        citas = list(citas_afectadas(excepciones))
+        ahora = timezone.now()
+        if citas:
+            Cita.objects.filter(pk__in=[cita.pk for cita in citas]).update(
+                estado=nuevo_estado,
+                fecha_actualizacion=ahora
+            )
+            encolar_varias([_aviso(plantilla, cita, accion) for cita in citas])
+
+            doctor_ids = {cita.doctor_id for cita in citas}
+            Doctor.objects.filter(pk__in=doctor_ids).update(agenda_actualizada=ahora)
+            for doctor_id in doctor_ids:
+                invalidar_doctor_al_confirmar(doctor_id)
+            if accion == ACCION_CANCELAR:
+                transaction.on_commit(lambda: metricas.citas.inc(len(citas), evento='cancelada'))
+
+        ExcepcionHorario.objects.filter(
+            pk__in=[excepcion.pk for excepcion in excepciones]
+        ).update(notificado=True)
+
+    for cita in citas:
+        cita.estado = nuevo_estado
+    return citas
+
+
+def registrar_bloqueo(doctores, fecha_inicio, fecha_fin, motivo, tipo_excepcion='otro',
+                      todo_el_dia=False, creado_por=None, accion=ACCION_REPROGRAMAR):
+    """
+    Registra la misma excepción para varios doctores (o toda la clínica) con
+    un INSERT en bloque y resuelve sus conflictos.
+    Retorna (excepciones, citas afectadas).
+    """
+    doctor_ids = list(doctores.values_list('pk', flat=True))
+    with transaction.atomic():
+        excepciones = ExcepcionHorario.objects.bulk_create([
+            ExcepcionHorario(
+                doctor_id=doctor_id,
+                fecha_inicio=fecha_inicio,
+                fecha_fin=fecha_fin,
+                tipo_excepcion=tipo_excepcion,
+                motivo=motivo,
+                todo_el_dia=todo_el_dia,
+                creado_por=creado_por
+            )
+            for doctor_id in doctor_ids
+        ])
+        # bulk_create no dispara las señales de ExcepcionHorario
+        for doctor_id in doctor_ids:
+            actualizar_por_excepcion(doctor_id, [(fecha_inicio, fecha_fin)])
+            invalidar_doctor_al_confirmar(doctor_id)
+        Doctor.objects.filter(pk__in=doctor_ids).update(agenda_actualizada=timezone.now())
+
+        citas = resolver_conflictos(excepciones, accion)
+    return excepciones, citas
@@ -0,0 +1,9 @@
+"""
+Tareas programadas de la app citas (ver CRONJOBS en settings)
+"""
+from . import services
+
+
+def purgar_reservas_vencidas():
+    """Elimina las reservas temporales que ya vencieron"""
+    return services.purgar_reservas_vencidas()
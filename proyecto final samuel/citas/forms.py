@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from doctores.models import Doctor
+
+class AgendarCitaForm(forms.Form):
+    """
+    Formulario para agendar una cita en una franja disponible (HU0002)
+    """
+    doctor = forms.ModelChoiceField(
+        label='Doctor',
+        queryset=Doctor.objects.filter(activo=True),
+        widget=forms.HiddenInput
+    )
+    
+    fecha = forms.DateField(
+        label='Fecha',
+        widget=forms.HiddenInput
+    )
+    
+    hora = forms.TimeField(
+        label='Hora',
+        widget=forms.HiddenInput
+    )
+    
+    motivo = forms.CharField(
+        label='Motivo de la Consulta',
+        required=False,
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 3})
+    )
+    
+    def clean(self):
+        """Combinar fecha y hora en un instante con zona horaria"""
+        cleaned_data = super().clean()
+        fecha = cleaned_data.get('fecha')
+        hora = cleaned_data.get('hora')
+        
+        if fecha and hora:
+            fecha_hora_inicio = timezone.make_aware(datetime.combine(fecha, hora))
+            if fecha_hora_inicio <= timezone.now():
+                raise ValidationError('No se pueden agendar citas en fechas u horas pasadas.')
+            cleaned_data['fecha_hora_inicio'] = fecha_hora_inicio
+        
+        return cleaned_data
@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from citas.conflictos import ACCION_CANCELAR, ACCION_REPROGRAMAR, registrar_bloqueo
+from doctores.models import Doctor, ExcepcionHorario
+
+class Command(BaseCommand):
+    help = 'Bloquear la agenda de varios doctores (o de toda la clínica) y notificar a los pacientes afectados'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            type=str,
+            required=True,
+            help='Inicio del bloqueo (AAAA-MM-DD HH:MM, hora local)',
+        )
+        parser.add_argument(
+            '--hasta',
+            type=str,
+            required=True,
+            help='Fin del bloqueo (AAAA-MM-DD HH:MM, hora local)',
+        )
+        parser.add_argument(
+            '--motivo',
+            type=str,
+            required=True,
+            help='Motivo del bloqueo',
+        )
+        parser.add_argument(
+            '--tipo',
+            type=str,
+            default='otro',
+            choices=[valor for valor, _ in ExcepcionHorario.TIPO_EXCEPCION_CHOICES],
+            help='Tipo de excepción',
+        )
+        parser.add_argument(
+            '--doctor',
+            type=int,
+            action='append',
+            help='ID del doctor; se puede repetir. Sin --doctor ni --especialidad se bloquea toda la clínica',
+        )
+        parser.add_argument(
+            '--especialidad',
+            type=int,
+            help='Bloquear a todos los doctores de la especialidad',
+        )
+        parser.add_argument(
+            '--cancelar',
+            action='store_true',
+            help='Cancelar las citas afectadas en lugar de marcarlas para reprogramar',
+        )
+    
+    def handle(self, *args, **options):
+        desde = parse_datetime(options['desde'])
+        hasta = parse_datetime(options['hasta'])
+        if not desde or not hasta:
+            raise CommandError('--desde y --hasta deben tener formato AAAA-MM-DD HH:MM.')
+        if timezone.is_naive(desde):
+            desde = timezone.make_aware(desde)
+        if timezone.is_naive(hasta):
+            hasta = timezone.make_aware(hasta)
+        if desde >= hasta:
+            raise CommandError('--desde debe ser anterior a --hasta.')
+        
+        doctores = Doctor.objects.filter(activo=True)
+        if options.get('doctor'):
+            doctores = doctores.filter(pk__in=options['doctor'])
+        if options.get('especialidad'):
+            doctores = doctores.filter(especialidad_id=options['especialidad'])
+        
+        excepciones, citas = registrar_bloqueo(
+            doctores,
+            desde,
+            hasta,
+            options['motivo'],
+            tipo_excepcion=options['tipo'],
+            accion=ACCION_CANCELAR if options['cancelar'] else ACCION_REPROGRAMAR
+        )
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n📊 Resumen:\n'
+                f'   - Doctores bloqueados: {len(excepciones)}\n'
+                f'   - Citas {"canceladas" if options["cancelar"] else "por reprogramar"}: {len(citas)}\n'
+                f'   - Avisos encolados: {len(citas)}\n'
+            )
+        )
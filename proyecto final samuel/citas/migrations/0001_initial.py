@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:38
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('doctores', '0002_franjahoraria_doctor_franjas_hasta'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cita',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Código de la Cita')),
+                ('fecha_hora_inicio', models.DateTimeField(verbose_name='Fecha y Hora de Inicio')),
+                ('fecha_hora_fin', models.DateTimeField(verbose_name='Fecha y Hora de Fin')),
+                ('estado', models.CharField(choices=[('confirmada', 'Confirmada'), ('cancelada', 'Cancelada'), ('completada', 'Completada'), ('no_asistio', 'No Asistió')], default='confirmada', max_length=20, verbose_name='Estado')),
+                ('motivo', models.TextField(blank=True, verbose_name='Motivo de la Consulta')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='citas', to='doctores.doctor', verbose_name='Doctor')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='citas', to=settings.AUTH_USER_MODEL, verbose_name='Paciente')),
+            ],
+            options={
+                'verbose_name': 'Cita',
+                'verbose_name_plural': 'Citas',
+                'ordering': ['fecha_hora_inicio'],
+                'indexes': [models.Index(fields=['doctor', 'fecha_hora_inicio'], name='cita_doctor_inicio_idx'), models.Index(fields=['paciente', 'fecha_hora_inicio'], name='cita_paciente_inicio_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado', 'cancelada'), _negated=True), fields=('doctor', 'fecha_hora_inicio'), name='cita_unica_doctor_inicio'), models.CheckConstraint(condition=models.Q(('fecha_hora_fin__gt', models.F('fecha_hora_inicio'))), name='cita_fin_posterior_inicio')],
+            },
+        ),
+    ]
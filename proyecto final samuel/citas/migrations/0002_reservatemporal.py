@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0001_initial'),
+        ('doctores', '0002_franjahoraria_doctor_franjas_hasta'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaTemporal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_hora_inicio', models.DateTimeField(verbose_name='Fecha y Hora de Inicio')),
+                ('expira', models.DateTimeField(verbose_name='Expira')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_temporales', to='doctores.doctor', verbose_name='Doctor')),
+                ('titular', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_temporales', to=settings.AUTH_USER_MODEL, verbose_name='Titular')),
+            ],
+            options={
+                'verbose_name': 'Reserva Temporal',
+                'verbose_name_plural': 'Reservas Temporales',
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'fecha_hora_inicio'), name='reserva_unica_doctor_inicio')],
+            },
+        ),
+    ]
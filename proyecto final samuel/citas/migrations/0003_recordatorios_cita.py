@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0002_reservatemporal'),
+        ('doctores', '0006_documento_busqueda_doctor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cita',
+            name='recordatorio_1h_enviado',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Recordatorio de 1 Hora Enviado'),
+        ),
+        migrations.AddField(
+            model_name='cita',
+            name='recordatorio_24h_enviado',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Recordatorio de 24 Horas Enviado'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(condition=models.Q(('estado', 'confirmada'), ('recordatorio_24h_enviado__isnull', True)), fields=['fecha_hora_inicio'], name='cita_recordatorio_24h_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(condition=models.Q(('estado', 'confirmada'), ('recordatorio_1h_enviado__isnull', True)), fields=['fecha_hora_inicio'], name='cita_recordatorio_1h_idx'),
+        ),
+    ]
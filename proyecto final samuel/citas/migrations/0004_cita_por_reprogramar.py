@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0003_recordatorios_cita'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cita',
+            name='estado',
+            field=models.CharField(choices=[('confirmada', 'Confirmada'), ('por_reprogramar', 'Por Reprogramar'), ('cancelada', 'Cancelada'), ('completada', 'Completada'), ('no_asistio', 'No Asistió')], default='confirmada', max_length=20, verbose_name='Estado'),
+        ),
+    ]
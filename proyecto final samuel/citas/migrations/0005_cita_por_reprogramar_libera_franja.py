@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0004_cita_por_reprogramar'),
+        ('doctores', '0007_doctor_clave_calendario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='cita',
+            name='cita_unica_doctor_inicio',
+        ),
+        migrations.AddConstraint(
+            model_name='cita',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ['cancelada', 'por_reprogramar']), _negated=True), fields=('doctor', 'fecha_hora_inicio'), name='cita_unica_doctor_inicio'),
+        ),
+    ]
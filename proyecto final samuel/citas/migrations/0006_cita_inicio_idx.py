@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0005_cita_por_reprogramar_libera_franja'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha_hora_inicio'], name='cita_inicio_idx'),
+        ),
+    ]
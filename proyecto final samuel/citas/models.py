@@ -1,3 +1,175 @@
+import uuid
+
 from django.db import models
+from django.db.models import F, Q
+from django.contrib.auth import get_user_model
+
+from doctores.models import Doctor
+
+Usuario = get_user_model()
+
+class Cita(models.Model):
+    """
+    Modelo para las citas médicas agendadas por los pacientes
+    """
+    ESTADO_CHOICES = [
+        ('confirmada', 'Confirmada'),
+        ('por_reprogramar', 'Por Reprogramar'),
+        ('cancelada', 'Cancelada'),
+        ('completada', 'Completada'),
+        ('no_asistio', 'No Asistió'),
+    ]
+    
+    # Estados que liberan la franja del doctor. Una cita por reprogramar ya
+    # no se atiende a esa hora (ver conflictos.py): el paciente agenda otra
+    ESTADOS_LIBERADOS = ['cancelada', 'por_reprogramar']
+    
+    codigo = models.UUIDField(
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        verbose_name='Código de la Cita'
+    )
+    
+    paciente = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        related_name='citas',
+        verbose_name='Paciente'
+    )
+    
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.PROTECT,
+        related_name='citas',
+        verbose_name='Doctor'
+    )
+    
+    fecha_hora_inicio = models.DateTimeField(
+        verbose_name='Fecha y Hora de Inicio'
+    )
+    
+    fecha_hora_fin = models.DateTimeField(
+        verbose_name='Fecha y Hora de Fin'
+    )
+    
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_CHOICES,
+        default='confirmada',
+        verbose_name='Estado'
+    )
+    
+    motivo = models.TextField(
+        blank=True,
+        verbose_name='Motivo de la Consulta'
+    )
+    
+    fecha_creacion = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de Creación'
+    )
+    
+    fecha_actualizacion = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Fecha de Actualización'
+    )
+    
+    # Marcas de los recordatorios ya enviados (ver notificaciones/recordatorios.py)
+    recordatorio_24h_enviado = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Recordatorio de 24 Horas Enviado'
+    )
+    
+    recordatorio_1h_enviado = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Recordatorio de 1 Hora Enviado'
+    )
+    
+    class Meta:
+        verbose_name = 'Cita'
+        verbose_name_plural = 'Citas'
+        ordering = ['fecha_hora_inicio']
+        constraints = [
+            # Un doctor no puede tener dos citas vigentes que empiecen a la misma hora
+            models.UniqueConstraint(
+                fields=['doctor', 'fecha_hora_inicio'],
+                condition=~Q(estado__in=['cancelada', 'por_reprogramar']),
+                name='cita_unica_doctor_inicio'
+            ),
+            models.CheckConstraint(
+                condition=Q(fecha_hora_fin__gt=F('fecha_hora_inicio')),
+                name='cita_fin_posterior_inicio'
+            ),
+        ]
+        indexes = [
+            # Citas del doctor X en el día Y
+            models.Index(fields=['doctor', 'fecha_hora_inicio'], name='cita_doctor_inicio_idx'),
+            # Citas del paciente Z
+            models.Index(fields=['paciente', 'fecha_hora_inicio'], name='cita_paciente_inicio_idx'),
+            # Citas de hoy en adelante de todos los doctores (dashboard)
+            models.Index(fields=['fecha_hora_inicio'], name='cita_inicio_idx'),
+            # Citas confirmadas con recordatorio pendiente, por hora de inicio
+            models.Index(
+                fields=['fecha_hora_inicio'],
+                condition=Q(estado='confirmada', recordatorio_24h_enviado__isnull=True),
+                name='cita_recordatorio_24h_idx'
+            ),
+            models.Index(
+                fields=['fecha_hora_inicio'],
+                condition=Q(estado='confirmada', recordatorio_1h_enviado__isnull=True),
+                name='cita_recordatorio_1h_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.paciente.get_full_name()} con {self.doctor} - {self.fecha_hora_inicio:%d/%m/%Y %H:%M}"
+    
+    def esta_vigente(self):
+        """Indica si la cita ocupa la franja del doctor"""
+        return self.estado not in self.ESTADOS_LIBERADOS
 
-# Create your models here.
+class ReservaTemporal(models.Model):
+    """
+    Retención temporal de una franja mientras el paciente confirma la cita.
+    Las reservas vencidas no se borran: simplemente dejan de contar y la
+    siguiente persona que pida la franja las reutiliza.
+    """
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.CASCADE,
+        related_name='reservas_temporales',
+        verbose_name='Doctor'
+    )
+    
+    fecha_hora_inicio = models.DateTimeField(
+        verbose_name='Fecha y Hora de Inicio'
+    )
+    
+    titular = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        related_name='reservas_temporales',
+        verbose_name='Titular'
+    )
+    
+    expira = models.DateTimeField(
+        verbose_name='Expira'
+    )
+    
+    class Meta:
+        verbose_name = 'Reserva Temporal'
+        verbose_name_plural = 'Reservas Temporales'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['doctor', 'fecha_hora_inicio'],
+                name='reserva_unica_doctor_inicio'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Reserva {self.doctor_id} - {self.fecha_hora_inicio:%d/%m/%Y %H:%M} hasta {self.expira:%H:%M:%S}"
@@ -0,0 +1,210 @@
+"""
+Servicios de agendamiento de citas
+
+Toda reserva pasa por agendar_cita, que valida la franja contra el horario
+del doctor y toma el cupo dentro de una transacción. En SQLite la
+transacción es IMMEDIATE (ver agenda_medica/basedatos.py), por lo que el
+bloqueo de escritura se obtiene al empezar; en PostgreSQL se bloquean las filas del
+doctor y del paciente (siempre en ese orden), para serializar tanto las
+reservas de la misma franja como las de un mismo paciente con doctores
+distintos. En ambos casos la restricción única (doctor, fecha_hora_inicio)
+es la última barrera contra reservas dobles.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from agenda_medica import metricas
+from agenda_medica.basedatos import transaccion_inmediata
+from doctores.disponibilidad import ESTADO_DISPONIBLE, ESTADO_OCUPADO, calcular_disponibilidad, obtener_disponibilidad
+from doctores.models import Doctor
+from notificaciones.services import encolar_cancelacion
+from .models import Cita, ReservaTemporal
+
+Usuario = get_user_model()
+
+# Anticipación mínima para que el paciente cancele su cita
+HORAS_MINIMAS_CANCELACION = 12
+
+
+def buscar_franja(doctor, fecha_hora_inicio):
+    """
+    Retorna la franja del horario regular del doctor que empieza en
+    fecha_hora_inicio, o None si no existe o está bloqueada por una excepción.
+    """
+    fecha = timezone.localtime(fecha_hora_inicio).date()
+    franjas = calcular_disponibilidad([doctor.pk], fecha, fecha)[doctor.pk].get(fecha, [])
+    for franja in franjas:
+        if franja['inicio'] == fecha_hora_inicio:
+            return franja if franja['estado'] == ESTADO_DISPONIBLE else None
+    return None
+
+
+def citas_solapadas(fecha_hora_inicio, fecha_hora_fin, **filtros):
+    """Citas vigentes que se cruzan con el intervalo dado"""
+    return Cita.objects.filter(
+        fecha_hora_inicio__lt=fecha_hora_fin,
+        fecha_hora_fin__gt=fecha_hora_inicio,
+        **filtros
+    ).exclude(estado__in=Cita.ESTADOS_LIBERADOS)
+
+
+def agendar_cita(paciente, doctor, fecha_hora_inicio, motivo=''):
+    """
+    Agenda una cita confirmada en la franja indicada.
+    Lanza ValidationError si la franja no es válida o ya fue tomada.
+    """
+    if fecha_hora_inicio <= timezone.now():
+        raise ValidationError('No se pueden agendar citas en fechas u horas pasadas.')
+
+    if not doctor.activo:
+        raise ValidationError('El doctor seleccionado no está disponible.')
+
+    franja = buscar_franja(doctor, fecha_hora_inicio)
+    if franja is None:
+        raise ValidationError('La hora seleccionada no está dentro del horario de atención del doctor.')
+
+    try:
+        with transaccion_inmediata():
+            # En PostgreSQL serializa las reservas del mismo doctor y las del
+            # mismo paciente; en SQLite la transacción IMMEDIATE ya tiene el
+            # bloqueo de escritura.
+            list(Doctor.objects.select_for_update().filter(pk=doctor.pk).values_list('pk', flat=True))
+            list(Usuario.objects.select_for_update().filter(pk=paciente.pk).values_list('pk', flat=True))
+
+            if citas_solapadas(franja['inicio'], franja['fin'], doctor=doctor).exists():
+                raise ValidationError('La franja seleccionada ya no está disponible.')
+
+            if citas_solapadas(franja['inicio'], franja['fin'], paciente=paciente).exists():
+                raise ValidationError('Ya tienes otra cita agendada en ese horario.')
+
+            if ReservaTemporal.objects.filter(
+                doctor=doctor,
+                fecha_hora_inicio=franja['inicio'],
+                expira__gt=timezone.now()
+            ).exclude(titular=paciente).exists():
+                raise ValidationError('Otro paciente está confirmando esta franja. Intenta con otra hora.')
+
+            cita = Cita.objects.create(
+                paciente=paciente,
+                doctor=doctor,
+                fecha_hora_inicio=franja['inicio'],
+                fecha_hora_fin=franja['fin'],
+                motivo=motivo,
+            )
+
+            # La reserva temporal del paciente ya cumplió su propósito
+            ReservaTemporal.objects.filter(
+                doctor=doctor,
+                fecha_hora_inicio=franja['inicio']
+            ).delete()
+    except IntegrityError:
+        raise ValidationError('La franja seleccionada ya no está disponible.')
+
+    transaction.on_commit(lambda: metricas.citas.inc(evento='agendada'))
+    return cita
+
+
+def duracion_reserva():
+    """Tiempo que se retiene una franja mientras el paciente confirma"""
+    return timedelta(seconds=getattr(settings, 'CITAS_RESERVA_TTL_SEGUNDOS', 300))
+
+
+def reservar_franja(titular, doctor, fecha_hora_inicio):
+    """
+    Retiene la franja (doctor, fecha_hora_inicio) para el titular.
+
+    Solo se retienen franjas reales y libres del horario del doctor, y cada
+    titular retiene una sola franja a la vez: al tomar una nueva se liberan
+    las demás que tuviera. La franja se valida con la caché de
+    disponibilidad, que ya marca las citas y las excepciones, así que con
+    la caché caliente no hay lecturas: una inserción contra el índice único
+    y un borrado por titular. Si la fila ya existe, una actualización
+    condicional la toma solo si está vencida o ya pertenece al titular
+    (renovación). La reserva no es la garantía: agendar_cita vuelve a
+    validar todo dentro de su transacción. Lanza ValidationError si la
+    franja no es válida o si otra persona la tiene retenida.
+
+    No hay liberación explícita: la reserva vence sola a los
+    CITAS_RESERVA_TTL_SEGUNDOS, y agendar la cita o reservar otra franja la
+    libera antes.
+    """
+    if fecha_hora_inicio <= timezone.now():
+        raise ValidationError('No se pueden reservar franjas en fechas u horas pasadas.')
+
+    if not doctor.activo:
+        raise ValidationError('El doctor seleccionado no está disponible.')
+
+    fecha = timezone.localtime(fecha_hora_inicio).date()
+    franjas = obtener_disponibilidad([doctor], fecha, fecha, reservas=False)[doctor.pk].get(fecha, [])
+    franja = next((franja for franja in franjas if franja['inicio'] == fecha_hora_inicio), None)
+    if franja is not None and franja['estado'] == ESTADO_OCUPADO:
+        raise ValidationError('La franja seleccionada ya no está disponible.')
+    if franja is None or franja['estado'] != ESTADO_DISPONIBLE:
+        raise ValidationError('La hora seleccionada no está dentro del horario de atención del doctor.')
+
+    ahora = timezone.now()
+    reserva = ReservaTemporal(
+        doctor=doctor,
+        fecha_hora_inicio=franja['inicio'],
+        titular=titular,
+        expira=ahora + duracion_reserva(),
+    )
+    with transaccion_inmediata():
+        try:
+            with transaction.atomic():
+                reserva.save()
+        except IntegrityError:
+            tomadas = ReservaTemporal.objects.filter(
+                doctor=doctor,
+                fecha_hora_inicio=reserva.fecha_hora_inicio
+            ).filter(
+                Q(expira__lte=ahora) | Q(titular=titular)
+            ).update(titular=titular, expira=reserva.expira)
+
+            if not tomadas:
+                raise ValidationError('Otro paciente está confirmando esta franja. Intenta con otra hora.')
+
+        # Un titular no puede acaparar la agenda: se queda solo con esta franja
+        ReservaTemporal.objects.filter(titular=titular).exclude(
+            doctor=doctor,
+            fecha_hora_inicio=reserva.fecha_hora_inicio
+        ).delete()
+
+    return reserva
+
+
+def purgar_reservas_vencidas():
+    """Elimina las reservas vencidas; no es necesario para la corrección, solo libera espacio"""
+    borradas, _ = ReservaTemporal.objects.filter(expira__lte=timezone.now()).delete()
+    return borradas
+
+
+def cancelar_cita(cita, validar_plazo=True):
+    """
+    Cancela una cita confirmada o por reprogramar y libera la franja del doctor.
+    Con validar_plazo, exige la anticipación mínima de cancelación a las
+    citas confirmadas; una cita por reprogramar ya no se va a atender a esa
+    hora, así que el paciente la puede cancelar en cualquier momento.
+    """
+    if cita.estado not in ('confirmada', 'por_reprogramar'):
+        raise ValidationError('Solo se pueden cancelar citas confirmadas o por reprogramar.')
+
+    limite = timezone.now() + timedelta(hours=HORAS_MINIMAS_CANCELACION)
+    if validar_plazo and cita.estado == 'confirmada' and cita.fecha_hora_inicio <= limite:
+        raise ValidationError(
+            f'No es posible cancelar con menos de {HORAS_MINIMAS_CANCELACION} horas de anticipación.'
+        )
+
+    # El aviso queda en la bandeja de salida en la misma transacción
+    with transaction.atomic():
+        cita.estado = 'cancelada'
+        cita.save(update_fields=['estado', 'fecha_actualizacion'])
+        encolar_cancelacion(cita)
+    transaction.on_commit(lambda: metricas.citas.inc(evento='cancelada'))
+    return cita
@@ -0,0 +1,40 @@
+"""
+Señales de la app citas
+
+Cualquier cambio en una cita invalida la caché de disponibilidad del doctor
+y marca su agenda como actualizada para el calendario iCalendar.
+"""
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from doctores.cache_disponibilidad import invalidar_doctor_al_confirmar
+from doctores.calendario_ical import marcar_agenda_actualizada
+from .models import Cita
+
+
+@receiver(pre_save, sender=Cita)
+def recordar_doctor_anterior(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Guarda el doctor previo por si la cita se reasigna"""
+    instance._doctor_anterior = None
+    if update_fields is not None and 'doctor' not in update_fields:
+        return
+    if instance.pk and not raw:
+        instance._doctor_anterior = sender.objects.filter(
+            pk=instance.pk
+        ).values_list('doctor_id', flat=True).first()
+
+
+@receiver(post_save, sender=Cita)
+def cita_guardada(sender, instance, **kwargs):
+    anterior = getattr(instance, '_doctor_anterior', None)
+    if anterior and anterior != instance.doctor_id:
+        invalidar_doctor_al_confirmar(anterior)
+        marcar_agenda_actualizada(anterior)
+    invalidar_doctor_al_confirmar(instance.doctor_id)
+    marcar_agenda_actualizada(instance.doctor_id)
+
+
+@receiver(post_delete, sender=Cita)
+def cita_eliminada(sender, instance, **kwargs):
+    invalidar_doctor_al_confirmar(instance.doctor_id)
+    marcar_agenda_actualizada(instance.doctor_id)
@@ -1,3 +1,296 @@
-from django.test import TestCase
+from datetime import datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from agenda_medica import metricas
+from doctores.models import Doctor, Especialidad, ExcepcionHorario, HorarioAtencion
+from notificaciones.models import Notificacion
+from usuarios.models import Usuario
+from . import conflictos
+from .models import Cita, ReservaTemporal
+from .services import agendar_cita, cancelar_cita, reservar_franja
+
+
+def crear_usuario(nombre, tipo_usuario='paciente'):
+    return Usuario.objects.create_user(
+        email=f'{nombre}@agenda.com', username=nombre,
+        first_name=nombre.capitalize(), last_name='Prueba', tipo_usuario=tipo_usuario
+    )
+
+
+def crear_doctor(nombre, especialidad):
+    """Doctor que atiende los lunes de 8:00 a 12:00 en franjas de 30 minutos"""
+    doctor = Doctor.objects.create(
+        usuario=crear_usuario(nombre, 'doctor'), especialidad=especialidad, numero_licencia=f'LIC-{nombre}'
+    )
+    HorarioAtencion.objects.create(
+        doctor=doctor, dia_semana=0, hora_inicio=time(8), hora_fin=time(12), duracion_cita=30
+    )
+    return doctor
+
+
+def proximo_lunes():
+    hoy = timezone.localdate()
+    return hoy + timedelta(days=7 - hoy.weekday())
+
+
+def momento(fecha, hora, minuto=0):
+    return timezone.make_aware(datetime.combine(fecha, time(hora, minuto)))
+
+
+class AgendarCitaTest(TransactionTestCase):
+    """
+    HU0002: Una franja no puede quedar agendada dos veces y un paciente no
+    puede tener dos citas que se crucen. Es TransactionTestCase para que
+    cada agendamiento use una transacción real y el IntegrityError de la
+    restricción única se produzca de verdad.
+    """
+
+    def setUp(self):
+        for alias in ('default', 'disponibilidad'):
+            caches[alias].clear()
+        especialidad = Especialidad.objects.create(nombre='Medicina General')
+        self.doctor = crear_doctor('general', especialidad)
+        self.otro_doctor = crear_doctor('familiar', especialidad)
+        self.paciente = crear_usuario('paciente')
+        self.otro_paciente = crear_usuario('otro')
+        self.inicio = momento(proximo_lunes(), 9)
+
+    def test_franja_tomada_no_se_agenda_dos_veces(self):
+        agendar_cita(self.paciente, self.doctor, self.inicio)
+
+        with self.assertRaisesMessage(ValidationError, 'ya no está disponible'):
+            agendar_cita(self.otro_paciente, self.doctor, self.inicio)
+        self.assertEqual(Cita.objects.filter(doctor=self.doctor).count(), 1)
+
+    def test_restriccion_unica_es_la_ultima_barrera(self):
+        agendar_cita(self.paciente, self.doctor, self.inicio)
+
+        # Simula una segunda reserva que pasó la verificación antes de que la primera confirmara
+        with mock.patch('citas.services.citas_solapadas', return_value=Cita.objects.none()):
+            with self.assertRaisesMessage(ValidationError, 'ya no está disponible'):
+                agendar_cita(self.otro_paciente, self.doctor, self.inicio)
+        self.assertEqual(Cita.objects.filter(doctor=self.doctor).count(), 1)
+
+    def test_paciente_no_puede_tener_citas_solapadas(self):
+        agendar_cita(self.paciente, self.doctor, self.inicio)
+
+        with self.assertRaisesMessage(ValidationError, 'Ya tienes otra cita'):
+            agendar_cita(self.paciente, self.otro_doctor, self.inicio)
+        self.assertEqual(Cita.objects.filter(paciente=self.paciente).count(), 1)
+
+    def test_franja_cancelada_se_puede_volver_a_agendar(self):
+        cita = agendar_cita(self.paciente, self.doctor, self.inicio)
+        cancelar_cita(cita, validar_plazo=False)
+
+        agendar_cita(self.otro_paciente, self.doctor, self.inicio)
+        self.assertEqual(Cita.objects.filter(doctor=self.doctor).exclude(estado='cancelada').count(), 1)
+
+    def test_solo_la_reserva_toma_el_bloqueo_al_empezar(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('BEGIN IMMEDIATE es propio de SQLite')
+        with CaptureQueriesContext(connection) as consultas:
+            cita = agendar_cita(self.paciente, self.doctor, self.inicio)
+            cancelar_cita(cita, validar_plazo=False)
+
+        inicios = [consulta['sql'] for consulta in consultas if consulta['sql'].startswith('BEGIN')]
+        self.assertEqual(inicios, ['BEGIN IMMEDIATE', 'BEGIN'])
+
+    def test_franja_fuera_del_horario_se_rechaza(self):
+        with self.assertRaisesMessage(ValidationError, 'horario de atención'):
+            agendar_cita(self.paciente, self.doctor, momento(proximo_lunes(), 9, 17))
+
+
+class ReservarFranjaTest(TestCase):
+    """
+    Las reservas temporales solo retienen franjas reales y libres, y cada
+    paciente retiene una sola franja a la vez
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        especialidad = Especialidad.objects.create(nombre='Medicina General')
+        cls.doctor = crear_doctor('general', especialidad)
+        cls.paciente = crear_usuario('paciente')
+        cls.otro_paciente = crear_usuario('otro')
+        cls.fecha = proximo_lunes()
+
+    def setUp(self):
+        for alias in ('default', 'disponibilidad'):
+            caches[alias].clear()
+
+    def test_rechaza_horas_fuera_del_horario(self):
+        for inicio in (momento(self.fecha, 3, 17), momento(self.fecha, 9, 10), momento(self.fecha, 13)):
+            with self.assertRaisesMessage(ValidationError, 'horario de atención'):
+                reservar_franja(self.paciente, self.doctor, inicio)
+        self.assertFalse(ReservaTemporal.objects.exists())
+
+    def test_rechaza_franjas_con_cita(self):
+        agendar_cita(self.otro_paciente, self.doctor, momento(self.fecha, 9))
+        with self.assertRaisesMessage(ValidationError, 'ya no está disponible'):
+            reservar_franja(self.paciente, self.doctor, momento(self.fecha, 9))
+        self.assertFalse(ReservaTemporal.objects.exists())
+
+    def test_otro_titular_no_puede_tomar_una_reserva_vigente(self):
+        reservar_franja(self.paciente, self.doctor, momento(self.fecha, 9))
+        with self.assertRaisesMessage(ValidationError, 'Otro paciente'):
+            reservar_franja(self.otro_paciente, self.doctor, momento(self.fecha, 9))
+        self.assertEqual(ReservaTemporal.objects.get().titular, self.paciente)
+
+    def test_titular_renueva_su_reserva(self):
+        primera = reservar_franja(self.paciente, self.doctor, momento(self.fecha, 9))
+        ReservaTemporal.objects.update(expira=timezone.now() + timedelta(seconds=5))
+
+        renovada = reservar_franja(self.paciente, self.doctor, momento(self.fecha, 9))
+        self.assertGreaterEqual(renovada.expira, primera.expira)
+        self.assertEqual(ReservaTemporal.objects.get().expira, renovada.expira)
+
+    def test_reserva_vencida_la_toma_otro_titular(self):
+        reservar_franja(self.paciente, self.doctor, momento(self.fecha, 9))
+        ReservaTemporal.objects.update(expira=timezone.now() - timedelta(seconds=1))
+
+        reservar_franja(self.otro_paciente, self.doctor, momento(self.fecha, 9))
+        reserva = ReservaTemporal.objects.get()
+        self.assertEqual(reserva.titular, self.otro_paciente)
+        self.assertGreater(reserva.expira, timezone.now())
+
+    def test_titular_retiene_una_sola_franja(self):
+        for hora in (8, 9, 10, 11):
+            reservar_franja(self.paciente, self.doctor, momento(self.fecha, hora))
+
+        self.assertEqual(
+            list(ReservaTemporal.objects.filter(titular=self.paciente).values_list('fecha_hora_inicio', flat=True)),
+            [momento(self.fecha, 11)]
+        )
+        # Las franjas que soltó quedan libres para los demás
+        reservar_franja(self.otro_paciente, self.doctor, momento(self.fecha, 8))
+
+    def test_con_la_cache_caliente_no_lee_la_base_de_datos(self):
+        reservar_franja(self.paciente, self.doctor, momento(self.fecha, 8))
+
+        with CaptureQueriesContext(connection) as consultas:
+            reservar_franja(self.paciente, self.doctor, momento(self.fecha, 9))
+        # Sin contar los SAVEPOINT: una inserción y el borrado de la reserva anterior
+        sentencias = [consulta['sql'].split()[0] for consulta in consultas.captured_queries]
+        self.assertEqual([sentencia for sentencia in sentencias if sentencia != 'SAVEPOINT' and sentencia != 'RELEASE'],
+                         ['INSERT', 'DELETE'])
+
+
+class ConflictosExcepcionTest(TestCase):
+    """
+    HU0008: Las citas que se cruzan con una excepción se resuelven por
+    conjuntos y las citas por reprogramar liberan la franja
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        especialidad = Especialidad.objects.create(nombre='Medicina General')
+        cls.doctor = crear_doctor('general', especialidad)
+        cls.otro_doctor = crear_doctor('familiar', especialidad)
+        cls.fecha = proximo_lunes()
+        cls.citas = {
+            (hora, minuto): agendar_cita(crear_usuario(f'paciente{hora}{minuto}'), cls.doctor, momento(cls.fecha, hora, minuto))
+            for hora, minuto in [(8, 30), (9, 0), (9, 30), (10, 0)]
+        }
+        cls.cita_otro_doctor = agendar_cita(crear_usuario('otro'), cls.otro_doctor, momento(cls.fecha, 9))
+        cancelada = agendar_cita(crear_usuario('cancela'), cls.doctor, momento(cls.fecha, 11))
+        cancelar_cita(cancelada, validar_plazo=False)
+        Notificacion.objects.all().delete()
+
+    def setUp(self):
+        for alias in ('default', 'disponibilidad'):
+            caches[alias].clear()
+        # De 8:45 a 10:00: corta la cita de 8:30, cubre las de 9:00 y 9:30 y toca el borde de la de 10:00
+        self.excepcion = ExcepcionHorario.objects.create(
+            doctor=self.doctor, motivo='Reunión',
+            fecha_inicio=momento(self.fecha, 8, 45), fecha_fin=momento(self.fecha, 10)
+        )
+
+    def test_citas_afectadas(self):
+        self.assertEqual(
+            list(conflictos.citas_afectadas([self.excepcion])),
+            [self.citas[(8, 30)], self.citas[(9, 0)], self.citas[(9, 30)]]
+        )
+
+    def test_resuelve_por_conjuntos(self):
+        agenda_anterior = Doctor.objects.get(pk=self.doctor.pk).agenda_actualizada
+        with mock.patch.object(conflictos, 'invalidar_doctor_al_confirmar') as invalidar, \
+                self.assertNumQueries(7):
+            afectadas = conflictos.resolver_conflictos([self.excepcion], conflictos.ACCION_REPROGRAMAR)
+
+        self.assertEqual(len(afectadas), 3)
+        self.assertEqual(
+            sorted(Cita.objects.filter(estado='por_reprogramar').values_list('pk', flat=True)),
+            sorted(cita.pk for cita in afectadas)
+        )
+        self.assertEqual(Cita.objects.get(pk=self.citas[(10, 0)].pk).estado, 'confirmada')
+        self.assertEqual(Cita.objects.get(pk=self.cita_otro_doctor.pk).estado, 'confirmada')
+        self.assertEqual(
+            sorted(Notificacion.objects.filter(tipo='excepcion').values_list('destinatario', flat=True)),
+            sorted(cita.paciente.email for cita in afectadas)
+        )
+        self.assertTrue(ExcepcionHorario.objects.get(pk=self.excepcion.pk).notificado)
+        invalidar.assert_called_once_with(self.doctor.pk)
+        self.assertGreater(Doctor.objects.get(pk=self.doctor.pk).agenda_actualizada, agenda_anterior)
+
+    def test_cancelar_cancela_las_afectadas(self):
+        metricas.registro.reiniciar()
+        with self.captureOnCommitCallbacks(execute=True):
+            conflictos.resolver_conflictos([self.excepcion], conflictos.ACCION_CANCELAR)
+        self.assertEqual(Cita.objects.filter(doctor=self.doctor, estado='cancelada').count(), 4)
+        self.assertEqual(metricas.registro.estado()['agenda_citas_total'], {('cancelada',): 3})
+
+    def test_cita_por_reprogramar_libera_la_franja_y_se_puede_cancelar(self):
+        conflictos.resolver_conflictos([self.excepcion])
+        cita = Cita.objects.get(pk=self.citas[(9, 0)].pk)
+
+        # El paciente cancela aunque falte menos que el plazo mínimo
+        with mock.patch('citas.services.HORAS_MINIMAS_CANCELACION', 24 * 30):
+            cancelar_cita(cita)
+        self.assertEqual(cita.estado, 'cancelada')
+
+        # Sin la excepción, otro paciente agenda una franja que quedó por reprogramar
+        self.excepcion.delete()
+        agendar_cita(crear_usuario('nuevo'), self.doctor, momento(self.fecha, 9, 30))
+        self.assertEqual(
+            Cita.objects.filter(doctor=self.doctor, fecha_hora_inicio=momento(self.fecha, 9, 30)).count(), 2
+        )
+
+    def test_excepcion_en_la_linea_del_admin_del_doctor(self):
+        administrador = Usuario.objects.create_superuser(
+            email='admin@agenda.com', username='admin', password='clave',
+            first_name='Ana', last_name='Admin', tipo_usuario='administrador'
+        )
+        self.client.force_login(administrador)
+        doctor = self.doctor
+        datos = {
+            'usuario': doctor.usuario_id, 'especialidad': doctor.especialidad_id,
+            'numero_licencia': doctor.numero_licencia, 'consultorio': '', 'telefono_consultorio': '',
+            'activo': 'on',
+            'horarios_atencion-TOTAL_FORMS': 0, 'horarios_atencion-INITIAL_FORMS': 0,
+            # Solo se envía la excepción nueva, de 10:00 a 10:30
+            'excepciones_horario-TOTAL_FORMS': 1, 'excepciones_horario-INITIAL_FORMS': 0,
+            'excepciones_horario-0-fecha_inicio_0': self.fecha.isoformat(),
+            'excepciones_horario-0-fecha_inicio_1': '10:00',
+            'excepciones_horario-0-fecha_fin_0': self.fecha.isoformat(),
+            'excepciones_horario-0-fecha_fin_1': '10:30',
+            'excepciones_horario-0-tipo_excepcion': 'otro',
+            'excepciones_horario-0-motivo': 'Desde el admin',
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:doctores_doctor_change', args=[doctor.pk]), datos)
+        self.assertEqual(response.status_code, 302)
+
+        excepcion = ExcepcionHorario.objects.get(motivo='Desde el admin')
+        self.assertEqual(excepcion.creado_por, administrador)
+        self.assertTrue(excepcion.notificado)
+        self.assertEqual(Cita.objects.get(pk=self.citas[(10, 0)].pk).estado, 'por_reprogramar')
+        self.assertEqual(Cita.objects.get(pk=self.citas[(9, 30)].pk).estado, 'confirmada')
+        self.assertTrue(Notificacion.objects.filter(tipo='excepcion', destinatario=self.citas[(10, 0)].paciente.email).exists())
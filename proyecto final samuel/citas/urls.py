@@ -4,5 +4,8 @@ from . import views
 app_name = 'citas'
 
 urlpatterns = [
-    # URLs para citas se implementarán más adelante
-] 
\ No newline at end of file
+    # URLs para pacientes - Agendar y cancelar citas (HU0002, HU0004)
+    path('agendar/', views.agendar_cita, name='agendar_cita'),
+    path('reservar/', views.reservar_franja, name='reservar_franja'),
+    path('<uuid:codigo>/cancelar/', views.cancelar_cita, name='cancelar_cita'),
+]
@@ -1,3 +1,89 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, redirect
+from django.contrib.auth.decorators import login_required
+from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
 
-# Create your views here.
+from .forms import AgendarCitaForm
+from .models import Cita
+from . import services
+
+@login_required
+@require_POST
+def agendar_cita(request):
+    """
+    HU0002: Agendar una cita en una franja disponible
+    """
+    if not request.user.es_paciente():
+        messages.error(request, 'Solo los pacientes pueden agendar citas desde esta vista.')
+        return redirect('doctores:consultar_disponibilidad')
+    
+    form = AgendarCitaForm(request.POST)
+    if form.is_valid():
+        try:
+            cita = services.agendar_cita(
+                paciente=request.user,
+                doctor=form.cleaned_data['doctor'],
+                fecha_hora_inicio=form.cleaned_data['fecha_hora_inicio'],
+                motivo=form.cleaned_data.get('motivo', ''),
+            )
+            messages.success(
+                request,
+                f'Cita confirmada para el {cita.fecha_hora_inicio:%d/%m/%Y %H:%M}. '
+                f'Código de la cita: {cita.codigo}'
+            )
+            return redirect('usuarios:dashboard')
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+    else:
+        for error in form.non_field_errors() or ['La franja seleccionada no es válida.']:
+            messages.error(request, error)
+    
+    return redirect('doctores:consultar_disponibilidad')
+
+@login_required
+@require_POST
+def cancelar_cita(request, codigo):
+    """
+    HU0004: Cancelar una cita confirmada (o por reprogramar) y liberar la franja
+    """
+    cita = get_object_or_404(Cita, codigo=codigo)
+    es_personal = request.user.es_recepcion() or request.user.es_administrador()
+    
+    # Verificar permisos
+    if not es_personal and cita.paciente_id != request.user.id:
+        messages.error(request, 'No tienes permisos para cancelar esta cita.')
+        return redirect('usuarios:dashboard')
+    
+    try:
+        services.cancelar_cita(cita, validar_plazo=not es_personal)
+        messages.success(request, 'Cita cancelada exitosamente.')
+    except ValidationError as e:
+        messages.error(request, e.messages[0])
+    
+    return redirect('usuarios:dashboard')
+
+@login_required
+@require_POST
+def reservar_franja(request):
+    """
+    Vista AJAX para retener una franja mientras el paciente confirma la cita
+    """
+    if not request.user.es_paciente():
+        return JsonResponse({'error': 'Solo los pacientes pueden reservar franjas.'}, status=403)
+    
+    form = AgendarCitaForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'error': 'La franja seleccionada no es válida.'}, status=400)
+    
+    try:
+        reserva = services.reservar_franja(
+            titular=request.user,
+            doctor=form.cleaned_data['doctor'],
+            fecha_hora_inicio=form.cleaned_data['fecha_hora_inicio'],
+        )
+    except ValidationError as e:
+        return JsonResponse({'error': e.messages[0]}, status=409)
+    
+    return JsonResponse({'reservada': True, 'expira': reserva.expira.isoformat()})
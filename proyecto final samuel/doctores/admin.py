@@ -1,9 +1,20 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import Count, Q
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
+from citas.conflictos import resolver_conflictos
 from .models import Especialidad, Doctor, HorarioAtencion, ExcepcionHorario
 
+def avisar_citas_afectadas(modeladmin, request, afectadas):
+    """Mensaje del admin con las citas que una excepción dejó por reprogramar"""
+    if afectadas:
+        modeladmin.message_user(
+            request,
+            f'{len(afectadas)} cita(s) marcadas para reprogramar; los pacientes serán notificados.',
+            messages.WARNING
+        )
+
 @admin.register(Especialidad)
 class EspecialidadAdmin(admin.ModelAdmin):
     list_display = ['nombre', 'activa', 'cantidad_doctores', 'fecha_creacion']
@@ -11,11 +22,18 @@ class EspecialidadAdmin(admin.ModelAdmin):
     search_fields = ['nombre', 'descripcion']
     ordering = ['nombre']
     
+    def get_queryset(self, request):
+        # Los doctores activos se cuentan en la misma consulta del listado
+        return super().get_queryset(request).annotate(
+            doctores_activos=Count('doctor', filter=Q(doctor__activo=True))
+        )
+    
     def cantidad_doctores(self, obj):
         """Muestra la cantidad de doctores activos en esta especialidad"""
-        count = obj.doctor_set.filter(activo=True).count()
+        count = obj.doctores_activos
         return f"{count} doctor{'es' if count != 1 else ''}"
     cantidad_doctores.short_description = 'Doctores Activos'
+    cantidad_doctores.admin_order_field = 'doctores_activos'
 
 class HorarioAtencionInline(admin.TabularInline):
     model = HorarioAtencion
@@ -42,6 +60,7 @@ class DoctorAdmin(admin.ModelAdmin):
         'numero_licencia', 'especialidad__nombre'
     ]
     ordering = ['usuario__first_name', 'usuario__last_name']
+    list_select_related = ['usuario', 'especialidad']
     
     fieldsets = (
         ('Información del Doctor', {
@@ -57,6 +76,12 @@ class DoctorAdmin(admin.ModelAdmin):
     
     inlines = [HorarioAtencionInline, ExcepcionHorarioInline]
     
+    def get_queryset(self, request):
+        # Los horarios activos se cuentan en la misma consulta del listado
+        return super().get_queryset(request).annotate(
+            horarios_activos=Count('horarios_atencion', filter=Q(horarios_atencion__activo=True))
+        )
+    
     def get_nombre_completo(self, obj):
         """Muestra el nombre completo del doctor"""
         return obj.get_nombre_completo()
@@ -65,7 +90,7 @@ class DoctorAdmin(admin.ModelAdmin):
     
     def tiene_horarios(self, obj):
         """Indica si el doctor tiene horarios configurados"""
-        count = obj.horarios_atencion.filter(activo=True).count()
+        count = obj.horarios_activos
         if count > 0:
             return format_html(
                 '<span style="color: green;">✓ {} día{}</span>',
@@ -75,6 +100,7 @@ class DoctorAdmin(admin.ModelAdmin):
         else:
             return format_html('<span style="color: red;">✗ Sin horarios</span>')
     tiene_horarios.short_description = 'Horarios Configurados'
+    tiene_horarios.admin_order_field = 'horarios_activos'
     
     def save_model(self, request, obj, form, change):
         """Personalizar el guardado para asegurar el tipo de usuario"""
@@ -82,6 +108,23 @@ class DoctorAdmin(admin.ModelAdmin):
             obj.usuario.tipo_usuario = 'doctor'
             obj.usuario.save()
         super().save_model(request, obj, form, change)
+    
+    def save_formset(self, request, form, formset, change):
+        """Las excepciones nuevas o modificadas en la línea también resuelven sus citas afectadas"""
+        if formset.model is not ExcepcionHorario:
+            return super().save_formset(request, form, formset, change)
+        
+        excepciones = formset.save(commit=False)
+        for excepcion in excepciones:
+            if excepcion.pk is None:
+                excepcion.creado_por = request.user
+            excepcion.save()
+        for excepcion in formset.deleted_objects:
+            excepcion.delete()
+        formset.save_m2m()
+        
+        if excepciones:
+            avisar_citas_afectadas(self, request, resolver_conflictos(excepciones))
 
 @admin.register(HorarioAtencion)
 class HorarioAtencionAdmin(admin.ModelAdmin):
@@ -92,6 +135,7 @@ class HorarioAtencionAdmin(admin.ModelAdmin):
     list_filter = ['dia_semana', 'activo', 'doctor__especialidad']
     search_fields = ['doctor__usuario__first_name', 'doctor__usuario__last_name']
     ordering = ['doctor', 'dia_semana', 'hora_inicio']
+    list_select_related = ['doctor__usuario', 'doctor__especialidad']
     
     fieldsets = (
         ('Doctor y Día', {
@@ -114,6 +158,7 @@ class ExcepcionHorarioAdmin(admin.ModelAdmin):
     list_filter = ['tipo_excepcion', 'todo_el_dia', 'notificado', 'fecha_inicio']
     search_fields = ['doctor__usuario__first_name', 'doctor__usuario__last_name', 'motivo']
     ordering = ['-fecha_inicio']
+    list_select_related = ['doctor__usuario', 'doctor__especialidad']
     
     fieldsets = (
         ('Doctor y Tipo', {
@@ -136,6 +181,14 @@ class ExcepcionHorarioAdmin(admin.ModelAdmin):
     
     readonly_fields = ['fecha_creacion']
     
+    def save_model(self, request, obj, form, change):
+        """Asignar el usuario que crea la excepción y resolver las citas afectadas"""
+        if not change:  # Solo en creación
+            obj.creado_por = request.user
+        super().save_model(request, obj, form, change)
+        # Las citas confirmadas dentro del intervalo quedan por reprogramar
+        avisar_citas_afectadas(self, request, resolver_conflictos([obj]))
+    
     def esta_activa_display(self, obj):
         """Muestra si la excepción está actualmente activa"""
         if obj.esta_activa():
@@ -143,9 +196,3 @@ class ExcepcionHorarioAdmin(admin.ModelAdmin):
         else:
             return format_html('<span style="color: green;">✓ Inactiva</span>')
     esta_activa_display.short_description = 'Estado Actual'
-    
-    def save_model(self, request, obj, form, change):
-        """Asignar el usuario que crea la excepción"""
-        if not change:  # Solo en creación
-            obj.creado_por = request.user
-        super().save_model(request, obj, form, change)
@@ -0,0 +1,126 @@
+"""
+API REST de solo lectura para doctores, especialidades, horarios y excepciones
+
+Todas las listas usan paginación por cursor (ver paginacion.py), declarada
+en cada viewset para no cambiar la paginación por defecto del resto de la
+API. El email y la licencia de los doctores y el motivo de las excepciones
+solo se muestran al personal y al propio doctor (ver serializers.py). Los
+filtros disponibles por parámetros GET son:
+
+- doctores: especialidad, activo
+- especialidades: activa
+- horarios: doctor, dia_semana, activo
+- excepciones: doctor, desde, hasta (fechas AAAA-MM-DD)
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils.dateparse import parse_date
+from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
+
+from .disponibilidad import inicio_del_dia
+from .models import Doctor, Especialidad, HorarioAtencion, ExcepcionHorario
+from .paginacion import PaginacionCursor, PaginacionEspecialidades, PaginacionExcepciones
+from .serializers import (
+    DoctorSerializer, EspecialidadSerializer, HorarioAtencionSerializer, ExcepcionHorarioSerializer
+)
+
+
+def parametro_booleano(request, nombre):
+    """Retorna True/False para 'true'/'false', o None si el parámetro no vino"""
+    valor = request.query_params.get(nombre)
+    if valor is None or valor == '':
+        return None
+    if valor.lower() not in ('true', 'false'):
+        raise ValidationError({nombre: 'Debe ser true o false.'})
+    return valor.lower() == 'true'
+
+
+def parametro_entero(request, nombre):
+    valor = request.query_params.get(nombre)
+    if valor is None or valor == '':
+        return None
+    try:
+        return int(valor)
+    except ValueError:
+        raise ValidationError({nombre: 'Debe ser un número entero.'})
+
+
+def parametro_fecha(request, nombre):
+    valor = request.query_params.get(nombre)
+    if valor is None or valor == '':
+        return None
+    try:
+        fecha = parse_date(valor)
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise ValidationError({nombre: 'Debe ser una fecha con formato AAAA-MM-DD.'})
+    return fecha
+
+
+class EspecialidadViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = EspecialidadSerializer
+    pagination_class = PaginacionEspecialidades
+
+    def get_queryset(self):
+        especialidades = Especialidad.objects.annotate(
+            cantidad_doctores=Count('doctor', filter=Q(doctor__activo=True))
+        )
+        activa = parametro_booleano(self.request, 'activa')
+        if activa is not None:
+            especialidades = especialidades.filter(activa=activa)
+        return especialidades
+
+
+class DoctorViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = DoctorSerializer
+    pagination_class = PaginacionCursor
+
+    def get_queryset(self):
+        doctores = Doctor.objects.select_related('usuario', 'especialidad')
+        especialidad = parametro_entero(self.request, 'especialidad')
+        if especialidad is not None:
+            doctores = doctores.filter(especialidad_id=especialidad)
+        activo = parametro_booleano(self.request, 'activo')
+        if activo is not None:
+            doctores = doctores.filter(activo=activo)
+        return doctores
+
+
+class HorarioAtencionViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = HorarioAtencionSerializer
+    pagination_class = PaginacionCursor
+
+    def get_queryset(self):
+        horarios = HorarioAtencion.objects.all()
+        doctor = parametro_entero(self.request, 'doctor')
+        if doctor is not None:
+            horarios = horarios.filter(doctor_id=doctor)
+        dia_semana = parametro_entero(self.request, 'dia_semana')
+        if dia_semana is not None:
+            horarios = horarios.filter(dia_semana=dia_semana)
+        activo = parametro_booleano(self.request, 'activo')
+        if activo is not None:
+            horarios = horarios.filter(activo=activo)
+        return horarios
+
+
+class ExcepcionHorarioViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = ExcepcionHorarioSerializer
+    pagination_class = PaginacionExcepciones
+
+    def get_queryset(self):
+        excepciones = ExcepcionHorario.objects.all()
+        doctor = parametro_entero(self.request, 'doctor')
+        if doctor is not None:
+            excepciones = excepciones.filter(doctor_id=doctor)
+        # Excepciones que se cruzan con la ventana [desde, hasta]
+        desde = parametro_fecha(self.request, 'desde')
+        if desde:
+            excepciones = excepciones.filter(fecha_fin__gt=inicio_del_dia(desde))
+        hasta = parametro_fecha(self.request, 'hasta')
+        if hasta:
+            excepciones = excepciones.filter(fecha_inicio__lt=inicio_del_dia(hasta + timedelta(days=1)))
+        return excepciones
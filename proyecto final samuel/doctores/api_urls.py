@@ -0,0 +1,14 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from . import api
+
+router = DefaultRouter()
+router.register('especialidades', api.EspecialidadViewSet, basename='especialidad')
+router.register('doctores', api.DoctorViewSet, basename='doctor')
+router.register('horarios', api.HorarioAtencionViewSet, basename='horario')
+router.register('excepciones', api.ExcepcionHorarioViewSet, basename='excepcion')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
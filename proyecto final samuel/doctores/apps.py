@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class DoctoresConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'doctores'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .busqueda import restaurar_triggers
+        post_migrate.connect(restaurar_triggers, sender=self)
@@ -0,0 +1,187 @@
+"""
+Búsqueda de doctores por nombre, especialidad y consultorio y, para el
+personal, también por email y licencia
+
+Cada doctor guarda esos datos en dos campos desnormalizados: el documento
+público (Doctor.documento_busqueda: nombre, especialidad y consultorio) y
+el privado (Doctor.documento_privado: email y licencia). Se recalculan al
+guardar el doctor, su usuario o su especialidad (ver signals.py). El
+directorio público solo busca en el documento público; así una búsqueda
+anónima no sirve para confirmar el email o la licencia de un doctor.
+
+- SQLite: tabla FTS5 `doctores_doctor_fts` de contenido externo con una
+  columna por documento, mantenida por triggers (migración 0006). Cada
+  palabra buscada es un prefijo, sin distinguir mayúsculas ni tildes, y los
+  resultados se ordenan por bm25.
+- PostgreSQL: índices GIN sobre to_tsvector('simple', ...) del documento
+  público y de los dos documentos juntos, con consulta de prefijos y orden
+  por ts_rank.
+- Otros motores, o SQLite sin FTS5: icontains por palabra, sin ranking.
+
+En todos los casos la búsqueda es un filtro (y un orden) sobre el queryset
+recibido, de modo que filtros, select_related y paginación se resuelven en
+la misma consulta.
+"""
+import re
+
+from django.db import connection, connections
+from django.db.models import Q
+
+TABLA_FTS = 'doctores_doctor_fts'
+
+_tablas_fts = {}
+
+
+CAMPOS_DOCUMENTOS = ['documento_busqueda', 'documento_privado']
+
+TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS doctores_doctor_fts_ai AFTER INSERT ON doctores_doctor BEGIN
+        INSERT INTO doctores_doctor_fts(rowid, documento_busqueda, documento_privado)
+        VALUES (new.id, new.documento_busqueda, new.documento_privado);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS doctores_doctor_fts_ad AFTER DELETE ON doctores_doctor BEGIN
+        INSERT INTO doctores_doctor_fts(doctores_doctor_fts, rowid, documento_busqueda, documento_privado)
+        VALUES ('delete', old.id, old.documento_busqueda, old.documento_privado);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS doctores_doctor_fts_au AFTER UPDATE OF documento_busqueda, documento_privado
+    ON doctores_doctor BEGIN
+        INSERT INTO doctores_doctor_fts(doctores_doctor_fts, rowid, documento_busqueda, documento_privado)
+        VALUES ('delete', old.id, old.documento_busqueda, old.documento_privado);
+        INSERT INTO doctores_doctor_fts(rowid, documento_busqueda, documento_privado)
+        VALUES (new.id, new.documento_busqueda, new.documento_privado);
+    END
+    """,
+]
+
+
+def _unir(partes):
+    return ' '.join(parte for parte in partes if parte)
+
+
+def documento_doctor(doctor):
+    """Texto público indexado del doctor; requiere usuario y especialidad cargados"""
+    return _unir([
+        doctor.usuario.first_name,
+        doctor.usuario.last_name,
+        doctor.especialidad.nombre,
+        doctor.consultorio,
+    ])
+
+
+def documento_privado(doctor):
+    """Texto indexado que solo busca el personal; requiere el usuario cargado"""
+    return _unir([doctor.usuario.email, doctor.numero_licencia])
+
+
+def asignar_documentos(doctor):
+    """Recalcula los dos documentos del doctor; indica si alguno cambió"""
+    documentos = {
+        'documento_busqueda': documento_doctor(doctor),
+        'documento_privado': documento_privado(doctor),
+    }
+    cambio = any(getattr(doctor, campo) != valor for campo, valor in documentos.items())
+    for campo, valor in documentos.items():
+        setattr(doctor, campo, valor)
+    return cambio
+
+
+def actualizar_documentos(doctores):
+    """Recalcula los documentos de búsqueda de los doctores del queryset"""
+    modificados = [
+        doctor for doctor in doctores.select_related('usuario', 'especialidad')
+        if asignar_documentos(doctor)
+    ]
+    doctores.model.objects.bulk_update(modificados, CAMPOS_DOCUMENTOS, batch_size=500)
+    return len(modificados)
+
+
+def fts_disponible():
+    """Indica si la base de datos actual tiene la tabla FTS5 de doctores"""
+    if connection.vendor != 'sqlite':
+        return False
+    clave = (connection.alias, str(connection.settings_dict['NAME']))
+    if clave not in _tablas_fts:
+        _tablas_fts[clave] = _tiene_tabla_fts(connection)
+    return _tablas_fts[clave]
+
+
+def _tiene_tabla_fts(conexion):
+    with conexion.cursor() as cursor:
+        return TABLA_FTS in conexion.introspection.table_names(cursor)
+
+
+def restaurar_triggers(using='default', **kwargs):
+    """
+    Receptor de post_migrate: SQLite borra los triggers de sincronización
+    cuando una migración reconstruye doctores_doctor. Los vuelve a crear y,
+    como los cambios hechos sin ellos no llegaron al índice, lo reconstruye.
+    """
+    conexion = connections[using]
+    if conexion.vendor != 'sqlite' or not _tiene_tabla_fts(conexion):
+        return
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'doctores_doctor' "
+            "AND name LIKE 'doctores_doctor_fts_%'"
+        )
+        if cursor.fetchone()[0] == len(TRIGGERS):
+            return
+        for sentencia in TRIGGERS:
+            cursor.execute(sentencia)
+        cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+
+
+def palabras_busqueda(texto):
+    return re.findall(r'\w+', texto.lower())
+
+
+def buscar_doctores(doctores, texto, incluir_privados=False):
+    """
+    Filtra el queryset por el texto buscado y lo ordena por relevancia.
+    Con `incluir_privados` también busca por email y licencia (solo para el
+    personal). Retorna el queryset sin cambios si el texto está vacío.
+    """
+    palabras = palabras_busqueda(texto)
+    if not palabras:
+        return doctores if not texto.strip() else doctores.none()
+
+    if fts_disponible():
+        consulta = ' AND '.join(f'"{palabra}"*' for palabra in palabras)
+        if not incluir_privados:
+            consulta = f'documento_busqueda : ({consulta})'
+        # Un solo join con la tabla FTS5: el MATCH filtra y rank (bm25, más
+        # negativo = más relevante) sale de la misma fila del índice
+        tabla = doctores.model._meta.db_table
+        return doctores.extra(
+            tables=[TABLA_FTS],
+            where=[f'{TABLA_FTS}.rowid = {tabla}.id', f'{TABLA_FTS} MATCH %s'],
+            params=[consulta],
+            select={'relevancia': f'{TABLA_FTS}.rank'},
+        ).order_by('relevancia', 'id')
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        vector = SearchVector(*(CAMPOS_DOCUMENTOS if incluir_privados else CAMPOS_DOCUMENTOS[:1]), config='simple')
+        consulta = SearchQuery(
+            ' & '.join(f'{palabra}:*' for palabra in palabras),
+            config='simple',
+            search_type='raw'
+        )
+        return doctores.annotate(
+            vector_busqueda=vector,
+            relevancia=SearchRank(vector, consulta)
+        ).filter(vector_busqueda=consulta).order_by('-relevancia', 'id')
+
+    filtro = Q()
+    for palabra in palabras:
+        coincidencia = Q(documento_busqueda__icontains=palabra)
+        if incluir_privados:
+            coincidencia |= Q(documento_privado__icontains=palabra)
+        filtro &= coincidencia
+    return doctores.filter(filtro)
@@ -0,0 +1,125 @@
+"""
+Caché de disponibilidad por doctor y fecha
+
+Cada entrada se guarda bajo la clave (doctor, versión, fecha). La versión de
+un doctor cambia cada vez que se modifican sus horarios, excepciones o citas,
+de modo que las entradas viejas nunca vuelven a leerse y expiran solas; no hay
+que recorrer ni borrar nada. Funciona con cualquier backend de Django que
+soporte get_many/set_many, pero como las versiones se guardan en la misma
+caché, con varios procesos el backend debe ser compartido (archivos,
+memcached, redis); con memoria local cada proceso solo vería sus propias
+invalidaciones.
+
+Los aciertos y fallos se cuentan en el registro de métricas del proceso
+(metricas.cache_disponibilidad), sin escribir en la caché en cada lectura;
+con METRICAS_DIRECTORIO estadisticas() suma los de todos los procesos.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from agenda_medica import metricas
+
+PREFIJO = 'disponibilidad'
+CLAVE_REINICIO = f'{PREFIJO}:reinicio'
+
+
+def obtener_cache():
+    """Backend configurado para la disponibilidad (DISPONIBILIDAD_CACHE)"""
+    return caches[getattr(settings, 'DISPONIBILIDAD_CACHE', 'default')]
+
+
+def _clave_version(doctor_id):
+    return f'{PREFIJO}:version:{doctor_id}'
+
+
+def clave_franjas(doctor_id, version, fecha):
+    return f'{PREFIJO}:{doctor_id}:{version}:{fecha.isoformat()}'
+
+
+def _nueva_version():
+    # Un valor nuevo (y no version + 1) garantiza que una versión que fue
+    # desalojada de la caché nunca coincida con entradas anteriores.
+    return time.time_ns()
+
+
+def obtener_versiones(doctor_ids):
+    """Retorna {doctor_id: versión}, inicializando las que no existan"""
+    cache = obtener_cache()
+    claves = {_clave_version(doctor_id): doctor_id for doctor_id in doctor_ids}
+    encontradas = cache.get_many(claves.keys())
+
+    versiones = {}
+    for clave, doctor_id in claves.items():
+        version = encontradas.get(clave)
+        if version is None:
+            version = _nueva_version()
+            if not cache.add(clave, version, timeout=None):
+                version = cache.get(clave, version)
+        versiones[doctor_id] = version
+    return versiones
+
+
+def invalidar_doctor(doctor_id):
+    """Cambia la versión del doctor; las entradas previas quedan inaccesibles"""
+    obtener_cache().set(_clave_version(doctor_id), _nueva_version(), timeout=None)
+
+
+def invalidar_doctor_al_confirmar(doctor_id):
+    """
+    Invalida cuando la transacción actual se confirme, para que ninguna
+    lectura concurrente guarde datos previos al cambio bajo la nueva versión.
+    """
+    transaction.on_commit(lambda: invalidar_doctor(doctor_id))
+
+
+def leer(doctor_ids, fechas, versiones):
+    """Retorna {(doctor_id, fecha): franjas} con las entradas presentes en caché"""
+    claves = {
+        clave_franjas(doctor_id, versiones[doctor_id], fecha): (doctor_id, fecha)
+        for doctor_id in doctor_ids
+        for fecha in fechas
+    }
+    encontradas = obtener_cache().get_many(claves.keys())
+    metricas.cache_disponibilidad.inc(len(encontradas), resultado='acierto')
+    metricas.cache_disponibilidad.inc(len(claves) - len(encontradas), resultado='fallo')
+    return {claves[clave]: franjas for clave, franjas in encontradas.items()}
+
+
+def guardar(entradas, versiones):
+    """Guarda {(doctor_id, fecha): franjas} bajo la versión vigente de cada doctor"""
+    if not entradas:
+        return
+    obtener_cache().set_many({
+        clave_franjas(doctor_id, versiones[doctor_id], fecha): franjas
+        for (doctor_id, fecha), franjas in entradas.items()
+    }, timeout=getattr(settings, 'DISPONIBILIDAD_CACHE_TIMEOUT', 3600))
+
+
+def _conteos():
+    """(aciertos, fallos) acumulados por los contadores de métricas"""
+    valores = metricas.registro.estado_combinado().get(metricas.cache_disponibilidad.nombre, {})
+    return valores.get(('acierto',), 0), valores.get(('fallo',), 0)
+
+
+def estadisticas():
+    """Contadores de aciertos y fallos para dimensionar la caché"""
+    aciertos, fallos = _conteos()
+    # Los contadores solo crecen: el reinicio guarda los valores de ese momento.
+    # Si quedaron por encima de los actuales, los procesos se reiniciaron después.
+    reinicio = obtener_cache().get(CLAVE_REINICIO)
+    if reinicio and reinicio[0] <= aciertos and reinicio[1] <= fallos:
+        aciertos -= reinicio[0]
+        fallos -= reinicio[1]
+    total = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'tasa_aciertos': round(aciertos / total, 4) if total else None,
+    }
+
+
+def reiniciar_estadisticas():
+    obtener_cache().set(CLAVE_REINICIO, _conteos(), timeout=None)
@@ -0,0 +1,239 @@
+"""
+Calendario iCalendar (RFC 5545) con la agenda de cada doctor
+
+Cada doctor tiene una URL privada con un token firmado que incluye su clave
+de calendario (Doctor.clave_calendario); cambiar la clave revoca la URL
+anterior. El calendario incluye los horarios de atención como eventos
+semanales recurrentes en la zona horaria del proyecto (con su VTIMEZONE),
+las excepciones y las citas vigentes dentro del horizonte, y se genera
+línea a línea para no construir el documento completo en memoria.
+
+Los clientes de calendario consultan la URL con frecuencia; la ETag y el
+Last-Modified se derivan de Doctor.agenda_actualizada (que las señales
+actualizan en cada cambio de horarios, excepciones o citas) y del día
+actual, porque el horizonte del calendario avanza con él. La ETag usa
+microsegundos para distinguir cambios dentro del mismo segundo.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from citas.models import Cita
+
+from .disponibilidad import inicio_del_dia
+from .models import Doctor, HorarioAtencion, ExcepcionHorario, generar_clave_calendario
+
+SAL_TOKEN = 'doctores.calendario_ical'
+DIAS_ICAL = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+FORMATO_UTC = '%Y%m%dT%H%M%SZ'
+FORMATO_LOCAL = '%Y%m%dT%H%M%S'
+
+
+def token_doctor(doctor):
+    """Token firmado de la URL privada del calendario del doctor"""
+    return signing.Signer(salt=SAL_TOKEN).sign(f'{doctor.pk}.{doctor.clave_calendario}')
+
+
+def datos_desde_token(token):
+    """Retorna (doctor_id, clave_calendario) del token, o None si la firma no es válida"""
+    try:
+        doctor_id, clave = signing.Signer(salt=SAL_TOKEN).unsign(token).split('.', 1)
+        return int(doctor_id), clave
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+def rotar_clave(doctor):
+    """Cambia la clave del calendario del doctor; la URL anterior deja de funcionar"""
+    doctor.clave_calendario = generar_clave_calendario()
+    Doctor.objects.filter(pk=doctor.pk).update(clave_calendario=doctor.clave_calendario)
+
+
+def marcar_agenda_actualizada(doctor_id):
+    """Registra que la agenda del doctor cambió (se usa como Last-Modified del calendario)"""
+    Doctor.objects.filter(pk=doctor_id).update(agenda_actualizada=timezone.now())
+
+
+def ultima_modificacion(doctor):
+    """
+    Momento del último cambio que afecta el calendario del doctor. El inicio
+    del día actual cuenta como cambio porque el horizonte se desplaza a diario.
+    """
+    cambio = doctor.agenda_actualizada or doctor.fecha_actualizacion
+    return max(cambio, inicio_del_dia(timezone.localdate()))
+
+
+def etiqueta_calendario(doctor, ultima):
+    """Valor de la ETag del calendario; cambia junto con ultima_modificacion"""
+    return f'doctor-{doctor.pk}-{int(ultima.timestamp() * 1000000)}'
+
+
+def horizonte():
+    """Rango de fechas (desde, hasta) que cubre el calendario"""
+    hoy = timezone.localdate()
+    return (
+        hoy - timedelta(days=getattr(settings, 'CALENDARIO_ICAL_DIAS_ATRAS', 30)),
+        hoy + timedelta(days=getattr(settings, 'CALENDARIO_ICAL_DIAS_ADELANTE', 90)),
+    )
+
+
+def _escapar(texto):
+    return (
+        str(texto).replace('\\', '\\\\').replace(';', '\\;')
+        .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _plegar(linea):
+    """Divide la línea en segmentos de máximo 75 octetos (RFC 5545, 3.1)"""
+    partes, actual, tamano = [], '', 0
+    for caracter in linea:
+        octetos = len(caracter.encode('utf-8'))
+        if tamano + octetos > 75:
+            partes.append(actual)
+            actual, tamano = ' ', 1
+        actual += caracter
+        tamano += octetos
+    partes.append(actual)
+    return '\r\n'.join(partes) + '\r\n'
+
+
+def _utc(momento):
+    return momento.astimezone(dt_timezone.utc).strftime(FORMATO_UTC)
+
+
+def _desfase(delta):
+    """Desfase UTC en formato iCalendar: -0500, +0100"""
+    minutos = int(delta.total_seconds()) // 60
+    signo = '-' if minutos < 0 else '+'
+    return f'{signo}{abs(minutos) // 60:02d}{abs(minutos) % 60:02d}'
+
+
+def _cambios_de_desfase(zona, desde, hasta):
+    """
+    Retorna [(inicio_utc, desfase_anterior, momento_local)] con el primer
+    instante del rango y cada cambio de desfase UTC dentro de él.
+    """
+    inicio = datetime.combine(desde, time(), tzinfo=zona).astimezone(dt_timezone.utc)
+    fin = datetime.combine(hasta + timedelta(days=1), time(), tzinfo=zona).astimezone(dt_timezone.utc)
+    actual = inicio.astimezone(zona)
+    cambios = [(inicio, actual.utcoffset(), actual)]
+
+    # Los cambios de horario ocurren en horas exactas: se buscan día a día
+    # y se ubica la hora dentro del día
+    dia = inicio
+    while dia < fin:
+        siguiente = dia + timedelta(days=1)
+        if siguiente.astimezone(zona).utcoffset() != dia.astimezone(zona).utcoffset():
+            hora = dia
+            while hora.astimezone(zona).utcoffset() == dia.astimezone(zona).utcoffset():
+                hora += timedelta(hours=1)
+            cambios.append((hora, dia.astimezone(zona).utcoffset(), hora.astimezone(zona)))
+        dia = siguiente
+    return cambios
+
+
+def _vtimezone(desde, hasta):
+    """
+    Componente VTIMEZONE (RFC 5545, 3.6.5) de la zona del proyecto, con una
+    observancia por cada desfase UTC vigente dentro del horizonte
+    """
+    zona = timezone.get_default_timezone()
+    yield _plegar('BEGIN:VTIMEZONE')
+    yield _plegar(f'TZID:{settings.TIME_ZONE}')
+    for inicio, desfase_anterior, local in _cambios_de_desfase(zona, desde, hasta):
+        tipo = 'DAYLIGHT' if local.dst() else 'STANDARD'
+        yield _plegar(f'BEGIN:{tipo}')
+        # DTSTART va en la hora local previa al cambio
+        yield _plegar(f'DTSTART:{(inicio + desfase_anterior).strftime(FORMATO_LOCAL)}')
+        yield _plegar(f'TZOFFSETFROM:{_desfase(desfase_anterior)}')
+        yield _plegar(f'TZOFFSETTO:{_desfase(local.utcoffset())}')
+        yield _plegar(f'TZNAME:{_escapar(local.tzname())}')
+        yield _plegar(f'END:{tipo}')
+    yield _plegar('END:VTIMEZONE')
+
+
+def _evento(uid, marca, propiedades):
+    yield _plegar('BEGIN:VEVENT')
+    yield _plegar(f'UID:{uid}')
+    yield _plegar(f'DTSTAMP:{marca}')
+    for propiedad in propiedades:
+        yield _plegar(propiedad)
+    yield _plegar('END:VEVENT')
+
+
+def _eventos_horarios(doctor, desde, hasta, marca):
+    zona = settings.TIME_ZONE
+    horarios = HorarioAtencion.objects.filter(doctor=doctor, activo=True).order_by('dia_semana')
+    for horario in horarios:
+        # Primera fecha del horizonte que cae en el día de la semana del horario
+        primera = desde + timedelta(days=(horario.dia_semana - desde.weekday()) % 7)
+        if primera > hasta:
+            continue
+        inicio = datetime.combine(primera, horario.hora_inicio)
+        fin = datetime.combine(primera, horario.hora_fin)
+        yield from _evento(f'horario-{horario.pk}@agenda-medica', marca, [
+            f'SUMMARY:{_escapar("Horario de atención")}',
+            f'DTSTART;TZID={zona}:{inicio.strftime(FORMATO_LOCAL)}',
+            f'DTEND;TZID={zona}:{fin.strftime(FORMATO_LOCAL)}',
+            f'RRULE:FREQ=WEEKLY;BYDAY={DIAS_ICAL[horario.dia_semana]};'
+            f'UNTIL={_utc(inicio_del_dia(hasta + timedelta(days=1)))}',
+            'TRANSP:TRANSPARENT',
+        ])
+
+
+def _eventos_excepciones(doctor, desde, hasta, marca):
+    excepciones = ExcepcionHorario.objects.filter(
+        doctor=doctor,
+        fecha_inicio__lt=inicio_del_dia(hasta + timedelta(days=1)),
+        fecha_fin__gt=inicio_del_dia(desde)
+    ).order_by('fecha_inicio')
+    for excepcion in excepciones.iterator():
+        yield from _evento(f'excepcion-{excepcion.pk}@agenda-medica', marca, [
+            f'SUMMARY:{_escapar(f"No disponible: {excepcion.get_tipo_excepcion_display()}")}',
+            f'DESCRIPTION:{_escapar(excepcion.motivo)}',
+            f'DTSTART:{_utc(excepcion.fecha_inicio)}',
+            f'DTEND:{_utc(excepcion.fecha_fin)}',
+            'TRANSP:OPAQUE',
+        ])
+
+
+def _eventos_citas(doctor, desde, hasta, marca):
+    citas = Cita.objects.filter(
+        doctor=doctor,
+        fecha_hora_inicio__gte=inicio_del_dia(desde),
+        fecha_hora_inicio__lt=inicio_del_dia(hasta + timedelta(days=1))
+    ).exclude(
+        estado__in=Cita.ESTADOS_LIBERADOS
+    ).order_by('fecha_hora_inicio').values_list(
+        'codigo', 'fecha_hora_inicio', 'fecha_hora_fin', 'motivo',
+        'paciente__first_name', 'paciente__last_name'
+    )
+    for codigo, inicio, fin, motivo, nombre, apellido in citas.iterator(chunk_size=500):
+        yield from _evento(f'cita-{codigo}@agenda-medica', marca, [
+            f'SUMMARY:{_escapar(f"Cita: {nombre} {apellido}".strip())}',
+            f'DESCRIPTION:{_escapar(motivo)}',
+            f'DTSTART:{_utc(inicio)}',
+            f'DTEND:{_utc(fin)}',
+            'STATUS:CONFIRMED',
+        ])
+
+
+def generar_calendario(doctor, ultima):
+    """Genera las líneas del calendario iCalendar del doctor"""
+    desde, hasta = horizonte()
+    marca = _utc(ultima)
+
+    yield _plegar('BEGIN:VCALENDAR')
+    yield _plegar('VERSION:2.0')
+    yield _plegar('PRODID:-//AgendaMedica//Agenda del doctor//ES')
+    yield _plegar('CALSCALE:GREGORIAN')
+    yield _plegar(f'X-WR-CALNAME:{_escapar(f"Agenda Dr. {doctor.get_nombre_completo()}")}')
+    yield _plegar(f'X-WR-TIMEZONE:{settings.TIME_ZONE}')
+    yield from _vtimezone(desde, hasta)
+    yield from _eventos_horarios(doctor, desde, hasta, marca)
+    yield from _eventos_excepciones(doctor, desde, hasta, marca)
+    yield from _eventos_citas(doctor, desde, hasta, marca)
+    yield _plegar('END:VCALENDAR')
@@ -0,0 +1,419 @@
+"""
+Motor de disponibilidad de doctores (HU0001, HU0012)
+
+Carga en bloque los horarios y las excepciones de un conjunto de doctores
+para todo el rango de fechas solicitado y calcula las franjas en memoria,
+de modo que el número de consultas no depende de la amplitud del rango ni
+de la cantidad de franjas generadas. Dentro del horizonte materializado
+(ver materializacion.py) las franjas se leen directamente de FranjaHoraria,
+y todo el resultado pasa por una caché versionada por doctor
+(ver cache_disponibilidad.py).
+"""
+import heapq
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from agenda_medica import metricas
+from citas.models import Cita, ReservaTemporal
+
+from . import cache_disponibilidad
+from .models import Doctor, HorarioAtencion, ExcepcionHorario, FranjaHoraria
+
+ESTADO_DISPONIBLE = 'disponible'
+ESTADO_OCUPADO = 'ocupado'
+ESTADO_NO_DISPONIBLE = 'no_disponible'
+ESTADO_RESERVADO = 'reservado'
+
+
+def rango_fechas(fecha_inicio, fecha_fin):
+    """Itera los días entre fecha_inicio y fecha_fin (ambos incluidos)"""
+    fecha = fecha_inicio
+    while fecha <= fecha_fin:
+        yield fecha
+        fecha += timedelta(days=1)
+
+
+def inicio_del_dia(fecha):
+    """Retorna el primer instante (con zona horaria) de la fecha indicada"""
+    return timezone.make_aware(datetime.combine(fecha, datetime.min.time()))
+
+
+def _fusionar_intervalos(intervalos):
+    """
+    Ordena y fusiona intervalos [inicio, fin) solapados.
+    Retorna dos listas paralelas (inicios, fines) ordenadas y disjuntas.
+    """
+    inicios, fines = [], []
+    for inicio, fin in sorted(intervalos):
+        if fines and inicio <= fines[-1]:
+            fines[-1] = max(fines[-1], fin)
+        else:
+            inicios.append(inicio)
+            fines.append(fin)
+    return inicios, fines
+
+
+def _hay_solapamiento(inicios, fines, inicio, fin):
+    """Indica si [inicio, fin) se cruza con alguno de los intervalos fusionados"""
+    posicion = bisect_right(fines, inicio)
+    return posicion < len(inicios) and inicios[posicion] < fin
+
+
+def cargar_horarios(doctor_ids):
+    """Horarios activos de los doctores indexados por (doctor_id, dia_semana)"""
+    horarios = HorarioAtencion.objects.filter(
+        doctor_id__in=doctor_ids,
+        activo=True
+    ).only('doctor_id', 'dia_semana', 'hora_inicio', 'hora_fin', 'duracion_cita')
+    return {(h.doctor_id, h.dia_semana): h for h in horarios}
+
+
+def cargar_excepciones(doctor_ids, desde, hasta):
+    """
+    Excepciones que se cruzan con [desde, hasta), fusionadas por doctor.
+    Retorna {doctor_id: (inicios, fines)}.
+    """
+    intervalos = defaultdict(list)
+    excepciones = ExcepcionHorario.objects.filter(
+        doctor_id__in=doctor_ids,
+        fecha_inicio__lt=hasta,
+        fecha_fin__gt=desde
+    ).values_list('doctor_id', 'fecha_inicio', 'fecha_fin')
+    for doctor_id, inicio, fin in excepciones:
+        intervalos[doctor_id].append((inicio, fin))
+    return {
+        doctor_id: _fusionar_intervalos(lista)
+        for doctor_id, lista in intervalos.items()
+    }
+
+
+def cargar_citas(doctor_ids, desde, hasta):
+    """
+    Citas vigentes que se cruzan con [desde, hasta), con el paciente en la
+    misma consulta. Retorna {doctor_id: [(inicio, fin, paciente)]} ordenado.
+    """
+    citas = defaultdict(list)
+    filas = Cita.objects.filter(
+        doctor_id__in=doctor_ids,
+        fecha_hora_inicio__lt=hasta,
+        fecha_hora_fin__gt=desde
+    ).exclude(
+        estado__in=Cita.ESTADOS_LIBERADOS
+    ).order_by('fecha_hora_inicio').values_list(
+        'doctor_id', 'fecha_hora_inicio', 'fecha_hora_fin',
+        'paciente__first_name', 'paciente__last_name'
+    )
+    for doctor_id, inicio, fin, nombre, apellido in filas:
+        citas[doctor_id].append((inicio, fin, f"{nombre} {apellido}".strip()))
+    return citas
+
+
+def marcar_citas(disponibilidad, citas):
+    """Marca como ocupadas las franjas que se cruzan con alguna cita"""
+    for doctor_id, citas_doctor in citas.items():
+        fines = [fin for _, fin, _ in citas_doctor]
+        for franjas in disponibilidad.get(doctor_id, {}).values():
+            for franja in franjas:
+                posicion = bisect_right(fines, franja['inicio'])
+                if posicion < len(citas_doctor) and citas_doctor[posicion][0] < franja['fin']:
+                    franja['estado'] = ESTADO_OCUPADO
+                    franja['paciente'] = citas_doctor[posicion][2]
+    return disponibilidad
+
+
+def cargar_reservas(doctor_ids, desde, hasta, excluir_titular=None):
+    """
+    Conjunto de (doctor_id, inicio) con una reserva temporal vigente en
+    [desde, hasta). Una sola lectura sobre el índice único (doctor, inicio);
+    las reservas vencidas simplemente no se leen.
+    """
+    reservas = ReservaTemporal.objects.filter(
+        doctor_id__in=doctor_ids,
+        fecha_hora_inicio__gte=desde,
+        fecha_hora_inicio__lt=hasta,
+        expira__gt=timezone.now()
+    )
+    if excluir_titular is not None:
+        reservas = reservas.exclude(titular=excluir_titular)
+    return set(reservas.values_list('doctor_id', 'fecha_hora_inicio'))
+
+
+def marcar_reservas(disponibilidad, reservas):
+    """Marca como reservadas las franjas disponibles retenidas por otro paciente"""
+    if not reservas:
+        return disponibilidad
+    for doctor_id, fechas in disponibilidad.items():
+        for franjas in fechas.values():
+            for franja in franjas:
+                if franja['estado'] == ESTADO_DISPONIBLE and (doctor_id, franja['inicio']) in reservas:
+                    franja['estado'] = ESTADO_RESERVADO
+    return disponibilidad
+
+
+def generar_franjas_horario(horario, fecha, bloqueos=None):
+    """
+    Genera en memoria las franjas de un horario para una fecha.
+    `bloqueos` es el par (inicios, fines) de excepciones fusionadas del doctor.
+    """
+    franjas = []
+    duracion = timedelta(minutes=horario.duracion_cita)
+    hora_actual = timezone.make_aware(datetime.combine(fecha, horario.hora_inicio))
+    hora_fin = timezone.make_aware(datetime.combine(fecha, horario.hora_fin))
+
+    while hora_actual < hora_fin:
+        fin_franja = hora_actual + duracion
+        hay_excepcion = bool(bloqueos) and _hay_solapamiento(
+            bloqueos[0], bloqueos[1], hora_actual, fin_franja
+        )
+
+        franjas.append({
+            'hora': timezone.localtime(hora_actual).time(),
+            'inicio': hora_actual,
+            'fin': fin_franja,
+            'estado': ESTADO_NO_DISPONIBLE if hay_excepcion else ESTADO_DISPONIBLE,
+            'paciente': None,
+        })
+
+        hora_actual = fin_franja
+
+    return franjas
+
+
+def calcular_disponibilidad(doctor_ids, fecha_inicio, fecha_fin):
+    """
+    Calcula desde cero las franjas de cada doctor para cada día del rango.
+
+    Realiza una consulta para los horarios y otra para las excepciones,
+    sin importar cuántos doctores o días abarque el rango.
+    Retorna {doctor_id: {fecha: [franjas]}}; los días sin horario no aparecen.
+    """
+    resultado = {doctor_id: {} for doctor_id in doctor_ids}
+    if not doctor_ids or fecha_inicio > fecha_fin:
+        return resultado
+
+    horarios = cargar_horarios(doctor_ids)
+    if not horarios:
+        return resultado
+
+    excepciones = cargar_excepciones(
+        doctor_ids,
+        inicio_del_dia(fecha_inicio),
+        inicio_del_dia(fecha_fin + timedelta(days=1))
+    )
+
+    generadas = 0
+    for fecha in rango_fechas(fecha_inicio, fecha_fin):
+        dia_semana = fecha.weekday()  # 0=Lunes, 6=Domingo
+        for doctor_id in doctor_ids:
+            horario = horarios.get((doctor_id, dia_semana))
+            if horario is None:
+                continue
+            resultado[doctor_id][fecha] = generar_franjas_horario(
+                horario, fecha, excepciones.get(doctor_id)
+            )
+            generadas += len(resultado[doctor_id][fecha])
+
+    metricas.franjas_calculadas.inc(generadas)
+    return resultado
+
+
+def leer_franjas_materializadas(doctor_ids, fecha_inicio, fecha_fin):
+    """
+    Lee las franjas precalculadas con un único recorrido del índice
+    (doctor, fecha). Retorna la misma estructura que calcular_disponibilidad.
+    """
+    resultado = {doctor_id: {} for doctor_id in doctor_ids}
+    if not doctor_ids:
+        return resultado
+
+    franjas = FranjaHoraria.objects.filter(
+        doctor_id__in=doctor_ids,
+        fecha__gte=fecha_inicio,
+        fecha__lte=fecha_fin
+    ).order_by('doctor_id', 'inicio').values_list('doctor_id', 'fecha', 'inicio', 'fin', 'estado')
+
+    for doctor_id, fecha, inicio, fin, estado in franjas:
+        resultado[doctor_id].setdefault(fecha, []).append({
+            'hora': timezone.localtime(inicio).time(),
+            'inicio': inicio,
+            'fin': fin,
+            'estado': estado,
+            'paciente': None,
+        })
+
+    return resultado
+
+
+def _franjas_hasta(doctores):
+    """Retorna {doctor_id: franjas_hasta} usando las instancias si están disponibles"""
+    if all(isinstance(doctor, Doctor) for doctor in doctores):
+        return {doctor.pk: doctor.franjas_hasta for doctor in doctores}
+    return dict(
+        Doctor.objects.filter(pk__in=doctores).values_list('pk', 'franjas_hasta')
+    )
+
+
+def _obtener_sin_cache(doctores, fecha_inicio, fecha_fin):
+    """
+    Lee de la tabla de franjas a los doctores cuyo horizonte materializado
+    cubre todo el rango, calcula en memoria al resto y marca como ocupadas
+    las franjas con citas usando una sola consulta para todo el rango.
+    """
+    doctor_ids = [getattr(doctor, 'pk', doctor) for doctor in doctores]
+    materializados, calculados = [], []
+    if fecha_inicio >= timezone.localdate():
+        for doctor_id, hasta in _franjas_hasta(doctores).items():
+            if hasta and hasta >= fecha_fin:
+                materializados.append(doctor_id)
+            else:
+                calculados.append(doctor_id)
+    else:
+        calculados = doctor_ids
+
+    resultado = leer_franjas_materializadas(materializados, fecha_inicio, fecha_fin)
+    resultado.update(calcular_disponibilidad(calculados, fecha_inicio, fecha_fin))
+
+    citas = cargar_citas(
+        doctor_ids,
+        inicio_del_dia(fecha_inicio),
+        inicio_del_dia(fecha_fin + timedelta(days=1))
+    )
+    return marcar_citas(resultado, citas)
+
+
+def obtener_disponibilidad(doctores, fecha_inicio, fecha_fin, titular=None, reservas=True):
+    """
+    Retorna {doctor_id: {fecha: [franjas]}} para los doctores y el rango dados.
+
+    Primero busca cada (doctor, fecha) en la caché versionada; los faltantes
+    se leen de la tabla de franjas o se calculan en memoria, siempre con un
+    número constante de consultas. Las reservas temporales se aplican al
+    final, fuera de la caché, excepto las del `titular` indicado; con
+    reservas=False no se leen. Los días sin horario no aparecen.
+    """
+    doctores = list(doctores)
+    doctor_ids = [getattr(doctor, 'pk', doctor) for doctor in doctores]
+    resultado = {doctor_id: {} for doctor_id in doctor_ids}
+    if not doctor_ids or fecha_inicio > fecha_fin:
+        return resultado
+
+    fechas = list(rango_fechas(fecha_inicio, fecha_fin))
+    versiones = cache_disponibilidad.obtener_versiones(doctor_ids)
+    en_cache = cache_disponibilidad.leer(doctor_ids, fechas, versiones)
+
+    faltantes = {}
+    for doctor in doctores:
+        doctor_id = getattr(doctor, 'pk', doctor)
+        for fecha in fechas:
+            franjas = en_cache.get((doctor_id, fecha))
+            if franjas is None:
+                faltantes.setdefault(doctor_id, (doctor, []))[1].append(fecha)
+            elif franjas:
+                resultado[doctor_id][fecha] = franjas
+
+    if faltantes:
+        desde = min(dias[0] for _, dias in faltantes.values())
+        hasta = max(dias[-1] for _, dias in faltantes.values())
+        calculado = _obtener_sin_cache(
+            [doctor for doctor, _ in faltantes.values()], desde, hasta
+        )
+
+        nuevas = {}
+        for doctor_id, (_, dias) in faltantes.items():
+            for fecha in dias:
+                franjas = calculado[doctor_id].get(fecha, [])
+                # Los días sin horario se guardan vacíos para no recalcularlos
+                nuevas[(doctor_id, fecha)] = franjas
+                if franjas:
+                    resultado[doctor_id][fecha] = franjas
+        cache_disponibilidad.guardar(nuevas, versiones)
+
+    if not reservas:
+        return resultado
+    reservas = cargar_reservas(
+        doctor_ids,
+        inicio_del_dia(fecha_inicio),
+        inicio_del_dia(fecha_fin + timedelta(days=1)),
+        excluir_titular=titular
+    )
+    return marcar_reservas(resultado, reservas)
+
+
+def obtener_franjas_dia(doctor, fecha):
+    """Franjas de un único doctor para una fecha específica"""
+    return obtener_disponibilidad([doctor], fecha, fecha)[doctor.pk].get(fecha, [])
+
+
+def grilla_dia(doctor_ids, franjas_por_doctor):
+    """
+    Organiza las franjas de un día en filas por hora para una vista de
+    varios doctores. Retorna [(hora, [franja o None por doctor])] ordenado,
+    con las columnas en el mismo orden de `doctor_ids`.
+    """
+    filas = defaultdict(lambda: [None] * len(doctor_ids))
+    for columna, doctor_id in enumerate(doctor_ids):
+        for franja in franjas_por_doctor.get(doctor_id, []):
+            filas[franja['hora']][columna] = franja
+    return sorted(filas.items())
+
+
+def _franjas_libres(doctor_id, franjas_por_fecha, desde, hora_desde=None, hora_hasta=None):
+    """
+    Itera en orden cronológico (inicio, doctor_id, franja) para las franjas
+    disponibles desde el instante dado y dentro del rango horario.
+    """
+    for fecha in sorted(franjas_por_fecha):
+        for franja in franjas_por_fecha[fecha]:
+            if franja['estado'] != ESTADO_DISPONIBLE or franja['inicio'] < desde:
+                continue
+            if hora_desde and franja['hora'] < hora_desde:
+                continue
+            if hora_hasta and franja['hora'] >= hora_hasta:
+                continue
+            yield franja['inicio'], doctor_id, franja
+
+
+def buscar_proximas_franjas(doctores, cantidad=10, hora_desde=None, hora_hasta=None,
+                            desde=None, dias=None, titular=None):
+    """
+    Retorna las `cantidad` franjas disponibles más próximas entre los doctores
+    dados, en orden cronológico, como lista de (doctor_id, franja).
+
+    El horizonte (por defecto DISPONIBILIDAD_BUSQUEDA_DIAS) se recorre en
+    ventanas que duplican su tamaño: cada ventana cuesta un número constante
+    de consultas para todos los doctores, y las franjas de cada doctor se
+    mezclan con un heap. Como las ventanas no se solapan, en cuanto una
+    ventana completa la cantidad pedida no hace falta mirar las siguientes.
+    """
+    doctores = list(doctores)
+    desde = desde or timezone.now()
+    dias = dias or getattr(settings, 'DISPONIBILIDAD_BUSQUEDA_DIAS', 90)
+    if not doctores or cantidad <= 0:
+        return []
+
+    primer_dia = timezone.localtime(desde).date()
+    ultimo_dia = primer_dia + timedelta(days=dias - 1)
+    resultados = []
+    inicio_ventana, tamano = primer_dia, 1
+
+    while inicio_ventana <= ultimo_dia and len(resultados) < cantidad:
+        fin_ventana = min(inicio_ventana + timedelta(days=tamano - 1), ultimo_dia)
+        disponibilidad = obtener_disponibilidad(doctores, inicio_ventana, fin_ventana, titular=titular)
+
+        por_doctor = [
+            _franjas_libres(doctor_id, fechas, desde, hora_desde, hora_hasta)
+            for doctor_id, fechas in disponibilidad.items()
+        ]
+        for _, doctor_id, franja in heapq.merge(*por_doctor, key=lambda item: item[:2]):
+            resultados.append((doctor_id, franja))
+            if len(resultados) == cantidad:
+                break
+
+        inicio_ventana = fin_ventana + timedelta(days=1)
+        tamano *= 2
+
+    return resultados
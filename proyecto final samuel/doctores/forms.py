@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from .models import Doctor, Especialidad, HorarioAtencion, ExcepcionHorario
+from citas.conflictos import ACCION_CHOICES, ACCION_REPROGRAMAR
 from datetime import datetime, timedelta
 
 Usuario = get_user_model()
@@ -203,6 +204,14 @@ class ExcepcionHorarioForm(forms.ModelForm):
     """
     Formulario para registrar excepciones en los horarios de doctores
     """
+    accion_citas = forms.ChoiceField(
+        label='Citas Afectadas',
+        choices=ACCION_CHOICES,
+        initial=ACCION_REPROGRAMAR,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        help_text='Qué hacer con las citas confirmadas dentro del intervalo; los pacientes serán notificados'
+    )
+    
     class Meta:
         model = ExcepcionHorario
         fields = ['fecha_inicio', 'fecha_fin', 'tipo_excepcion', 'motivo', 'todo_el_dia']
@@ -242,31 +251,35 @@ class FiltroCalendarioForm(forms.Form):
     fecha = forms.DateField(
         label='Fecha',
         widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
-        initial=timezone.now().date()
+        initial=timezone.localdate
     )
     
     doctor = forms.ModelChoiceField(
         label='Doctor',
-        queryset=Doctor.objects.filter(activo=True),
+        # Las opciones muestran el nombre y la especialidad de cada doctor
+        queryset=Doctor.objects.filter(activo=True).select_related('usuario', 'especialidad'),
         required=False,
         empty_label='Todos los doctores',
         widget=forms.Select(attrs={'class': 'form-control'})
     )
     
     def __init__(self, *args, **kwargs):
-        user = kwargs.pop('user', None)
+        # Perfil del doctor autenticado (request.doctor), o None
+        doctor = kwargs.pop('doctor', None)
         super().__init__(*args, **kwargs)
         
         # Si el usuario es doctor, solo mostrar su propio perfil
-        if user and hasattr(user, 'doctor'):
-            self.fields['doctor'].queryset = Doctor.objects.filter(id=user.doctor.id)
-            self.fields['doctor'].initial = user.doctor
+        if doctor:
+            self.fields['doctor'].queryset = self.fields['doctor'].queryset.filter(pk=doctor.pk)
             self.fields['doctor'].widget.attrs['readonly'] = True 
 
 class ConsultaDisponibilidadForm(forms.Form):
     """
     Formulario para consultar disponibilidad de doctores (HU0001)
     """
+    # Máxima amplitud del rango, en días
+    max_dias = 30
+    
     fecha_inicio = forms.DateField(
         label='Fecha de Inicio',
         widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
@@ -290,7 +303,8 @@ class ConsultaDisponibilidadForm(forms.Form):
     
     doctor = forms.ModelChoiceField(
         label='Doctor Específico',
-        queryset=Doctor.objects.filter(activo=True),
+        # Las opciones muestran el nombre y la especialidad de cada doctor
+        queryset=Doctor.objects.filter(activo=True).select_related('usuario', 'especialidad'),
         required=False,
         empty_label='Todos los doctores',
         widget=forms.Select(attrs={'class': 'form-control'}),
@@ -328,8 +342,49 @@ class ConsultaDisponibilidadForm(forms.Form):
             if fecha_inicio > fecha_fin:
                 raise ValidationError('La fecha de inicio debe ser anterior o igual a la fecha de fin.')
             
-            # Validar que el rango no sea mayor a 30 días
-            if (fecha_fin - fecha_inicio).days > 30:
-                raise ValidationError('El rango de fechas no puede ser mayor a 30 días.')
+            # Validar que el rango no sea mayor al máximo permitido
+            if (fecha_fin - fecha_inicio).days > self.max_dias:
+                raise ValidationError(f'El rango de fechas no puede ser mayor a {self.max_dias} días.')
+        
+        return cleaned_data 
+
+class ExportarDisponibilidadForm(ConsultaDisponibilidadForm):
+    """
+    Formulario para la exportación de disponibilidad en JSON lines; al
+    generarse por bloques admite rangos más amplios que la consulta web
+    """
+    max_dias = 90
+
+
+class ProximaDisponibilidadForm(forms.Form):
+    """
+    Formulario para buscar las próximas franjas libres de una especialidad
+    """
+    especialidad = forms.ModelChoiceField(
+        queryset=Especialidad.objects.filter(activa=True),
+        required=False
+    )
+    
+    doctor = forms.ModelChoiceField(
+        queryset=Doctor.objects.filter(activo=True),
+        required=False
+    )
+    
+    hora_desde = forms.TimeField(required=False)
+    hora_hasta = forms.TimeField(required=False)
+    
+    cantidad = forms.IntegerField(required=False, min_value=1, max_value=50)
+    
+    def clean(self):
+        """Validaciones personalizadas"""
+        cleaned_data = super().clean()
         
-        return cleaned_data 
\ No newline at end of file
+        if not cleaned_data.get('especialidad') and not cleaned_data.get('doctor'):
+            raise ValidationError('Debes indicar una especialidad o un doctor.')
+        
+        hora_desde = cleaned_data.get('hora_desde')
+        hora_hasta = cleaned_data.get('hora_hasta')
+        if hora_desde and hora_hasta and hora_desde >= hora_hasta:
+            raise ValidationError('La hora de inicio debe ser anterior a la hora de fin.')
+        
+        return cleaned_data
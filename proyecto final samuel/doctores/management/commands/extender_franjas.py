@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+
+from doctores.models import Doctor
+from doctores.materializacion import horizonte_dias, materializar_doctor, purgar_franjas_pasadas
+
+class Command(BaseCommand):
+    help = 'Extender el horizonte de franjas precalculadas y purgar las franjas pasadas'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=None,
+            help='Días hacia adelante a materializar (por defecto FRANJAS_HORIZONTE_DIAS)',
+        )
+    
+    def handle(self, *args, **options):
+        dias = options.get('dias') or horizonte_dias()
+        hasta = timezone.localdate() + timedelta(days=dias)
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'=== Materializando franjas hasta {hasta:%d/%m/%Y} ===\n')
+        )
+        
+        borradas = purgar_franjas_pasadas()
+        
+        doctores = Doctor.objects.filter(
+            activo=True,
+            horarios_atencion__activo=True
+        ).distinct().values_list('pk', flat=True)
+        
+        creadas = 0
+        for doctor_id in doctores:
+            creadas += materializar_doctor(doctor_id, hasta)
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n📊 Resumen:\n'
+                f'   - Doctores procesados: {len(doctores)}\n'
+                f'   - Franjas creadas: {creadas}\n'
+                f'   - Franjas pasadas eliminadas: {borradas}\n'
+            )
+        )
@@ -0,0 +1,118 @@
+"""
+Mantenimiento de la tabla de franjas precalculadas (FranjaHoraria)
+
+Cada doctor tiene un horizonte materializado que va desde hoy hasta
+Doctor.franjas_hasta. Los cambios en horarios y excepciones reescriben solo
+los días afectados de ese doctor, y el comando `extender_franjas` avanza el
+horizonte cada noche.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .disponibilidad import calcular_disponibilidad, rango_fechas
+from .models import Doctor, FranjaHoraria
+
+
+def horizonte_dias():
+    """Cantidad de días hacia adelante que se mantienen materializados"""
+    return getattr(settings, 'FRANJAS_HORIZONTE_DIAS', 60)
+
+
+def reescribir_dias(doctor_id, fechas):
+    """
+    Borra y vuelve a generar las franjas de un doctor para las fechas dadas.
+    Usa una consulta de borrado, dos de lectura y las inserciones en bloque.
+    """
+    fechas = sorted(set(fechas))
+    if not fechas:
+        return 0
+
+    calculadas = calcular_disponibilidad([doctor_id], fechas[0], fechas[-1])[doctor_id]
+    franjas = [
+        FranjaHoraria(
+            doctor_id=doctor_id,
+            fecha=fecha,
+            inicio=franja['inicio'],
+            fin=franja['fin'],
+            estado=franja['estado'],
+        )
+        for fecha in fechas
+        for franja in calculadas.get(fecha, [])
+    ]
+
+    with transaction.atomic():
+        FranjaHoraria.objects.filter(doctor_id=doctor_id, fecha__in=fechas).delete()
+        FranjaHoraria.objects.bulk_create(franjas)
+
+    return len(franjas)
+
+
+def franjas_hasta(doctor_id):
+    """Último día materializado del doctor, o None si aún no tiene franjas"""
+    return Doctor.objects.filter(pk=doctor_id).values_list('franjas_hasta', flat=True).first()
+
+
+def materializar_doctor(doctor_id, hasta=None):
+    """
+    Extiende el horizonte de un doctor hasta `hasta` (por defecto hoy más
+    FRANJAS_HORIZONTE_DIAS), generando solo los días que aún no existen.
+    """
+    hoy = timezone.localdate()
+    hasta = hasta or hoy + timedelta(days=horizonte_dias())
+    actual = franjas_hasta(doctor_id)
+
+    desde = max(hoy, actual + timedelta(days=1)) if actual else hoy
+    creadas = 0
+    if desde <= hasta:
+        creadas = reescribir_dias(doctor_id, rango_fechas(desde, hasta))
+        Doctor.objects.filter(pk=doctor_id).update(franjas_hasta=hasta)
+    return creadas
+
+
+def _dias_en_horizonte(horizonte, fecha_inicio, fecha_fin, dias_semana=None):
+    """
+    Fechas entre hoy y `horizonte` que caen dentro de [fecha_inicio, fecha_fin],
+    opcionalmente filtradas por día de la semana.
+    """
+    desde = max(fecha_inicio, timezone.localdate())
+    hasta = min(fecha_fin, horizonte)
+    return [
+        fecha for fecha in rango_fechas(desde, hasta)
+        if dias_semana is None or fecha.weekday() in dias_semana
+    ]
+
+
+def actualizar_por_horario(doctor_id, dias_semana):
+    """Reescribe los días del horizonte que caen en los días de la semana dados"""
+    horizonte = franjas_hasta(doctor_id)
+    if horizonte is None:
+        # Primer horario del doctor: se materializa el horizonte completo
+        return materializar_doctor(doctor_id)
+
+    fechas = _dias_en_horizonte(horizonte, timezone.localdate(), horizonte, set(dias_semana))
+    return reescribir_dias(doctor_id, fechas)
+
+
+def actualizar_por_excepcion(doctor_id, intervalos):
+    """Reescribe los días del horizonte tocados por los intervalos (inicio, fin) dados"""
+    horizonte = franjas_hasta(doctor_id)
+    if horizonte is None:
+        return 0
+
+    fechas = set()
+    for inicio, fin in intervalos:
+        fechas.update(_dias_en_horizonte(
+            horizonte,
+            timezone.localtime(inicio).date(),
+            timezone.localtime(fin).date()
+        ))
+    return reescribir_dias(doctor_id, fechas)
+
+
+def purgar_franjas_pasadas():
+    """Elimina las franjas de días anteriores a hoy"""
+    borradas, _ = FranjaHoraria.objects.filter(fecha__lt=timezone.localdate()).delete()
+    return borradas
@@ -0,0 +1,39 @@
+"""
+Perfil de doctor del usuario autenticado
+
+DoctorActualMiddleware agrega `request.doctor`: el Doctor del usuario (con
+su usuario y especialidad) o None si el usuario no es doctor. Se carga de
+forma perezosa, con una sola consulta, la primera vez que una vista lo usa,
+y queda guardado para el resto de la petición. La consulta usa la columna
+única usuario_id, así que guardar el id del perfil en la sesión no ahorraría
+nada.
+"""
+from django.utils.functional import SimpleLazyObject
+
+from .models import Doctor
+
+
+def obtener_doctor(request):
+    """Retorna el Doctor del usuario de la petición o None (una consulta por petición)"""
+    if not hasattr(request, '_doctor_cache'):
+        request._doctor_cache = _cargar_doctor(request)
+    return request._doctor_cache
+
+
+def _cargar_doctor(request):
+    usuario = request.user
+    if not usuario.is_authenticated or not usuario.es_doctor():
+        return None
+
+    return Doctor.objects.select_related('usuario', 'especialidad').filter(usuario=usuario).first()
+
+
+class DoctorActualMiddleware:
+    """Agrega request.doctor; debe ir después de AuthenticationMiddleware"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.doctor = SimpleLazyObject(lambda: obtener_doctor(request))
+        return self.get_response(request)
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctores', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='franjas_hasta',
+            field=models.DateField(blank=True, editable=False, help_text='Último día con franjas precalculadas en la tabla de franjas', null=True, verbose_name='Franjas Materializadas Hasta'),
+        ),
+        migrations.CreateModel(
+            name='FranjaHoraria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('inicio', models.DateTimeField(verbose_name='Inicio')),
+                ('fin', models.DateTimeField(verbose_name='Fin')),
+                ('estado', models.CharField(choices=[('disponible', 'Disponible'), ('no_disponible', 'No Disponible')], default='disponible', max_length=20, verbose_name='Estado')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='franjas', to='doctores.doctor', verbose_name='Doctor')),
+            ],
+            options={
+                'verbose_name': 'Franja Horaria',
+                'verbose_name_plural': 'Franjas Horarias',
+                'ordering': ['doctor', 'inicio'],
+                'indexes': [models.Index(fields=['doctor', 'fecha'], name='franja_doctor_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'inicio'), name='franja_unica_doctor_inicio')],
+            },
+        ),
+    ]
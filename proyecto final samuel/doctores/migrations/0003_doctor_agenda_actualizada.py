@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctores', '0002_franjahoraria_doctor_franjas_hasta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='agenda_actualizada',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Último cambio en horarios, excepciones o citas del doctor', null=True, verbose_name='Última Modificación de la Agenda'),
+        ),
+    ]
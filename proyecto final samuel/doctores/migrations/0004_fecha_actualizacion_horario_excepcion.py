@@ -0,0 +1,29 @@
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copiar_fecha_creacion(apps, schema_editor):
+    """Las filas existentes toman su fecha de creación como última actualización"""
+    for nombre in ('HorarioAtencion', 'ExcepcionHorario'):
+        apps.get_model('doctores', nombre).objects.update(fecha_actualizacion=F('fecha_creacion'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctores', '0003_doctor_agenda_actualizada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='horarioatencion',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización'),
+        ),
+        migrations.AddField(
+            model_name='excepcionhorario',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización'),
+        ),
+        migrations.RunPython(copiar_fecha_creacion, migrations.RunPython.noop),
+    ]
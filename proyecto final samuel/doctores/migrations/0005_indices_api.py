@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctores', '0004_fecha_actualizacion_horario_excepcion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['especialidad', 'activo'], name='doctor_especialidad_activo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='excepcionhorario',
+            index=models.Index(fields=['doctor', 'fecha_inicio'], name='excepcion_doctor_inicio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='excepcionhorario',
+            index=models.Index(fields=['fecha_inicio', 'id'], name='excepcion_inicio_id_idx'),
+        ),
+    ]
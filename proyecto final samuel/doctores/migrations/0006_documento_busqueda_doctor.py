@@ -0,0 +1,134 @@
+"""
+Documentos de búsqueda de doctores y su índice (ver doctores/busqueda.py)
+
+El documento público (nombre, especialidad y consultorio) es el que busca
+el directorio; el privado (email y licencia) solo lo busca el personal.
+
+- SQLite: tabla FTS5 de contenido externo sobre doctores_doctor, con una
+  columna por documento y triggers de sincronización. Si la compilación de
+  SQLite no incluye FTS5 no se crea y la búsqueda usa icontains.
+- PostgreSQL: índices GIN sobre las mismas expresiones to_tsvector que
+  generan SearchVector('documento_busqueda', config='simple') y
+  SearchVector('documento_busqueda', 'documento_privado', config='simple').
+"""
+from django.db import migrations, models, OperationalError
+
+SQLITE_CREAR = [
+    """
+    CREATE VIRTUAL TABLE doctores_doctor_fts USING fts5(
+        documento_busqueda, documento_privado,
+        content='doctores_doctor', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER doctores_doctor_fts_ai AFTER INSERT ON doctores_doctor BEGIN
+        INSERT INTO doctores_doctor_fts(rowid, documento_busqueda, documento_privado)
+        VALUES (new.id, new.documento_busqueda, new.documento_privado);
+    END
+    """,
+    """
+    CREATE TRIGGER doctores_doctor_fts_ad AFTER DELETE ON doctores_doctor BEGIN
+        INSERT INTO doctores_doctor_fts(doctores_doctor_fts, rowid, documento_busqueda, documento_privado)
+        VALUES ('delete', old.id, old.documento_busqueda, old.documento_privado);
+    END
+    """,
+    """
+    CREATE TRIGGER doctores_doctor_fts_au AFTER UPDATE OF documento_busqueda, documento_privado
+    ON doctores_doctor BEGIN
+        INSERT INTO doctores_doctor_fts(doctores_doctor_fts, rowid, documento_busqueda, documento_privado)
+        VALUES ('delete', old.id, old.documento_busqueda, old.documento_privado);
+        INSERT INTO doctores_doctor_fts(rowid, documento_busqueda, documento_privado)
+        VALUES (new.id, new.documento_busqueda, new.documento_privado);
+    END
+    """,
+    "INSERT INTO doctores_doctor_fts(doctores_doctor_fts) VALUES ('rebuild')",
+]
+
+SQLITE_ELIMINAR = [
+    'DROP TRIGGER IF EXISTS doctores_doctor_fts_ai',
+    'DROP TRIGGER IF EXISTS doctores_doctor_fts_ad',
+    'DROP TRIGGER IF EXISTS doctores_doctor_fts_au',
+    'DROP TABLE IF EXISTS doctores_doctor_fts',
+]
+
+POSTGRESQL_CREAR = [
+    "CREATE INDEX IF NOT EXISTS doctor_documento_busqueda_idx ON doctores_doctor "
+    "USING gin (to_tsvector('simple'::regconfig, COALESCE(documento_busqueda, '')))",
+    "CREATE INDEX IF NOT EXISTS doctor_documentos_busqueda_idx ON doctores_doctor "
+    "USING gin (to_tsvector('simple'::regconfig, "
+    "COALESCE(documento_busqueda, '') || ' ' || COALESCE(documento_privado, '')))",
+]
+
+POSTGRESQL_ELIMINAR = [
+    'DROP INDEX IF EXISTS doctor_documento_busqueda_idx',
+    'DROP INDEX IF EXISTS doctor_documentos_busqueda_idx',
+]
+
+
+def _unir(partes):
+    # Copia de los documentos de esta versión de doctores/busqueda.py
+    return ' '.join(parte for parte in partes if parte)
+
+
+def llenar_documentos(apps, schema_editor):
+    Doctor = apps.get_model('doctores', 'Doctor')
+    doctores = list(Doctor.objects.select_related('usuario', 'especialidad'))
+    for doctor in doctores:
+        doctor.documento_busqueda = _unir([
+            doctor.usuario.first_name, doctor.usuario.last_name,
+            doctor.especialidad.nombre, doctor.consultorio,
+        ])
+        doctor.documento_privado = _unir([doctor.usuario.email, doctor.numero_licencia])
+    Doctor.objects.bulk_update(doctores, ['documento_busqueda', 'documento_privado'], batch_size=500)
+
+
+def _ejecutar(schema_editor, sentencias):
+    for sentencia in sentencias:
+        schema_editor.execute(sentencia)
+
+
+def crear_indice_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            try:
+                cursor.execute('CREATE VIRTUAL TABLE temp.prueba_fts5 USING fts5(texto)')
+                cursor.execute('DROP TABLE temp.prueba_fts5')
+            except OperationalError:
+                return
+        _ejecutar(schema_editor, SQLITE_CREAR)
+    elif vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRESQL_CREAR)
+
+
+def eliminar_indice_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _ejecutar(schema_editor, SQLITE_ELIMINAR)
+    elif vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRESQL_ELIMINAR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctores', '0005_indices_api'),
+        # Los documentos leen el email y el nombre del usuario
+        ('usuarios', '0002_remove_usuario_email_verificado_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='documento_busqueda',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Nombre, especialidad y consultorio; lo busca el directorio público (ver busqueda.py)', verbose_name='Documento de Búsqueda'),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='documento_privado',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Email y licencia; solo lo busca el personal (ver busqueda.py)', verbose_name='Documento de Búsqueda Privado'),
+        ),
+        migrations.RunPython(llenar_documentos, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_busqueda, eliminar_indice_busqueda),
+    ]
@@ -0,0 +1,74 @@
+"""
+Clave del calendario iCalendar de cada doctor (ver doctores/calendario_ical.py)
+
+En SQLite agregar la columna reconstruye doctores_doctor, y al borrar la
+tabla anterior se pierden los triggers que mantienen la tabla FTS5 de
+búsqueda (migración 0006); se vuelven a crear al final. El contenido del
+índice sigue siendo válido porque los id no cambian.
+"""
+import secrets
+
+from django.db import migrations, models
+
+import doctores.models
+
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS doctores_doctor_fts_ai AFTER INSERT ON doctores_doctor BEGIN
+        INSERT INTO doctores_doctor_fts(rowid, documento_busqueda, documento_privado)
+        VALUES (new.id, new.documento_busqueda, new.documento_privado);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS doctores_doctor_fts_ad AFTER DELETE ON doctores_doctor BEGIN
+        INSERT INTO doctores_doctor_fts(doctores_doctor_fts, rowid, documento_busqueda, documento_privado)
+        VALUES ('delete', old.id, old.documento_busqueda, old.documento_privado);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS doctores_doctor_fts_au AFTER UPDATE OF documento_busqueda, documento_privado
+    ON doctores_doctor BEGIN
+        INSERT INTO doctores_doctor_fts(doctores_doctor_fts, rowid, documento_busqueda, documento_privado)
+        VALUES ('delete', old.id, old.documento_busqueda, old.documento_privado);
+        INSERT INTO doctores_doctor_fts(rowid, documento_busqueda, documento_privado)
+        VALUES (new.id, new.documento_busqueda, new.documento_privado);
+    END
+    """,
+]
+
+
+def asignar_claves(apps, schema_editor):
+    # La columna nueva recibe el mismo valor en todas las filas existentes
+    Doctor = apps.get_model('doctores', 'Doctor')
+    doctores = list(Doctor.objects.only('pk'))
+    for doctor in doctores:
+        doctor.clave_calendario = secrets.token_urlsafe(16)
+    Doctor.objects.bulk_update(doctores, ['clave_calendario'], batch_size=500)
+
+
+def restaurar_triggers_busqueda(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if 'doctores_doctor_fts' not in connection.introspection.table_names(cursor):
+            return
+    for sentencia in SQLITE_TRIGGERS:
+        schema_editor.execute(sentencia)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctores', '0006_documento_busqueda_doctor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='clave_calendario',
+            field=models.CharField(default=doctores.models.generar_clave_calendario, editable=False, help_text='Secreto del enlace privado al calendario; cambiarlo revoca el enlace anterior', max_length=32, verbose_name='Clave del Calendario'),
+        ),
+        migrations.RunPython(asignar_claves, migrations.RunPython.noop),
+        migrations.RunPython(restaurar_triggers_busqueda, migrations.RunPython.noop),
+    ]
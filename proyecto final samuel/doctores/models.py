@@ -3,9 +3,16 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 import datetime
+import secrets
+
+from .busqueda import CAMPOS_DOCUMENTOS, asignar_documentos
 
 Usuario = get_user_model()
 
+def generar_clave_calendario():
+    """Secreto aleatorio que forma parte del token del calendario iCalendar"""
+    return secrets.token_urlsafe(16)
+
 class Especialidad(models.Model):
     """
     Modelo para las especialidades médicas
@@ -92,10 +99,53 @@ class Doctor(models.Model):
         verbose_name='Fecha de Actualización'
     )
     
+    franjas_hasta = models.DateField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Franjas Materializadas Hasta',
+        help_text='Último día con franjas precalculadas en la tabla de franjas'
+    )
+    
+    agenda_actualizada = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Última Modificación de la Agenda',
+        help_text='Último cambio en horarios, excepciones o citas del doctor'
+    )
+    
+    clave_calendario = models.CharField(
+        max_length=32,
+        default=generar_clave_calendario,
+        editable=False,
+        verbose_name='Clave del Calendario',
+        help_text='Secreto del enlace privado al calendario; cambiarlo revoca el enlace anterior'
+    )
+    
+    documento_busqueda = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Documento de Búsqueda',
+        help_text='Nombre, especialidad y consultorio; lo busca el directorio público (ver busqueda.py)'
+    )
+    
+    documento_privado = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Documento de Búsqueda Privado',
+        help_text='Email y licencia; solo lo busca el personal (ver busqueda.py)'
+    )
+    
     class Meta:
         verbose_name = 'Doctor'
         verbose_name_plural = 'Doctores'
         ordering = ['usuario__first_name', 'usuario__last_name']
+        indexes = [
+            models.Index(fields=['especialidad', 'activo'], name='doctor_especialidad_activo_idx'),
+        ]
     
     def __str__(self):
         return f"Dr. {self.usuario.get_full_name()} - {self.especialidad.nombre}"
@@ -112,6 +162,11 @@ class Doctor(models.Model):
             self.usuario.tipo_usuario = 'doctor'
             self.usuario.save()
         
+        asignar_documentos(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *CAMPOS_DOCUMENTOS}
+        
         super().save(*args, **kwargs)
 
 class HorarioAtencion(models.Model):
@@ -164,6 +219,11 @@ class HorarioAtencion(models.Model):
         verbose_name='Fecha de Creación'
     )
     
+    fecha_actualizacion = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Fecha de Actualización'
+    )
+    
     class Meta:
         verbose_name = 'Horario de Atención'
         verbose_name_plural = 'Horarios de Atención'
@@ -244,6 +304,11 @@ class ExcepcionHorario(models.Model):
         verbose_name='Fecha de Creación'
     )
     
+    fecha_actualizacion = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Fecha de Actualización'
+    )
+    
     creado_por = models.ForeignKey(
         Usuario,
         on_delete=models.SET_NULL,
@@ -256,6 +321,12 @@ class ExcepcionHorario(models.Model):
         verbose_name = 'Excepción de Horario'
         verbose_name_plural = 'Excepciones de Horario'
         ordering = ['-fecha_inicio']
+        indexes = [
+            # Ventanas de fechas por doctor (motor de disponibilidad y API)
+            models.Index(fields=['doctor', 'fecha_inicio'], name='excepcion_doctor_inicio_idx'),
+            # Paginación por cursor de la API sobre todas las excepciones
+            models.Index(fields=['fecha_inicio', 'id'], name='excepcion_inicio_id_idx'),
+        ]
     
     def clean(self):
         """Validaciones personalizadas"""
@@ -279,3 +350,54 @@ class ExcepcionHorario(models.Model):
         """Verifica si la excepción está actualmente activa"""
         ahora = timezone.now()
         return self.fecha_inicio <= ahora <= self.fecha_fin
+
+class FranjaHoraria(models.Model):
+    """
+    Franja precalculada de la agenda de un doctor dentro del horizonte
+    materializado. Las citas se superponen al leer, aquí solo se refleja
+    el horario regular y las excepciones.
+    """
+    ESTADO_CHOICES = [
+        ('disponible', 'Disponible'),
+        ('no_disponible', 'No Disponible'),
+    ]
+    
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.CASCADE,
+        related_name='franjas',
+        verbose_name='Doctor'
+    )
+    
+    fecha = models.DateField(
+        verbose_name='Fecha'
+    )
+    
+    inicio = models.DateTimeField(
+        verbose_name='Inicio'
+    )
+    
+    fin = models.DateTimeField(
+        verbose_name='Fin'
+    )
+    
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_CHOICES,
+        default='disponible',
+        verbose_name='Estado'
+    )
+    
+    class Meta:
+        verbose_name = 'Franja Horaria'
+        verbose_name_plural = 'Franjas Horarias'
+        ordering = ['doctor', 'inicio']
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'inicio'], name='franja_unica_doctor_inicio'),
+        ]
+        indexes = [
+            models.Index(fields=['doctor', 'fecha'], name='franja_doctor_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.doctor_id} - {self.inicio:%d/%m/%Y %H:%M} ({self.get_estado_display()})"
@@ -0,0 +1,62 @@
+"""
+Paginación sin COUNT(*)
+
+La API REST usa paginación por cursor: cada página se obtiene con un filtro
+sobre la columna de orden (indexada) en lugar de OFFSET, así que las
+páginas profundas cuestan lo mismo que la primera.
+
+Las listas HTML ordenadas por relevancia no tienen una columna estable para
+el cursor; PaginaSinConteo pide una fila de más para saber si hay página
+siguiente, de modo que cada página es una sola consulta.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class PaginacionCursor(CursorPagination):
+    """Paginación por cursor sobre la clave primaria"""
+    ordering = 'id'
+    page_size_query_param = 'cantidad'
+    max_page_size = 100
+
+
+class PaginacionEspecialidades(PaginacionCursor):
+    ordering = 'nombre'
+
+
+class PaginacionExcepciones(PaginacionCursor):
+    ordering = ('fecha_inicio', 'id')
+
+
+class PaginaSinConteo:
+    """Página numerada de un queryset, obtenida con una sola consulta"""
+
+    def __init__(self, queryset, numero, por_pagina):
+        try:
+            self.number = max(int(numero), 1)
+        except (TypeError, ValueError):
+            self.number = 1
+        inicio = (self.number - 1) * por_pagina
+        filas = list(queryset[inicio:inicio + por_pagina + 1])
+        self.object_list = filas[:por_pagina]
+        self._hay_siguiente = len(filas) > por_pagina
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._hay_siguiente
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
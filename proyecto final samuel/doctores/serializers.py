@@ -0,0 +1,90 @@
+"""
+Serializadores de la API REST de doctores
+
+Los campos relacionados se leen de relaciones ya cargadas por los querysets
+de api.py (select_related y anotaciones), de modo que serializar una página
+no genera consultas adicionales por fila.
+
+El email y la licencia de los doctores y el motivo de las excepciones solo
+los ven el personal de la clínica (recepción y administración) y el propio
+doctor; para los demás usuarios esos campos no aparecen.
+"""
+from rest_framework import serializers
+
+from .models import Doctor, Especialidad, HorarioAtencion, ExcepcionHorario
+
+
+def puede_ver_privados(request, doctor_id):
+    """Indica si el usuario de la petición puede ver los datos privados del doctor"""
+    usuario = getattr(request, 'user', None)
+    if usuario is None or not usuario.is_authenticated:
+        return False
+    if usuario.es_administrador() or usuario.es_recepcion():
+        return True
+    # request.doctor lo carga DoctorActualMiddleware una sola vez por petición
+    doctor = getattr(request, 'doctor', None)
+    return usuario.es_doctor() and bool(doctor) and doctor.pk == doctor_id
+
+
+class CamposPrivadosMixin:
+    """Quita `campos_privados` de la representación si el usuario no puede verlos"""
+    campos_privados = ()
+
+    def doctor_id(self, instancia):
+        return instancia.doctor_id
+
+    def to_representation(self, instancia):
+        datos = super().to_representation(instancia)
+        if not puede_ver_privados(self.context.get('request'), self.doctor_id(instancia)):
+            for campo in self.campos_privados:
+                datos.pop(campo, None)
+        return datos
+
+
+class EspecialidadSerializer(serializers.ModelSerializer):
+    cantidad_doctores = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Especialidad
+        fields = ['id', 'nombre', 'descripcion', 'activa', 'cantidad_doctores']
+
+
+class DoctorSerializer(CamposPrivadosMixin, serializers.ModelSerializer):
+    campos_privados = ('email', 'numero_licencia')
+    nombre_completo = serializers.CharField(source='get_nombre_completo', read_only=True)
+    email = serializers.EmailField(source='usuario.email', read_only=True)
+    especialidad = serializers.StringRelatedField()
+    especialidad_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Doctor
+        fields = [
+            'id', 'nombre_completo', 'email', 'especialidad_id', 'especialidad',
+            'numero_licencia', 'telefono_consultorio', 'consultorio', 'activo',
+        ]
+
+    def doctor_id(self, instancia):
+        return instancia.pk
+
+
+class HorarioAtencionSerializer(serializers.ModelSerializer):
+    dia_nombre = serializers.CharField(source='get_dia_semana_display', read_only=True)
+
+    class Meta:
+        model = HorarioAtencion
+        fields = [
+            'id', 'doctor', 'dia_semana', 'dia_nombre', 'hora_inicio', 'hora_fin',
+            'duracion_cita', 'activo', 'fecha_actualizacion',
+        ]
+
+
+class ExcepcionHorarioSerializer(CamposPrivadosMixin, serializers.ModelSerializer):
+    campos_privados = ('motivo',)
+    tipo = serializers.CharField(source='get_tipo_excepcion_display', read_only=True)
+
+    class Meta:
+        model = ExcepcionHorario
+        fields = [
+            'id', 'doctor', 'fecha_inicio', 'fecha_fin', 'tipo_excepcion', 'tipo',
+            'motivo', 'todo_el_dia', 'fecha_actualizacion',
+        ]
@@ -0,0 +1,107 @@
+"""
+Señales de la app doctores
+
+Mantienen la tabla de franjas precalculadas al día, invalidan la caché de
+disponibilidad del doctor y registran el cambio de su agenda (para el
+calendario iCalendar) cuando cambian sus horarios o excepciones, tanto
+desde las vistas como desde el admin. También recalculan el documento de
+búsqueda de los doctores cuando cambian su usuario o su especialidad.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Doctor, Especialidad, HorarioAtencion, ExcepcionHorario
+from .busqueda import actualizar_documentos
+from .cache_disponibilidad import invalidar_doctor_al_confirmar
+from .calendario_ical import marcar_agenda_actualizada
+from .materializacion import actualizar_por_horario, actualizar_por_excepcion
+
+
+@receiver(pre_save, sender=HorarioAtencion)
+def recordar_horario_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda el doctor y el día de la semana previos para reescribir también ese día"""
+    instance._horario_anterior = None
+    if instance.pk and not raw:
+        instance._horario_anterior = sender.objects.filter(
+            pk=instance.pk
+        ).values_list('doctor_id', 'dia_semana').first()
+
+
+@receiver(post_save, sender=HorarioAtencion)
+def horario_guardado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_horario_anterior', None)
+    if anterior and anterior[0] != instance.doctor_id:
+        # El horario pasó a otro doctor: el anterior pierde ese día
+        actualizar_por_horario(anterior[0], {anterior[1]})
+        invalidar_doctor_al_confirmar(anterior[0])
+        marcar_agenda_actualizada(anterior[0])
+        anterior = None
+
+    dias = {instance.dia_semana}
+    if anterior:
+        dias.add(anterior[1])
+    actualizar_por_horario(instance.doctor_id, dias)
+    invalidar_doctor_al_confirmar(instance.doctor_id)
+    marcar_agenda_actualizada(instance.doctor_id)
+
+
+@receiver(post_delete, sender=HorarioAtencion)
+def horario_eliminado(sender, instance, **kwargs):
+    actualizar_por_horario(instance.doctor_id, {instance.dia_semana})
+    invalidar_doctor_al_confirmar(instance.doctor_id)
+    marcar_agenda_actualizada(instance.doctor_id)
+
+
+@receiver(pre_save, sender=ExcepcionHorario)
+def recordar_excepcion_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda el intervalo previo para liberar los días que deja de bloquear"""
+    instance._intervalo_anterior = None
+    if instance.pk and not raw:
+        instance._intervalo_anterior = sender.objects.filter(
+            pk=instance.pk
+        ).values_list('doctor_id', 'fecha_inicio', 'fecha_fin').first()
+
+
+@receiver(post_save, sender=ExcepcionHorario)
+def excepcion_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_intervalo_anterior', None)
+    if anterior and anterior[0] != instance.doctor_id:
+        actualizar_por_excepcion(anterior[0], [anterior[1:]])
+        invalidar_doctor_al_confirmar(anterior[0])
+        marcar_agenda_actualizada(anterior[0])
+        anterior = None
+
+    intervalos = [(instance.fecha_inicio, instance.fecha_fin)]
+    if anterior:
+        intervalos.append(anterior[1:])
+    actualizar_por_excepcion(instance.doctor_id, intervalos)
+    invalidar_doctor_al_confirmar(instance.doctor_id)
+    marcar_agenda_actualizada(instance.doctor_id)
+
+
+@receiver(post_delete, sender=ExcepcionHorario)
+def excepcion_eliminada(sender, instance, **kwargs):
+    actualizar_por_excepcion(instance.doctor_id, [(instance.fecha_inicio, instance.fecha_fin)])
+    invalidar_doctor_al_confirmar(instance.doctor_id)
+    marcar_agenda_actualizada(instance.doctor_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def usuario_guardado(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.tipo_usuario != 'doctor':
+        return
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    actualizar_documentos(Doctor.objects.filter(usuario_id=instance.pk))
+
+
+@receiver(post_save, sender=Especialidad)
+def especialidad_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    actualizar_documentos(Doctor.objects.filter(especialidad_id=instance.pk))
@@ -1,3 +1,776 @@
-from django.test import TestCase
+import json
+from datetime import datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from citas.models import ReservaTemporal
+from citas.services import agendar_cita, cancelar_cita
+from usuarios.models import Usuario
+from . import busqueda, cache_disponibilidad, calendario_ical, disponibilidad
+from .middleware import DoctorActualMiddleware, obtener_doctor
+from .disponibilidad import (
+    ESTADO_DISPONIBLE, ESTADO_NO_DISPONIBLE, ESTADO_OCUPADO, ESTADO_RESERVADO,
+    _fusionar_intervalos, _hay_solapamiento, buscar_proximas_franjas, calcular_disponibilidad,
+    obtener_disponibilidad
+)
+from .models import Doctor, Especialidad, ExcepcionHorario, FranjaHoraria, HorarioAtencion
+
+
+def proximo_lunes():
+    hoy = timezone.localdate()
+    return hoy + timedelta(days=7 - hoy.weekday())
+
+
+def crear_usuario(nombre, tipo_usuario='paciente', **extra):
+    return Usuario.objects.create_user(
+        email=f'{nombre}@agenda.com', username=nombre,
+        first_name=nombre.capitalize(), last_name='Prueba', tipo_usuario=tipo_usuario, **extra
+    )
+
+
+def crear_doctor(nombre, especialidad, horario=(time(8), time(12)), dia_semana=0, **extra):
+    """Doctor con un horario de 30 minutos el día de la semana indicado"""
+    doctor = Doctor.objects.create(
+        usuario=crear_usuario(nombre, 'doctor'), especialidad=especialidad,
+        numero_licencia=f'LIC-{nombre}', **extra
+    )
+    if horario:
+        HorarioAtencion.objects.create(
+            doctor=doctor, dia_semana=dia_semana, hora_inicio=horario[0], hora_fin=horario[1],
+            duracion_cita=30
+        )
+    return doctor
+
+
+def momento(fecha, hora, minuto=0):
+    return timezone.make_aware(datetime.combine(fecha, time(hora, minuto)))
+
+
+class MotorDisponibilidadTest(TestCase):
+    """
+    HU0001: El motor calcula las franjas en bloque; las excepciones se fusionan
+    y las citas y reservas se cruzan por búsqueda binaria
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre='Cardiología')
+        cls.doctor = crear_doctor('cardio', cls.especialidad)
+        cls.paciente = crear_usuario('paciente')
+        cls.otro_paciente = crear_usuario('otro')
+        cls.fecha = proximo_lunes()
+
+    def setUp(self):
+        for alias in ('default', 'disponibilidad'):
+            caches[alias].clear()
+
+    def estados(self, franjas):
+        return {franja['hora']: franja['estado'] for franja in franjas}
+
+    def test_fusionar_intervalos(self):
+        inicios, fines = _fusionar_intervalos([(5, 7), (1, 3), (2, 4), (7, 8)])
+        self.assertEqual((inicios, fines), ([1, 5], [4, 8]))
+        self.assertTrue(_hay_solapamiento(inicios, fines, 3, 6))
+        self.assertFalse(_hay_solapamiento(inicios, fines, 4, 5))
+        self.assertFalse(_hay_solapamiento(inicios, fines, 8, 9))
+
+    def test_excepciones_solapadas_bloquean_su_union(self):
+        for inicio, fin in (((9, 0), (10, 0)), ((9, 30), (10, 15))):
+            ExcepcionHorario.objects.create(
+                doctor=self.doctor, motivo='Reunión',
+                fecha_inicio=momento(self.fecha, *inicio), fecha_fin=momento(self.fecha, *fin)
+            )
+
+        franjas = calcular_disponibilidad([self.doctor.pk], self.fecha, self.fecha)[self.doctor.pk][self.fecha]
+        estados = self.estados(franjas)
+        self.assertEqual(len(franjas), 8)
+        self.assertEqual(estados[time(8, 30)], ESTADO_DISPONIBLE)
+        for hora in (time(9), time(9, 30), time(10)):
+            self.assertEqual(estados[hora], ESTADO_NO_DISPONIBLE)
+        self.assertEqual(estados[time(10, 30)], ESTADO_DISPONIBLE)
+
+    def test_dias_sin_horario_no_aparecen(self):
+        disponibilidad = calcular_disponibilidad(
+            [self.doctor.pk], self.fecha, self.fecha + timedelta(days=6)
+        )[self.doctor.pk]
+        self.assertEqual(list(disponibilidad), [self.fecha])
+
+    def test_citas_marcan_franjas_ocupadas(self):
+        agendar_cita(self.paciente, self.doctor, momento(self.fecha, 9))
+        agendar_cita(self.otro_paciente, self.doctor, momento(self.fecha, 11, 30))
+
+        franjas = obtener_disponibilidad([self.doctor], self.fecha, self.fecha)[self.doctor.pk][self.fecha]
+        ocupadas = {franja['hora']: franja['paciente'] for franja in franjas if franja['estado'] == ESTADO_OCUPADO}
+        self.assertEqual(ocupadas, {time(9): 'Paciente Prueba', time(11, 30): 'Otro Prueba'})
+
+    def test_reservas_de_otro_titular_se_muestran_reservadas(self):
+        ReservaTemporal.objects.create(
+            doctor=self.doctor, fecha_hora_inicio=momento(self.fecha, 8), titular=self.paciente,
+            expira=timezone.now() + timedelta(minutes=5)
+        )
+        ReservaTemporal.objects.create(
+            doctor=self.doctor, fecha_hora_inicio=momento(self.fecha, 8, 30), titular=self.paciente,
+            expira=timezone.now() - timedelta(minutes=5)
+        )
+
+        ajenas = self.estados(obtener_disponibilidad([self.doctor], self.fecha, self.fecha)[self.doctor.pk][self.fecha])
+        self.assertEqual(ajenas[time(8)], ESTADO_RESERVADO)
+        # Las reservas vencidas dejan de contar
+        self.assertEqual(ajenas[time(8, 30)], ESTADO_DISPONIBLE)
+
+        propias = obtener_disponibilidad([self.doctor], self.fecha, self.fecha, titular=self.paciente)
+        self.assertEqual(self.estados(propias[self.doctor.pk][self.fecha])[time(8)], ESTADO_DISPONIBLE)
+
+
+class EliminarDoctorTest(TestCase):
+    """HU0011: un doctor con citas próximas no se puede desactivar"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.administrador = crear_usuario('admin', 'administrador')
+        cls.doctor = crear_doctor('general', Especialidad.objects.create(nombre='Medicina General'))
+        cls.cita = agendar_cita(
+            crear_usuario('paciente'), cls.doctor,
+            timezone.make_aware(datetime.combine(proximo_lunes(), time(9)))
+        )
+
+    def setUp(self):
+        self.client.force_login(self.administrador)
+
+    def test_no_desactiva_con_citas_proximas(self):
+        response = self.client.post(reverse('doctores:eliminar_doctor', args=[self.doctor.pk]), follow=True)
+
+        self.assertRedirects(response, reverse('doctores:editar_doctor', args=[self.doctor.pk]))
+        self.assertContains(response, 'tiene 1 cita próxima')
+        self.assertTrue(Doctor.objects.get(pk=self.doctor.pk).activo)
+
+    def test_desactiva_sin_citas_proximas(self):
+        cancelar_cita(self.cita, validar_plazo=False)
+
+        response = self.client.post(reverse('doctores:eliminar_doctor', args=[self.doctor.pk]))
+        self.assertRedirects(response, reverse('doctores:lista_doctores'))
+        self.assertFalse(Doctor.objects.get(pk=self.doctor.pk).activo)
+
+
+class DoctorActualTest(TestCase):
+    """
+    request.doctor se carga con una sola consulta y un doctor solo encuentra
+    sus propios horarios y excepciones
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        especialidad = Especialidad.objects.create(nombre='Neumología')
+        cls.doctor = crear_doctor('neumo1', especialidad)
+        cls.otro = crear_doctor('neumo2', especialidad)
+        cls.administrador = crear_usuario('admin', 'administrador')
+        cls.horario_ajeno = cls.otro.horarios_atencion.get()
+        inicio = momento(proximo_lunes(), 10)
+        cls.excepcion_ajena = ExcepcionHorario.objects.create(
+            doctor=cls.otro, fecha_inicio=inicio, fecha_fin=inicio + timedelta(hours=1),
+            tipo_excepcion='personal', motivo='Trámite', creado_por=cls.administrador
+        )
+
+    def peticion(self, usuario):
+        request = RequestFactory().get('/')
+        request.user = usuario
+        return DoctorActualMiddleware(lambda request: request)(request)
+
+    def test_una_consulta_por_peticion(self):
+        request = self.peticion(self.doctor.usuario)
+        with self.assertNumQueries(1):
+            self.assertEqual(request.doctor.pk, self.doctor.pk)
+            self.assertEqual(request.doctor.especialidad.nombre, 'Neumología')
+            self.assertEqual(request.doctor.usuario, self.doctor.usuario)
+
+    def test_none_para_quien_no_es_doctor(self):
+        request = self.peticion(self.administrador)
+        with self.assertNumQueries(0):
+            self.assertFalse(request.doctor)
+            self.assertIsNone(obtener_doctor(request))
+
+    def test_doctor_no_encuentra_lo_ajeno(self):
+        self.client.force_login(self.doctor.usuario)
+        rechazos = [
+            ('doctores:editar_horario', self.horario_ajeno.pk, 'doctores:gestionar_horarios'),
+            ('doctores:eliminar_horario', self.horario_ajeno.pk, 'doctores:gestionar_horarios'),
+            ('doctores:eliminar_excepcion', self.excepcion_ajena.pk, 'doctores:gestionar_excepciones'),
+        ]
+        for vista, pk, destino in rechazos:
+            with self.subTest(vista=vista):
+                response = self.client.post(reverse(vista, args=[pk]))
+                self.assertRedirects(response, reverse(destino), fetch_redirect_response=False)
+
+        self.assertTrue(HorarioAtencion.objects.filter(pk=self.horario_ajeno.pk).exists())
+        self.assertTrue(ExcepcionHorario.objects.filter(pk=self.excepcion_ajena.pk).exists())
+
+    def test_administrador_encuentra_cualquiera(self):
+        self.client.force_login(self.administrador)
+        response = self.client.get(reverse('doctores:editar_horario', args=[self.horario_ajeno.pk]))
+        self.assertEqual(response.context['horario'], self.horario_ajeno)
+        response = self.client.get(reverse('doctores:eliminar_horario', args=[self.horario_ajeno.pk]))
+        self.assertEqual(response.context['horario'], self.horario_ajeno)
+
+        self.client.post(reverse('doctores:eliminar_excepcion', args=[self.excepcion_ajena.pk]))
+        self.assertFalse(ExcepcionHorario.objects.filter(pk=self.excepcion_ajena.pk).exists())
+
+
+class ProximasFranjasTest(TestCase):
+    """
+    La búsqueda de próximas franjas mezcla a los doctores en orden
+    cronológico y deja de leer ventanas en cuanto completa la cantidad
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre='Ortopedia')
+        cls.d1 = crear_doctor('orto1', cls.especialidad)
+        cls.d2 = crear_doctor('orto2', cls.especialidad, horario=(time(10), time(12)))
+        cls.paciente = crear_usuario('paciente')
+        cls.fecha = proximo_lunes()
+        cls.desde = momento(cls.fecha, 0)
+
+    def setUp(self):
+        for alias in ('default', 'disponibilidad'):
+            caches[alias].clear()
+
+    def buscar(self, **kwargs):
+        with mock.patch.object(
+            disponibilidad, 'obtener_disponibilidad', wraps=disponibilidad.obtener_disponibilidad
+        ) as espia:
+            resultados = buscar_proximas_franjas([self.d1, self.d2], desde=self.desde, **kwargs)
+        return [(doctor_id, franja['hora']) for doctor_id, franja in resultados], espia.call_count
+
+    def test_vista_requiere_sesion(self):
+        url = reverse('doctores:proximas_franjas_disponibles')
+        parametros = {'especialidad': self.especialidad.pk, 'cantidad': 2}
+        self.assertEqual(self.client.get(url, parametros).status_code, 302)
+
+        self.client.force_login(self.paciente)
+        response = self.client.get(url, parametros)
+        self.assertEqual(len(response.json()['franjas']), 2)
+
+    def test_orden_cronologico_entre_doctores(self):
+        resultados, ventanas = self.buscar(cantidad=3, hora_desde=time(10))
+        self.assertEqual(resultados, [
+            (self.d1.pk, time(10)), (self.d2.pk, time(10)), (self.d1.pk, time(10, 30)),
+        ])
+        self.assertEqual(ventanas, 1)
+
+    def test_omite_franjas_ocupadas(self):
+        agendar_cita(self.paciente, self.d1, momento(self.fecha, 8))
+        resultados, _ = self.buscar(cantidad=2)
+        self.assertEqual(resultados, [(self.d1.pk, time(8, 30)), (self.d1.pk, time(9))])
+
+    def test_ventanas_crecen_hasta_completar_la_cantidad(self):
+        # El lunes tiene 12 franjas; las 8 restantes están el lunes siguiente,
+        # al que se llega con ventanas de 1, 2, 4 y 8 días
+        resultados, ventanas = self.buscar(cantidad=20)
+        self.assertEqual(len(resultados), 20)
+        self.assertEqual(ventanas, 4)
+
+    def test_horizonte_limita_la_busqueda(self):
+        resultados, ventanas = self.buscar(cantidad=20, dias=7)
+        self.assertEqual(len(resultados), 12)
+        self.assertEqual(ventanas, 3)
+
+
+class ExportarDisponibilidadTest(TestCase):
+    """
+    HU0001: La exportación en JSON lines solo incluye los días con franjas libres
+    y solo la usan recepción y administradores
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre='Oftalmología')
+        cls.libre = crear_doctor('oftalmo1', cls.especialidad)
+        cls.lleno = crear_doctor('oftalmo2', cls.especialidad, horario=(time(8), time(9)))
+        cls.fecha = proximo_lunes()
+        for hora, minuto in ((8, 0), (8, 30)):
+            agendar_cita(crear_usuario(f'paciente{hora}{minuto}'), cls.lleno, momento(cls.fecha, hora, minuto))
+        cls.recepcion = crear_usuario('recepcion', 'recepcion')
+
+    def setUp(self):
+        for alias in ('default', 'disponibilidad'):
+            caches[alias].clear()
+
+    def exportar(self):
+        return self.client.get(reverse('doctores:exportar_disponibilidad'), {
+            'fecha_inicio': self.fecha - timedelta(days=1), 'fecha_fin': self.fecha + timedelta(days=1),
+        })
+
+    def test_solo_para_recepcion_y_administradores(self):
+        self.assertEqual(self.exportar().status_code, 302)
+        self.client.force_login(crear_usuario('curioso'))
+        self.assertEqual(self.exportar().status_code, 302)
+
+    def test_omite_dias_sin_franjas_libres(self):
+        self.client.force_login(self.recepcion)
+        response = self.exportar()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lineas = [json.loads(linea) for linea in b''.join(response.streaming_content).splitlines()]
+
+        self.assertEqual([(linea['doctor_id'], linea['fecha']) for linea in lineas], [
+            (self.libre.pk, self.fecha.isoformat()),
+        ])
+        self.assertEqual(len(lineas[0]['franjas']), 8)
+
+
+class CalendarioIcalTest(TestCase):
+    """
+    El calendario iCalendar de cada doctor se revalida con una ETag precisa
+    y su URL privada se puede revocar
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre='Urología')
+        cls.doctor = crear_doctor('uro', cls.especialidad)
+
+    def url(self):
+        return reverse('doctores:calendario_ical_doctor', args=[calendario_ical.token_doctor(self.doctor)])
+
+    def test_calendario_declara_su_zona_horaria(self):
+        response = self.client.get(self.url())
+        self.assertEqual(response.status_code, 200)
+        contenido = b''.join(response.streaming_content).decode()
+
+        self.assertIn('BEGIN:VTIMEZONE\r\nTZID:America/Bogota\r\n', contenido)
+        self.assertIn('TZOFFSETTO:-0500', contenido)
+        self.assertIn('DTSTART;TZID=America/Bogota:', contenido)
+        self.assertLess(contenido.index('END:VTIMEZONE'), contenido.index('BEGIN:VEVENT'))
+
+    def test_etag_cambia_dentro_del_mismo_segundo(self):
+        marca = timezone.now().replace(microsecond=100)
+        Doctor.objects.filter(pk=self.doctor.pk).update(agenda_actualizada=marca)
+        etag = self.client.get(self.url())['ETag']
+        self.assertEqual(self.client.get(self.url(), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Doctor.objects.filter(pk=self.doctor.pk).update(agenda_actualizada=marca.replace(microsecond=900))
+        response = self.client.get(self.url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_rotar_clave_revoca_la_url_anterior(self):
+        anterior = self.url()
+        calendario_ical.rotar_clave(self.doctor)
+
+        self.assertEqual(self.client.get(anterior).status_code, 404)
+        self.assertEqual(self.client.get(self.url()).status_code, 200)
+
+    def test_token_alterado_no_sirve(self):
+        token = calendario_ical.token_doctor(self.doctor)
+        url = reverse('doctores:calendario_ical_doctor', args=[token[:-1] + ('A' if token[-1] != 'A' else 'B')])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class AgendaCondicionalTest(TestCase):
+    """
+    Las vistas AJAX de horarios y excepciones responden 304 mientras la
+    agenda del doctor no cambie, y dejan de hacerlo al borrar un registro
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre='Endocrinología')
+        cls.doctor = crear_doctor('endo', cls.especialidad)
+        cls.paciente = crear_usuario('paciente')
+
+    def setUp(self):
+        self.client.force_login(self.paciente)
+
+    def test_borrar_horario_invalida_la_etag(self):
+        url = reverse('doctores:obtener_horarios_doctor', args=[self.doctor.pk])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertEqual(len(response.json()['horarios']), 1)
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.doctor.horarios_atencion.get().delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['horarios'], [])
+
+    def test_borrar_excepcion_invalida_la_etag(self):
+        fecha = proximo_lunes()
+        excepcion = ExcepcionHorario.objects.create(
+            doctor=self.doctor, motivo='Congreso',
+            fecha_inicio=momento(fecha, 8), fecha_fin=momento(fecha, 12)
+        )
+        url = reverse('doctores:obtener_excepciones_doctor', args=[self.doctor.pk])
+        etag = self.client.get(url)['ETag']
+
+        excepcion.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['excepciones'], [])
+
+    def test_doctor_inexistente(self):
+        response = self.client.get(reverse('doctores:obtener_horarios_doctor', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ApiDoctoresTest(TestCase):
+    """
+    API REST: paginación por cursor y datos privados visibles solo para el
+    personal y para el propio doctor
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre='Reumatología')
+        cls.doctores = [crear_doctor(f'reuma{numero}', cls.especialidad) for numero in range(5)]
+        cls.paciente = crear_usuario('paciente')
+        cls.recepcion = crear_usuario('recepcion', 'recepcion')
+        fecha = proximo_lunes()
+        for dia, doctor in enumerate(cls.doctores[:3]):
+            ExcepcionHorario.objects.create(
+                doctor=doctor, motivo='Cita médica personal',
+                fecha_inicio=momento(fecha + timedelta(days=dia), 8),
+                fecha_fin=momento(fecha + timedelta(days=dia), 9)
+            )
+
+    def leer_todo(self, url, **params):
+        paginas, filas = 0, []
+        respuesta = self.client.get(url, params).json()
+        while True:
+            paginas += 1
+            filas.extend(respuesta['results'])
+            if not respuesta['next']:
+                return paginas, filas
+            respuesta = self.client.get(respuesta['next']).json()
+
+    def test_paginacion_por_cursor_recorre_todo_sin_repetir(self):
+        self.client.force_login(self.recepcion)
+        paginas, doctores = self.leer_todo(reverse('doctor-list'), cantidad=2)
+        self.assertEqual(paginas, 3)
+        self.assertEqual([doctor['id'] for doctor in doctores], sorted(doctor.pk for doctor in self.doctores))
+
+        paginas, excepciones = self.leer_todo(reverse('excepcion-list'), cantidad=2)
+        self.assertEqual(paginas, 2)
+        inicios = [excepcion['fecha_inicio'] for excepcion in excepciones]
+        self.assertEqual(inicios, sorted(inicios))
+
+    def test_pagina_sin_conteo(self):
+        self.client.force_login(self.recepcion)
+        respuesta = self.client.get(reverse('doctor-list'), {'cantidad': 2}).json()
+        self.assertNotIn('count', respuesta)
+        self.assertIsNone(respuesta['previous'])
+
+    def test_paciente_no_ve_datos_privados(self):
+        self.client.force_login(self.paciente)
+        doctor = self.client.get(reverse('doctor-list')).json()['results'][0]
+        self.assertNotIn('email', doctor)
+        self.assertNotIn('numero_licencia', doctor)
+        self.assertIn('nombre_completo', doctor)
+
+        excepcion = self.client.get(reverse('excepcion-list')).json()['results'][0]
+        self.assertNotIn('motivo', excepcion)
+
+    def test_recepcion_ve_datos_privados(self):
+        self.client.force_login(self.recepcion)
+        doctor = self.client.get(reverse('doctor-list')).json()['results'][0]
+        self.assertEqual(doctor['email'], 'reuma0@agenda.com')
+        self.assertEqual(self.client.get(reverse('excepcion-list')).json()['results'][0]['motivo'], 'Cita médica personal')
+
+    def test_doctor_solo_ve_sus_propios_datos_privados(self):
+        propio = self.doctores[0]
+        self.client.force_login(propio.usuario)
+        doctores = self.client.get(reverse('doctor-list')).json()['results']
+        con_email = [doctor['id'] for doctor in doctores if 'email' in doctor]
+        self.assertEqual(con_email, [propio.pk])
+
+        excepciones = self.client.get(reverse('excepcion-list')).json()['results']
+        con_motivo = [excepcion['doctor'] for excepcion in excepciones if 'motivo' in excepcion]
+        self.assertEqual(con_motivo, [propio.pk])
+
+
+class CacheDisponibilidadTest(TestCase):
+    """
+    La caché de disponibilidad se invalida cambiando la versión del doctor,
+    y solo cuando la transacción que modificó su agenda se confirma
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre='Pediatría')
+        cls.doctor = crear_doctor('pediatra', cls.especialidad)
+        cls.paciente = crear_usuario('paciente')
+        cls.fecha = proximo_lunes()
+
+    def setUp(self):
+        for alias in ('default', 'disponibilidad'):
+            caches[alias].clear()
+
+    def version(self):
+        return cache_disponibilidad.obtener_versiones([self.doctor.pk])[self.doctor.pk]
+
+    def test_version_estable_hasta_invalidar(self):
+        version = self.version()
+        self.assertEqual(self.version(), version)
+
+        cache_disponibilidad.guardar({(self.doctor.pk, self.fecha): ['franjas']}, {self.doctor.pk: version})
+        self.assertEqual(
+            cache_disponibilidad.leer([self.doctor.pk], [self.fecha], {self.doctor.pk: version}),
+            {(self.doctor.pk, self.fecha): ['franjas']}
+        )
+
+        cache_disponibilidad.invalidar_doctor(self.doctor.pk)
+        nueva = self.version()
+        self.assertNotEqual(nueva, version)
+        self.assertEqual(cache_disponibilidad.leer([self.doctor.pk], [self.fecha], {self.doctor.pk: nueva}), {})
+
+    def test_invalidacion_espera_la_confirmacion(self):
+        version = self.version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            cache_disponibilidad.invalidar_doctor_al_confirmar(self.doctor.pk)
+            self.assertEqual(self.version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(self.version(), version)
+
+    def test_segunda_lectura_sale_de_la_cache(self):
+        obtener_disponibilidad([self.doctor], self.fecha, self.fecha)
+        with CaptureQueriesContext(connection) as consultas:
+            franjas = obtener_disponibilidad([self.doctor], self.fecha, self.fecha)[self.doctor.pk][self.fecha]
+        # Solo la lectura de reservas temporales, que nunca se guarda en caché
+        self.assertEqual(len(consultas), 1)
+        self.assertEqual(len(franjas), 8)
+
+    def test_estadisticas_salen_de_las_metricas(self):
+        cache_disponibilidad.reiniciar_estadisticas()
+        obtener_disponibilidad([self.doctor], self.fecha, self.fecha + timedelta(days=1))
+        obtener_disponibilidad([self.doctor], self.fecha, self.fecha)
+        self.assertEqual(
+            cache_disponibilidad.estadisticas(), {'aciertos': 1, 'fallos': 2, 'tasa_aciertos': 0.3333}
+        )
+        # Ninguna lectura escribe contadores en la caché
+        self.assertIsNone(caches['disponibilidad'].get(f'{cache_disponibilidad.PREFIJO}:aciertos'))
+
+        cache_disponibilidad.reiniciar_estadisticas()
+        self.assertEqual(cache_disponibilidad.estadisticas()['aciertos'], 0)
+
+    def test_cita_confirmada_invalida_la_cache(self):
+        obtener_disponibilidad([self.doctor], self.fecha, self.fecha)
+        with self.captureOnCommitCallbacks(execute=True):
+            agendar_cita(self.paciente, self.doctor, momento(self.fecha, 10))
+
+        franjas = obtener_disponibilidad([self.doctor], self.fecha, self.fecha)[self.doctor.pk][self.fecha]
+        self.assertEqual(
+            [franja['hora'] for franja in franjas if franja['estado'] == ESTADO_OCUPADO], [time(10)]
+        )
+
+
+class MaterializacionFranjasTest(TestCase):
+    """
+    La tabla de franjas precalculadas sigue los cambios de los horarios,
+    incluso cuando un horario cambia de día o de doctor
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre='Neurología')
+        cls.fecha = proximo_lunes()
+
+    def setUp(self):
+        for alias in ('default', 'disponibilidad'):
+            caches[alias].clear()
+        self.d1 = crear_doctor('neuro1', self.especialidad)
+        self.d2 = crear_doctor('neuro2', self.especialidad, horario=None)
+        self.horario = self.d1.horarios_atencion.get()
+
+    def dias_materializados(self, doctor):
+        return set(FranjaHoraria.objects.filter(doctor=doctor).values_list('fecha__week_day', flat=True))
+
+    def test_primer_horario_materializa_el_horizonte(self):
+        self.d1.refresh_from_db()
+        self.assertIsNotNone(self.d1.franjas_hasta)
+        self.assertEqual(FranjaHoraria.objects.filter(doctor=self.d1, fecha=self.fecha).count(), 8)
+
+    def test_cambio_de_dia_reescribe_ambos_dias(self):
+        self.horario.dia_semana = 1
+        self.horario.save()
+
+        # week_day: 1=domingo, 2=lunes, 3=martes
+        self.assertEqual(self.dias_materializados(self.d1), {3})
+
+    def test_cambio_de_doctor_limpia_al_doctor_anterior(self):
+        obtener_disponibilidad([self.d1], self.fecha, self.fecha)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.horario.doctor = self.d2
+            self.horario.save()
+
+        self.assertFalse(FranjaHoraria.objects.filter(doctor=self.d1).exists())
+        self.assertEqual(self.dias_materializados(self.d2), {2})
+        self.d1.refresh_from_db()
+        disponibilidad = obtener_disponibilidad([self.d1, self.d2], self.fecha, self.fecha)
+        self.assertEqual(disponibilidad[self.d1.pk], {})
+        self.assertEqual(len(disponibilidad[self.d2.pk][self.fecha]), 8)
+
+    def test_eliminar_horario_borra_sus_franjas(self):
+        self.horario.delete()
+        self.assertFalse(FranjaHoraria.objects.filter(doctor=self.d1).exists())
+
+
+class BusquedaDoctoresTest(TestCase):
+    """
+    El directorio público busca por nombre, especialidad y consultorio; el
+    email y la licencia solo los busca el personal
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiologia = Especialidad.objects.create(nombre='Cardiología')
+        cls.doctor = crear_doctor('ana', cls.cardiologia, consultorio='Consultorio 204')
+        cls.otro = crear_doctor('bruno', Especialidad.objects.create(nombre='Pediatría'))
+        cls.administrador = crear_usuario('admin', 'administrador')
+
+    def directorio(self, texto):
+        respuesta = self.client.get(reverse('doctores:directorio_doctores'), {'busqueda': texto})
+        return [doctor.pk for doctor in respuesta.context['page_obj']]
+
+    def lista(self, texto):
+        self.client.force_login(self.administrador)
+        respuesta = self.client.get(reverse('doctores:lista_doctores'), {'busqueda': texto})
+        return [doctor.pk for doctor in respuesta.context['page_obj']]
+
+    def test_documentos(self):
+        self.assertEqual(self.doctor.documento_busqueda, 'Ana Prueba Cardiología Consultorio 204')
+        self.assertEqual(self.doctor.documento_privado, 'ana@agenda.com LIC-ana')
+
+    def test_directorio_busca_datos_publicos(self):
+        for texto in ('ana', 'cardio', 'Cardiologia', 'consultorio 204', 'ana card'):
+            with self.subTest(texto=texto):
+                self.assertEqual(self.directorio(texto), [self.doctor.pk])
+
+    def test_directorio_no_busca_email_ni_licencia(self):
+        for texto in ('ana@agenda.com', 'agenda', 'LIC-ana', 'lic'):
+            with self.subTest(texto=texto):
+                self.assertEqual(self.directorio(texto), [])
+
+    def test_personal_busca_email_y_licencia(self):
+        self.assertEqual(self.lista('ana@agenda.com'), [self.doctor.pk])
+        self.assertEqual(self.lista('lic bruno'), [self.otro.pk])
+        self.assertEqual(self.lista('pediatría'), [self.otro.pk])
+
+    def test_documentos_siguen_al_usuario(self):
+        usuario = self.doctor.usuario
+        usuario.email = 'cardio.ana@clinica.com'
+        usuario.save()
+
+        self.assertEqual(
+            list(busqueda.buscar_doctores(Doctor.objects.all(), 'clinica', incluir_privados=True)),
+            [self.doctor]
+        )
+        self.assertEqual(list(busqueda.buscar_doctores(Doctor.objects.all(), 'clinica')), [])
+
+    def test_relevancia_sale_de_un_solo_join(self):
+        if not busqueda.fts_disponible():
+            self.skipTest('La base de datos no tiene la tabla FTS5 de doctores')
+        # "cardiología" aparece dos veces en el documento de este doctor
+        especialista = crear_doctor('carla', self.cardiologia, consultorio='Cardiología 1')
+        doctores = busqueda.buscar_doctores(Doctor.objects.all(), 'cardiologia')
+
+        self.assertEqual(list(doctores), [especialista, self.doctor])
+        self.assertEqual(str(doctores.query).count('MATCH'), 1)
+
+    def test_post_migrate_restaura_triggers(self):
+        if not busqueda.fts_disponible():
+            self.skipTest('La base de datos no tiene la tabla FTS5 de doctores')
+        with connection.cursor() as cursor:
+            for sufijo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER {busqueda.TABLA_FTS}_{sufijo}')
+        tardio = crear_doctor('tardio', self.cardiologia)
+
+        busqueda.restaurar_triggers(using=connection.alias)
+
+        self.assertEqual(self.directorio('tardio'), [tardio.pk])
+        tardio.delete()
+        self.assertEqual(self.directorio('tardio'), [])
+
+
+class CalendarioCitasConsultasTest(TestCase):
+    """
+    HU0012: El calendario de todos los doctores debe resolverse con un número
+    fijo de consultas, sin importar cuántos doctores haya en la clínica
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre='Dermatología')
+        cls.recepcion = Usuario.objects.create_user(
+            email='recepcion@agenda.com', username='recepcion',
+            first_name='Ana', last_name='Recepción', tipo_usuario='recepcion'
+        )
+        cls.paciente = Usuario.objects.create_user(
+            email='paciente@agenda.com', username='paciente',
+            first_name='Pedro', last_name='Paciente', tipo_usuario='paciente'
+        )
+        hoy = timezone.localdate()
+        # Próximo lunes, para que todos los doctores tengan horario ese día
+        cls.fecha = hoy + timedelta(days=7 - hoy.weekday())
+        cls.cantidad_doctores = 0
+
+    def setUp(self):
+        for alias in ('default', 'disponibilidad'):
+            caches[alias].clear()
+        self.client.force_login(self.recepcion)
+
+    def crear_doctores(self, cantidad):
+        for _ in range(cantidad):
+            self.cantidad_doctores += 1
+            numero = self.cantidad_doctores
+            usuario = Usuario.objects.create_user(
+                email=f'doctor{numero}@agenda.com', username=f'doctor{numero}',
+                first_name='Doctor', last_name=str(numero), tipo_usuario='doctor'
+            )
+            doctor = Doctor.objects.create(
+                usuario=usuario, especialidad=self.especialidad, numero_licencia=f'LIC-{numero}'
+            )
+            HorarioAtencion.objects.create(
+                doctor=doctor, dia_semana=0, hora_inicio=time(8), hora_fin=time(12), duracion_cita=30
+            )
+            # Cada doctor queda con una cita a las 9:00 de un paciente distinto
+            paciente = self.paciente if numero == 1 else Usuario.objects.create_user(
+                email=f'paciente{numero}@agenda.com', username=f'paciente{numero}',
+                first_name='Paciente', last_name=str(numero), tipo_usuario='paciente'
+            )
+            agendar_cita(paciente, doctor, timezone.make_aware(datetime.combine(self.fecha, time(9))))
+
+    def consultas_calendario(self):
+        caches['disponibilidad'].clear()
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('doctores:calendario_citas'), {'fecha': self.fecha})
+        self.assertEqual(response.status_code, 200)
+        return response, len(consultas)
+
+    def test_consultas_no_crecen_con_los_doctores(self):
+        self.crear_doctores(2)
+        response, pocos = self.consultas_calendario()
+        self.assertEqual(len(response.context['doctores']), 2)
+
+        self.crear_doctores(10)
+        response, muchos = self.consultas_calendario()
+        self.assertEqual(len(response.context['doctores']), 12)
+
+        self.assertEqual(pocos, muchos)
+        self.assertLessEqual(muchos, 10)
+
+    def test_grilla_muestra_citas_de_cada_doctor(self):
+        self.crear_doctores(3)
+        response, _ = self.consultas_calendario()
+
+        filas = dict(response.context['grilla'])
+        self.assertEqual(len(filas), 8)
+        self.assertEqual([franja['estado'] for franja in filas[time(9)]], ['ocupado'] * 3)
+        self.assertEqual(filas[time(9)][0]['paciente'], 'Pedro Paciente')
+        self.assertEqual([franja['estado'] for franja in filas[time(8)]], ['disponible'] * 3)
@@ -21,11 +21,18 @@ urlpatterns = [
     
     # URLs para calendario (HU0012)
     path('calendario/', views.calendario_citas, name='calendario_citas'),
+    path('calendario/<str:token>/agenda.ics', views.calendario_ical_doctor, name='calendario_ical_doctor'),
     
     # URLs para consulta de disponibilidad (HU0001)
     path('disponibilidad/', views.consultar_disponibilidad, name='consultar_disponibilidad'),
+    path('disponibilidad/exportar/', views.exportar_disponibilidad, name='exportar_disponibilidad'),
+    
+    # Directorio público de doctores
+    path('directorio/', views.directorio_doctores, name='directorio_doctores'),
     
     # URLs AJAX
     path('api/<int:doctor_id>/horarios/', views.obtener_horarios_doctor, name='obtener_horarios_doctor'),
     path('api/<int:doctor_id>/excepciones/', views.obtener_excepciones_doctor, name='obtener_excepciones_doctor'),
+    path('api/proximas-franjas/', views.proximas_franjas_disponibles, name='proximas_franjas_disponibles'),
+    path('api/cache-disponibilidad/', views.estadisticas_cache_disponibilidad, name='estadisticas_cache_disponibilidad'),
 ] 
\ No newline at end of file
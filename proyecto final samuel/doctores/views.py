@@ -1,23 +1,48 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponseRedirect
+from django.http import JsonResponse, HttpResponseRedirect, StreamingHttpResponse, Http404
 from django.utils import timezone
-from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import Coalesce
+from django.template.defaultfilters import pluralize
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+import json
 from datetime import datetime, timedelta
 
 from .models import Doctor, Especialidad, HorarioAtencion, ExcepcionHorario
 from .forms import (
     CrearDoctorForm, EditarDoctorForm, HorarioAtencionForm, 
-    ExcepcionHorarioForm, FiltroCalendarioForm, ConsultaDisponibilidadForm
+    ExcepcionHorarioForm, FiltroCalendarioForm, ConsultaDisponibilidadForm,
+    ProximaDisponibilidadForm, ExportarDisponibilidadForm
 )
+from .disponibilidad import (
+    ESTADO_DISPONIBLE, buscar_proximas_franjas, grilla_dia, obtener_disponibilidad,
+    rango_fechas
+)
+from citas.conflictos import ACCION_CANCELAR, resolver_conflictos
+from citas.models import Cita
+from . import cache_disponibilidad, calendario_ical
+from .busqueda import buscar_doctores
+from .paginacion import PaginaSinConteo
+
+DOCTORES_POR_PAGINA = 10
+DIRECTORIO_POR_PAGINA = 20
 
 def es_administrador(user):
     """Verifica si el usuario es administrador"""
     return user.is_authenticated and user.es_administrador()
 
+def citas_futuras(doctor):
+    """Citas del doctor que aún no ocurren y no fueron canceladas (índice cita_doctor_inicio_idx)"""
+    return Cita.objects.filter(
+        doctor=doctor,
+        fecha_hora_inicio__gte=timezone.now()
+    ).exclude(estado='cancelada')
+
 def es_doctor_o_admin(user):
     """Verifica si el usuario es doctor o administrador"""
     return user.is_authenticated and (user.es_doctor() or user.es_administrador())
@@ -34,31 +59,27 @@ def lista_doctores(request):
     """
     HU0011: Lista todos los doctores para administradores
     """
-    doctores = Doctor.objects.select_related('usuario', 'especialidad').all()
+    # La cantidad de horarios va en la misma consulta que la página
+    doctores = Doctor.objects.select_related('usuario', 'especialidad').annotate(
+        cantidad_horarios=Count('horarios_atencion')
+    )
     
     # Filtros de búsqueda
     busqueda = request.GET.get('busqueda', '')
     especialidad_id = request.GET.get('especialidad', '')
     activo = request.GET.get('activo', '')
     
-    if busqueda:
-        doctores = doctores.filter(
-            Q(usuario__first_name__icontains=busqueda) |
-            Q(usuario__last_name__icontains=busqueda) |
-            Q(usuario__email__icontains=busqueda) |
-            Q(numero_licencia__icontains=busqueda)
-        )
-    
     if especialidad_id:
         doctores = doctores.filter(especialidad_id=especialidad_id)
     
     if activo:
         doctores = doctores.filter(activo=activo == 'true')
     
-    # Paginación
-    paginator = Paginator(doctores, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if busqueda:
+        doctores = buscar_doctores(doctores, busqueda, incluir_privados=True)
+    
+    # Paginación sin COUNT(*): una sola consulta por página
+    page_obj = PaginaSinConteo(doctores, request.GET.get('page'), DOCTORES_POR_PAGINA)
     
     especialidades = Especialidad.objects.filter(activa=True)
     
@@ -101,7 +122,7 @@ def editar_doctor(request, doctor_id):
     """
     HU0011: Editar información de un doctor existente
     """
-    doctor = get_object_or_404(Doctor, id=doctor_id)
+    doctor = get_object_or_404(Doctor.objects.select_related('usuario', 'especialidad'), id=doctor_id)
     
     if request.method == 'POST':
         form = EditarDoctorForm(request.POST, instance=doctor)
@@ -121,6 +142,7 @@ def editar_doctor(request, doctor_id):
     context = {
         'form': form,
         'doctor': doctor,
+        'citas_futuras': citas_futuras(doctor).count(),
     }
     
     return render(request, 'doctores/editar_doctor.html', context)
@@ -133,10 +155,16 @@ def eliminar_doctor(request, doctor_id):
     """
     doctor = get_object_or_404(Doctor, id=doctor_id)
     
-    # TODO: Verificar si tiene citas futuras cuando se implemente el modelo Cita
-    # Por ahora solo desactivamos
-    
     if request.method == 'POST':
+        pendientes = citas_futuras(doctor).count()
+        if pendientes:
+            messages.error(
+                request,
+                f'El Dr. {doctor.get_nombre_completo()} tiene {pendientes} cita{pluralize(pendientes)} '
+                f'próxima{pluralize(pendientes)}. Cancélalas antes de desactivarlo.'
+            )
+            return redirect('doctores:editar_doctor', doctor_id=doctor.id)
+        
         try:
             doctor.activo = False
             doctor.save()
@@ -163,14 +191,16 @@ def gestionar_horarios(request):
     """
     HU0007: Gestionar horarios de atención del doctor
     """
-    # Obtener el doctor actual
+    # Obtener el doctor actual (cargado por DoctorActualMiddleware)
     if request.user.es_doctor():
-        doctor = get_object_or_404(Doctor, usuario=request.user)
+        doctor = request.doctor
+        if not doctor:
+            raise Http404('El usuario no tiene perfil de doctor')
     else:
         # Si es admin, puede gestionar horarios de cualquier doctor
         doctor_id = request.GET.get('doctor_id')
         if doctor_id:
-            doctor = get_object_or_404(Doctor, id=doctor_id)
+            doctor = get_object_or_404(Doctor.objects.select_related('usuario', 'especialidad'), id=doctor_id)
         else:
             # Si no se especifica doctor_id, redirigir a la lista de doctores
             messages.info(request, 'Selecciona un doctor para gestionar sus horarios.')
@@ -178,6 +208,14 @@ def gestionar_horarios(request):
     
     horarios = HorarioAtencion.objects.filter(doctor=doctor).order_by('dia_semana')
     
+    if request.method == 'POST' and 'regenerar_calendario' in request.POST:
+        # Revoca la URL del calendario anterior (por ejemplo, si se compartió)
+        calendario_ical.rotar_clave(doctor)
+        messages.success(request, 'Se generó una nueva dirección de calendario; la anterior dejó de funcionar.')
+        if request.user.es_administrador():
+            return redirect(f'{request.path}?doctor_id={doctor.id}')
+        return redirect('doctores:gestionar_horarios')
+    
     if request.method == 'POST':
         form = HorarioAtencionForm(request.POST)
         if form.is_valid():
@@ -195,10 +233,16 @@ def gestionar_horarios(request):
     else:
         form = HorarioAtencionForm()
     
+    url_calendario = request.build_absolute_uri(reverse(
+        'doctores:calendario_ical_doctor',
+        args=[calendario_ical.token_doctor(doctor)]
+    ))
+    
     context = {
         'doctor': doctor,
         'horarios': horarios,
         'form': form,
+        'url_calendario': url_calendario,
     }
     
     return render(request, 'doctores/gestionar_horarios.html', context)
@@ -209,12 +253,16 @@ def editar_horario(request, horario_id):
     """
     HU0007: Editar un horario específico
     """
-    horario = get_object_or_404(HorarioAtencion, id=horario_id)
+    horarios = HorarioAtencion.objects.select_related('doctor__usuario', 'doctor__especialidad')
     
-    # Verificar permisos
-    if request.user.es_doctor() and horario.doctor.usuario != request.user:
-        messages.error(request, 'No tienes permisos para editar este horario.')
-        return redirect('doctores:gestionar_horarios')
+    # Verificar permisos: un doctor solo encuentra sus propios horarios
+    if request.user.es_doctor():
+        horario = horarios.filter(id=horario_id, doctor__usuario=request.user).first()
+        if horario is None:
+            messages.error(request, 'No tienes permisos para editar este horario.')
+            return redirect('doctores:gestionar_horarios')
+    else:
+        horario = get_object_or_404(horarios, id=horario_id)
     
     if request.method == 'POST':
         form = HorarioAtencionForm(request.POST, instance=horario)
@@ -225,7 +273,7 @@ def editar_horario(request, horario_id):
                 
                 # Redirigir según el tipo de usuario
                 if request.user.es_administrador():
-                    url = reverse('doctores:gestionar_horarios') + f'?doctor_id={horario.doctor.id}'
+                    url = reverse('doctores:gestionar_horarios') + f'?doctor_id={horario.doctor_id}'
                     return HttpResponseRedirect(url)
                 else:
                     return redirect('doctores:gestionar_horarios')
@@ -247,16 +295,20 @@ def eliminar_horario(request, horario_id):
     """
     HU0007: Eliminar un horario
     """
-    horario = get_object_or_404(HorarioAtencion, id=horario_id)
+    horarios = HorarioAtencion.objects.select_related('doctor__usuario')
     
-    # Verificar permisos
-    if request.user.es_doctor() and horario.doctor.usuario != request.user:
-        messages.error(request, 'No tienes permisos para eliminar este horario.')
-        return redirect('doctores:gestionar_horarios')
+    # Verificar permisos: un doctor solo encuentra sus propios horarios
+    if request.user.es_doctor():
+        horario = horarios.filter(id=horario_id, doctor__usuario=request.user).first()
+        if horario is None:
+            messages.error(request, 'No tienes permisos para eliminar este horario.')
+            return redirect('doctores:gestionar_horarios')
+    else:
+        horario = get_object_or_404(horarios, id=horario_id)
     
     if request.method == 'POST':
         try:
-            doctor_id = horario.doctor.id
+            doctor_id = horario.doctor_id
             horario.delete()
             messages.success(request, 'Horario eliminado exitosamente.')
             
@@ -283,14 +335,16 @@ def gestionar_excepciones(request):
     """
     HU0008: Gestionar excepciones de horario
     """
-    # Obtener el doctor actual
+    # Obtener el doctor actual (cargado por DoctorActualMiddleware)
     if request.user.es_doctor():
-        doctor = get_object_or_404(Doctor, usuario=request.user)
+        doctor = request.doctor
+        if not doctor:
+            raise Http404('El usuario no tiene perfil de doctor')
     else:
         # Si es admin, puede gestionar excepciones de cualquier doctor
         doctor_id = request.GET.get('doctor_id')
         if doctor_id:
-            doctor = get_object_or_404(Doctor, id=doctor_id)
+            doctor = get_object_or_404(Doctor.objects.select_related('usuario', 'especialidad'), id=doctor_id)
         else:
             # Si no se especifica doctor_id, redirigir a la lista de doctores
             messages.info(request, 'Selecciona un doctor para gestionar sus excepciones.')
@@ -308,8 +362,21 @@ def gestionar_excepciones(request):
             excepcion.doctor = doctor
             excepcion.creado_por = request.user
             try:
-                excepcion.save()
+                # La excepción y las citas que bloquea cambian juntas
+                with transaction.atomic():
+                    excepcion.save()
+                    afectadas = resolver_conflictos([excepcion], form.cleaned_data['accion_citas'])
                 messages.success(request, 'Excepción de horario registrada exitosamente.')
+                if afectadas:
+                    plural = pluralize(len(afectadas))
+                    if form.cleaned_data['accion_citas'] == ACCION_CANCELAR:
+                        accion = f'cancelada{plural}'
+                    else:
+                        accion = f'marcada{plural} para reprogramar'
+                    messages.warning(
+                        request,
+                        f'{len(afectadas)} cita{plural} {accion}; los pacientes serán notificados.'
+                    )
                 if request.user.es_administrador():
                     return redirect(f'{request.path}?doctor_id={doctor.id}')
                 else:
@@ -333,16 +400,20 @@ def eliminar_excepcion(request, excepcion_id):
     """
     HU0008: Eliminar una excepción de horario
     """
-    excepcion = get_object_or_404(ExcepcionHorario, id=excepcion_id)
+    excepciones = ExcepcionHorario.objects.select_related('doctor__usuario')
     
-    # Verificar permisos
-    if request.user.es_doctor() and excepcion.doctor.usuario != request.user:
-        messages.error(request, 'No tienes permisos para eliminar esta excepción.')
-        return redirect('doctores:gestionar_excepciones')
+    # Verificar permisos: un doctor solo encuentra sus propias excepciones
+    if request.user.es_doctor():
+        excepcion = excepciones.filter(id=excepcion_id, doctor__usuario=request.user).first()
+        if excepcion is None:
+            messages.error(request, 'No tienes permisos para eliminar esta excepción.')
+            return redirect('doctores:gestionar_excepciones')
+    else:
+        excepcion = get_object_or_404(excepciones, id=excepcion_id)
     
     if request.method == 'POST':
         try:
-            doctor_id = excepcion.doctor.id
+            doctor_id = excepcion.doctor_id
             excepcion.delete()
             messages.success(request, 'Excepción eliminada exitosamente.')
             
@@ -369,35 +440,41 @@ def calendario_citas(request):
     """
     HU0012: Visualizar calendario de citas
     """
-    form = FiltroCalendarioForm(request.GET or None, user=request.user)
+    form = FiltroCalendarioForm(request.GET or None, doctor=request.doctor)
     
-    fecha_seleccionada = timezone.now().date()
+    fecha_seleccionada = timezone.localdate()
     doctor_seleccionado = None
     
     if form.is_valid():
         fecha_seleccionada = form.cleaned_data['fecha']
         doctor_seleccionado = form.cleaned_data.get('doctor')
     
-    # Obtener doctores según el tipo de usuario
+    # Obtener doctores según el tipo de usuario, con su usuario y especialidad
+    # en la misma consulta porque la plantilla muestra ambos por cada doctor
     if request.user.es_doctor():
-        doctores = Doctor.objects.filter(usuario=request.user, activo=True)
-        doctor_seleccionado = doctores.first()
-    elif doctor_seleccionado:
-        doctores = [doctor_seleccionado]
+        doctores = [request.doctor] if request.doctor and request.doctor.activo else []
     else:
-        doctores = Doctor.objects.filter(activo=True)
+        doctores = Doctor.objects.filter(activo=True).select_related('usuario', 'especialidad')
+        if doctor_seleccionado:
+            doctores = doctores.filter(pk=doctor_seleccionado.pk)
+        doctores = list(doctores)
     
-    # Generar franjas horarias para la fecha seleccionada
-    franjas_por_doctor = {}
+    if request.user.es_doctor():
+        doctor_seleccionado = doctores[0] if doctores else None
     
-    for doctor in doctores:
-        franjas_por_doctor[doctor] = generar_franjas_dia(doctor, fecha_seleccionada)
+    # Franjas de todos los doctores para la fecha en un número fijo de consultas
+    disponibilidad = obtener_disponibilidad(doctores, fecha_seleccionada, fecha_seleccionada)
+    franjas_dia = {
+        doctor.pk: disponibilidad[doctor.pk].get(fecha_seleccionada, [])
+        for doctor in doctores
+    }
     
     context = {
         'form': form,
         'fecha_seleccionada': fecha_seleccionada,
         'doctor_seleccionado': doctor_seleccionado,
-        'franjas_por_doctor': franjas_por_doctor,
+        'doctores': doctores,
+        'grilla': grilla_dia([doctor.pk for doctor in doctores], franjas_dia),
     }
     
     return render(request, 'doctores/calendario_citas.html', context)
@@ -419,7 +496,7 @@ def consultar_disponibilidad(request):
         doctor_especifico = form.cleaned_data.get('doctor')
         
         # Filtrar doctores según criterios
-        doctores = Doctor.objects.filter(activo=True)
+        doctores = Doctor.objects.filter(activo=True).select_related('usuario', 'especialidad')
         
         if especialidad:
             doctores = doctores.filter(especialidad=especialidad)
@@ -428,20 +505,18 @@ def consultar_disponibilidad(request):
             doctores = doctores.filter(id=doctor_especifico.id)
         
         # Generar disponibilidad para el rango de fechas
-        fecha_actual = fecha_inicio
-        while fecha_actual <= fecha_fin:
-            for doctor in doctores:
-                if doctor not in doctores_disponibilidad:
-                    doctores_disponibilidad[doctor] = {}
-                
-                franjas = generar_franjas_dia(doctor, fecha_actual)
+        doctores = list(doctores)
+        titular = request.user if request.user.is_authenticated else None
+        disponibilidad = obtener_disponibilidad(doctores, fecha_inicio, fecha_fin, titular=titular)
+        
+        for doctor in doctores:
+            doctores_disponibilidad[doctor] = {}
+            for fecha, franjas in disponibilidad[doctor.pk].items():
                 # Solo incluir franjas disponibles
-                franjas_disponibles = [f for f in franjas if f['estado'] == 'disponible']
+                franjas_disponibles = [f for f in franjas if f['estado'] == ESTADO_DISPONIBLE]
                 
                 if franjas_disponibles:
-                    doctores_disponibilidad[doctor][fecha_actual] = franjas_disponibles
-            
-            fecha_actual += timedelta(days=1)
+                    doctores_disponibilidad[doctor][fecha] = franjas_disponibles
     
     context = {
         'form': form,
@@ -453,60 +528,227 @@ def consultar_disponibilidad(request):
     
     return render(request, 'doctores/consultar_disponibilidad.html', context)
 
-def generar_franjas_dia(doctor, fecha):
+def directorio_doctores(request):
     """
-    Genera las franjas horarias para un doctor en una fecha específica
+    Directorio público de doctores activos, con búsqueda por nombre,
+    especialidad o consultorio (no por email ni licencia)
     """
-    dia_semana = fecha.weekday()  # 0=Lunes, 6=Domingo
+    busqueda = request.GET.get('busqueda', '')
+    especialidad_id = request.GET.get('especialidad', '')
     
-    # Obtener horario del doctor para ese día
-    try:
-        horario = HorarioAtencion.objects.get(
-            doctor=doctor,
-            dia_semana=dia_semana,
-            activo=True
+    doctores = Doctor.objects.filter(
+        activo=True,
+        especialidad__activa=True
+    ).select_related('usuario', 'especialidad')
+    
+    if especialidad_id.isdigit():
+        doctores = doctores.filter(especialidad_id=especialidad_id)
+    
+    if busqueda:
+        doctores = buscar_doctores(doctores, busqueda)
+    
+    context = {
+        'page_obj': PaginaSinConteo(doctores, request.GET.get('page'), DIRECTORIO_POR_PAGINA),
+        'especialidades': Especialidad.objects.filter(activa=True),
+        'busqueda': busqueda,
+        'especialidad_seleccionada': especialidad_id,
+        # Rango por defecto del enlace a la consulta de disponibilidad
+        'fecha_inicio': timezone.localdate(),
+        'fecha_fin': timezone.localdate() + timedelta(days=7),
+    }
+    
+    return render(request, 'doctores/directorio_doctores.html', context)
+
+# Tamaño de los bloques con que se genera la exportación
+EXPORTACION_DIAS_POR_BLOQUE = 7
+EXPORTACION_DOCTORES_POR_BLOQUE = 50
+
+@login_required
+@user_passes_test(es_staff_o_admin)
+def exportar_disponibilidad(request):
+    """
+    HU0001: Exporta la disponibilidad en formato JSON lines (una línea por doctor y día)
+    Pensada para integraciones (call center): la respuesta se genera por bloques
+    de días y doctores, así que la memoria no crece con el rango y los primeros
+    datos se envían de inmediato. Recorre hasta 90 días de todos los doctores,
+    por eso solo la usan recepción y administradores; el público consulta
+    rangos cortos con consultar_disponibilidad.
+    """
+    form = ExportarDisponibilidadForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errores': form.errors}, status=400)
+    
+    doctores = Doctor.objects.filter(activo=True).select_related('usuario', 'especialidad')
+    if form.cleaned_data.get('especialidad'):
+        doctores = doctores.filter(especialidad=form.cleaned_data['especialidad'])
+    if form.cleaned_data.get('doctor'):
+        doctores = doctores.filter(id=form.cleaned_data['doctor'].id)
+    
+    lineas = generar_lineas_disponibilidad(
+        list(doctores),
+        form.cleaned_data['fecha_inicio'],
+        form.cleaned_data['fecha_fin'],
+        titular=request.user,
+    )
+    
+    response = StreamingHttpResponse(lineas, content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-store'
+    return response
+
+def generar_lineas_disponibilidad(doctores, fecha_inicio, fecha_fin, titular=None):
+    """
+    Genera una línea JSON por doctor y día con sus franjas disponibles; los
+    días sin franjas libres (sin horario o con todo tomado) se omiten.
+    Solo mantiene en memoria un bloque de días y doctores a la vez.
+    """
+    fechas = list(rango_fechas(fecha_inicio, fecha_fin))
+    for i in range(0, len(fechas), EXPORTACION_DIAS_POR_BLOQUE):
+        bloque_fechas = fechas[i:i + EXPORTACION_DIAS_POR_BLOQUE]
+        for j in range(0, len(doctores), EXPORTACION_DOCTORES_POR_BLOQUE):
+            bloque_doctores = doctores[j:j + EXPORTACION_DOCTORES_POR_BLOQUE]
+            disponibilidad = obtener_disponibilidad(
+                bloque_doctores, bloque_fechas[0], bloque_fechas[-1], titular=titular
+            )
+            
+            for fecha in bloque_fechas:
+                for doctor in bloque_doctores:
+                    libres = [
+                        franja for franja in disponibilidad[doctor.pk].get(fecha, [])
+                        if franja['estado'] == ESTADO_DISPONIBLE
+                    ]
+                    if not libres:
+                        continue
+                    
+                    yield json.dumps({
+                        'doctor_id': doctor.pk,
+                        'doctor': doctor.get_nombre_completo(),
+                        'especialidad': doctor.especialidad.nombre,
+                        'fecha': fecha.isoformat(),
+                        'franjas': [
+                            {
+                                'hora': franja['hora'].strftime('%H:%M'),
+                                'inicio': timezone.localtime(franja['inicio']).isoformat(),
+                                'fin': timezone.localtime(franja['fin']).isoformat(),
+                            }
+                            for franja in libres
+                        ],
+                    }, ensure_ascii=False) + '\n'
+
+def calendario_ical_doctor(request, token):
+    """
+    Calendario iCalendar de la agenda del doctor, accesible con su URL privada
+    Responde 304 sin generar el calendario si el cliente ya tiene la versión vigente.
+    """
+    datos = calendario_ical.datos_desde_token(token)
+    if datos is None:
+        raise Http404('Calendario no encontrado')
+    doctor_id, clave = datos
+    doctor = get_object_or_404(
+        Doctor.objects.select_related('usuario'), id=doctor_id, clave_calendario=clave, activo=True
+    )
+    
+    ultima = calendario_ical.ultima_modificacion(doctor)
+    etag = quote_etag(calendario_ical.etiqueta_calendario(doctor, ultima))
+    
+    response = get_conditional_response(request, etag=etag, last_modified=int(ultima.timestamp()))
+    if response is None:
+        response = StreamingHttpResponse(
+            calendario_ical.generar_calendario(doctor, ultima),
+            content_type='text/calendar; charset=utf-8'
         )
-    except HorarioAtencion.DoesNotExist:
-        return []
-    
-    # Generar franjas cada X minutos según la duración de cita
-    franjas = []
-    hora_actual = datetime.combine(fecha, horario.hora_inicio)
-    hora_fin = datetime.combine(fecha, horario.hora_fin)
-    
-    while hora_actual < hora_fin:
-        # Verificar si hay excepción en esta franja
-        hay_excepcion = ExcepcionHorario.objects.filter(
-            doctor=doctor,
-            fecha_inicio__lte=hora_actual,
-            fecha_fin__gt=hora_actual
-        ).exists()
-        
-        # TODO: Verificar si hay cita confirmada en esta franja
-        # cuando se implemente el modelo Cita
-        hay_cita = False
-        
-        estado = 'no_disponible' if hay_excepcion else ('ocupado' if hay_cita else 'disponible')
-        
-        franjas.append({
-            'hora': hora_actual.time(),
-            'estado': estado,
-            'paciente': None,  # TODO: Obtener paciente cuando se implemente
-        })
-        
-        hora_actual += timedelta(minutes=horario.duracion_cita)
+        response['Content-Disposition'] = f'inline; filename="agenda-{doctor.pk}.ics"'
     
-    return franjas
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(ultima.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 # ==================== VISTAS AJAX ====================
 
+@login_required
+def proximas_franjas_disponibles(request):
+    """
+    Vista AJAX con las próximas franjas libres de una especialidad o doctor,
+    en orden cronológico entre todos los doctores que cumplen el filtro
+    Cada búsqueda puede recorrer varias semanas de agenda, así que, como las
+    demás vistas AJAX, requiere sesión.
+    """
+    form = ProximaDisponibilidadForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errores': form.errors}, status=400)
+    
+    doctores = Doctor.objects.filter(activo=True).select_related('usuario', 'especialidad')
+    if form.cleaned_data.get('especialidad'):
+        doctores = doctores.filter(especialidad=form.cleaned_data['especialidad'])
+    if form.cleaned_data.get('doctor'):
+        doctores = doctores.filter(id=form.cleaned_data['doctor'].id)
+    doctores = {doctor.pk: doctor for doctor in doctores}
+    
+    resultados = buscar_proximas_franjas(
+        doctores.values(),
+        cantidad=form.cleaned_data.get('cantidad') or 10,
+        hora_desde=form.cleaned_data.get('hora_desde'),
+        hora_hasta=form.cleaned_data.get('hora_hasta'),
+        titular=request.user,
+    )
+    
+    data = []
+    for doctor_id, franja in resultados:
+        doctor = doctores[doctor_id]
+        inicio = timezone.localtime(franja['inicio'])
+        data.append({
+            'doctor_id': doctor_id,
+            'doctor': doctor.get_nombre_completo(),
+            'especialidad': doctor.especialidad.nombre,
+            'fecha': inicio.date().isoformat(),
+            'hora': inicio.strftime('%H:%M'),
+            'inicio': inicio.isoformat(),
+            'fin': timezone.localtime(franja['fin']).isoformat(),
+        })
+    
+    return JsonResponse({'franjas': data})
+
+def respuesta_condicional(request, doctor_id):
+    """
+    Calcula un validador barato de la agenda del doctor (una consulta por
+    clave primaria) y retorna (respuesta_304, etag). Se basa en
+    Doctor.agenda_actualizada, que las señales actualizan en cada alta,
+    cambio o borrado de horarios, excepciones y citas; un Max sobre las
+    filas que quedan bajaría al borrar la más reciente. Solo se usa ETag,
+    con microsegundos: un Last-Modified en segundos no distingue dos
+    cambios dentro del mismo segundo.
+    La respuesta es None si el cliente no tiene la versión vigente.
+    Lanza Http404 si el doctor no existe.
+    """
+    ultima = Doctor.objects.filter(pk=doctor_id).values_list(
+        Coalesce('agenda_actualizada', 'fecha_actualizacion'), flat=True
+    ).first()
+    if ultima is None:
+        raise Http404('Doctor no encontrado')
+    etag = quote_etag(f'{doctor_id}-{int(ultima.timestamp() * 1000000)}')
+    return get_conditional_response(request, etag=etag), etag
+
+def con_cabeceras_cache(response, etag):
+    """
+    Agrega el validador y las cabeceras para que solo la caché del navegador
+    del usuario guarde la respuesta, revalidándola en cada uso
+    """
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
 @login_required
 def obtener_horarios_doctor(request, doctor_id):
     """
     Vista AJAX para obtener horarios de un doctor específico
+    Responde 304 sin cargar los horarios si no cambiaron desde la última consulta.
     """
-    doctor = get_object_or_404(Doctor, id=doctor_id)
-    horarios = HorarioAtencion.objects.filter(doctor=doctor, activo=True)
+    no_modificado, etag = respuesta_condicional(request, doctor_id)
+    if no_modificado is not None:
+        return con_cabeceras_cache(no_modificado, etag)
+    
+    horarios = HorarioAtencion.objects.filter(doctor_id=doctor_id, activo=True)
     
     data = []
     for horario in horarios:
@@ -518,24 +760,28 @@ def obtener_horarios_doctor(request, doctor_id):
             'duracion_cita': horario.duracion_cita,
         })
     
-    return JsonResponse({'horarios': data})
+    return con_cabeceras_cache(JsonResponse({'horarios': data}), etag)
 
 @login_required
 def obtener_excepciones_doctor(request, doctor_id):
     """
     Vista AJAX para obtener excepciones de un doctor específico
+    Responde 304 sin cargar las excepciones si no cambiaron desde la última consulta.
     """
-    doctor = get_object_or_404(Doctor, id=doctor_id)
     fecha_inicio = request.GET.get('fecha_inicio')
     fecha_fin = request.GET.get('fecha_fin')
     
-    excepciones = ExcepcionHorario.objects.filter(doctor=doctor)
+    excepciones = ExcepcionHorario.objects.filter(doctor_id=doctor_id)
     
     if fecha_inicio:
         excepciones = excepciones.filter(fecha_fin__gte=fecha_inicio)
     if fecha_fin:
         excepciones = excepciones.filter(fecha_inicio__lte=fecha_fin)
     
+    no_modificado, etag = respuesta_condicional(request, doctor_id)
+    if no_modificado is not None:
+        return con_cabeceras_cache(no_modificado, etag)
+    
     data = []
     for excepcion in excepciones:
         data.append({
@@ -547,4 +793,15 @@ def obtener_excepciones_doctor(request, doctor_id):
             'todo_el_dia': excepcion.todo_el_dia,
         })
     
-    return JsonResponse({'excepciones': data})
+    return con_cabeceras_cache(JsonResponse({'excepciones': data}), etag)
+
+@login_required
+@user_passes_test(es_administrador)
+def estadisticas_cache_disponibilidad(request):
+    """
+    Vista AJAX con los contadores de aciertos y fallos de la caché de disponibilidad
+    """
+    if request.method == 'POST' and request.POST.get('reiniciar'):
+        cache_disponibilidad.reiniciar_estadisticas()
+    
+    return JsonResponse(cache_disponibilidad.estadisticas())
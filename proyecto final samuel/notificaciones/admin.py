@@ -1,3 +1,26 @@
 from django.contrib import admin
+from .models import Notificacion
 
-# Register your models here.
+@admin.register(Notificacion)
+class NotificacionAdmin(admin.ModelAdmin):
+    list_display = [
+        'destinatario', 'tipo', 'canal', 'estado', 'intentos', 'disponible_desde', 'fecha_envio'
+    ]
+    list_filter = ['estado', 'tipo', 'canal']
+    search_fields = ['destinatario', 'asunto']
+    ordering = ['-fecha_creacion']
+    
+    fieldsets = (
+        ('Mensaje', {
+            'fields': ('canal', 'tipo', 'destinatario', 'asunto', 'cuerpo')
+        }),
+        ('Entrega', {
+            'fields': ('estado', 'intentos', 'disponible_desde', 'fecha_envio', 'ultimo_error')
+        }),
+        ('Trabajador', {
+            'fields': ('reclamada_por', 'reclamada_en', 'fecha_creacion'),
+            'classes': ('collapse',)
+        }),
+    )
+    
+    readonly_fields = ['reclamada_por', 'reclamada_en', 'fecha_creacion']
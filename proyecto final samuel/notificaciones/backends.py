@@ -0,0 +1,71 @@
+"""
+Backends de envío de la bandeja de salida
+
+Cada canal usa la clase indicada en settings.NOTIFICACIONES_BACKENDS. El
+trabajador crea una instancia por hilo y la usa como context manager:
+abrir() al empezar el grupo, enviar() por cada notificación (lanzando una
+excepción si falla) y cerrar() al terminar. Para agregar un proveedor de
+SMS basta con una subclase de BackendNotificacion y cambiar el setting.
+"""
+import sys
+import threading
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils.module_loading import import_string
+
+
+class BackendNotificacion:
+    """Interfaz común de los backends"""
+
+    def abrir(self):
+        pass
+
+    def cerrar(self):
+        pass
+
+    def enviar(self, notificacion):
+        raise NotImplementedError
+
+    def __enter__(self):
+        self.abrir()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cerrar()
+
+
+class CorreoBackend(BackendNotificacion):
+    """Envía por el EMAIL_BACKEND de Django, con una conexión por hilo"""
+
+    def abrir(self):
+        self.conexion = get_connection()
+        self.conexion.open()
+
+    def cerrar(self):
+        self.conexion.close()
+
+    def enviar(self, notificacion):
+        EmailMessage(
+            notificacion.asunto,
+            notificacion.cuerpo,
+            settings.DEFAULT_FROM_EMAIL,
+            [notificacion.destinatario],
+            connection=self.conexion
+        ).send()
+
+
+class ConsolaSMSBackend(BackendNotificacion):
+    """Escribe los SMS en la salida estándar (desarrollo)"""
+
+    _bloqueo = threading.Lock()
+
+    def enviar(self, notificacion):
+        with self._bloqueo:
+            sys.stdout.write(f'[SMS a {notificacion.destinatario}] {notificacion.cuerpo}\n')
+            sys.stdout.flush()
+
+
+def obtener_backend(canal):
+    """Nueva instancia del backend configurado para el canal"""
+    return import_string(settings.NOTIFICACIONES_BACKENDS[canal])()
@@ -0,0 +1,9 @@
+"""
+Tareas programadas de la app notificaciones (ver CRONJOBS en settings)
+"""
+from . import recordatorios
+
+
+def enviar_recordatorios():
+    """Encola los recordatorios de las citas próximas"""
+    return recordatorios.enviar_recordatorios()
@@ -0,0 +1,108 @@
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from agenda_medica import metricas
+from notificaciones.services import enviar_lote, estado_cola, reclamar_lote, registrar_resultados
+
+class Command(BaseCommand):
+    help = 'Enviar las notificaciones de la bandeja de salida (trabajador; se pueden ejecutar varios a la vez)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=settings.NOTIFICACIONES_LOTE,
+            help='Notificaciones reclamadas por lote',
+        )
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=settings.NOTIFICACIONES_HILOS,
+            help='Hilos de envío por lote',
+        )
+        parser.add_argument(
+            '--espera',
+            type=float,
+            default=5,
+            help='Segundos de espera cuando la cola está vacía',
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Terminar cuando no queden notificaciones disponibles',
+        )
+        parser.add_argument(
+            '--reporte',
+            type=int,
+            default=60,
+            help='Segundos entre reportes de rendimiento',
+        )
+    
+    def handle(self, *args, **options):
+        trabajador = f'{socket.gethostname()}-{os.getpid()}'
+        self.stdout.write(
+            self.style.SUCCESS(f'=== Trabajador {trabajador}: lotes de {options["lote"]}, {options["hilos"]} hilos ===\n')
+        )
+        
+        totales = {'enviadas': 0, 'reintentos': 0, 'fallidas': 0}
+        retraso_maximo = 0
+        inicio = ultimo_reporte = time.monotonic()
+        enviadas_desde_reporte = 0
+        
+        try:
+            while True:
+                lote_id, notificaciones = reclamar_lote(trabajador, options['lote'])
+                if not notificaciones:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['espera'])
+                else:
+                    # Retraso: desde que la notificación quedó disponible hasta el envío
+                    ahora = timezone.now()
+                    retraso_maximo = max(
+                        retraso_maximo,
+                        max((ahora - n.disponible_desde).total_seconds() for n in notificaciones)
+                    )
+                    enviadas, reintentos, fallidas = registrar_resultados(
+                        lote_id, enviar_lote(notificaciones, options['hilos'], lote_id)
+                    )
+                    totales['enviadas'] += enviadas
+                    totales['reintentos'] += reintentos
+                    totales['fallidas'] += fallidas
+                    enviadas_desde_reporte += enviadas
+                
+                # atexit no corre si el trabajador termina con SIGTERM
+                metricas.registro.volcar_si_corresponde()
+                
+                transcurrido = time.monotonic() - ultimo_reporte
+                if transcurrido >= options['reporte']:
+                    self._reportar(enviadas_desde_reporte / transcurrido)
+                    ultimo_reporte = time.monotonic()
+                    enviadas_desde_reporte = 0
+        except KeyboardInterrupt:
+            self.stdout.write('\nDetenido por el usuario.')
+        
+        duracion = time.monotonic() - inicio
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n📊 Resumen:\n'
+                f'   - Enviadas: {totales["enviadas"]}\n'
+                f'   - Programadas para reintento: {totales["reintentos"]}\n'
+                f'   - Fallidas definitivamente: {totales["fallidas"]}\n'
+                f'   - Rendimiento: {totales["enviadas"] / duracion if duracion else 0:.1f} notificaciones/s\n'
+                f'   - Retraso máximo: {retraso_maximo:.1f} s\n'
+            )
+        )
+    
+    def _reportar(self, rendimiento):
+        cola = estado_cola()
+        pendientes = cola['por_estado'].get('pendiente', 0)
+        self.stdout.write(
+            f'{timezone.localtime():%H:%M:%S} {rendimiento:.1f} notificaciones/s, '
+            f'{pendientes} pendientes, retraso {cola["retraso"].total_seconds():.1f} s'
+        )
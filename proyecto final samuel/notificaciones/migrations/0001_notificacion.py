@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notificacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('canal', models.CharField(choices=[('email', 'Correo Electrónico'), ('sms', 'SMS')], default='email', max_length=10, verbose_name='Canal')),
+                ('tipo', models.CharField(choices=[('recordatorio', 'Recordatorio'), ('cancelacion', 'Cancelación de Cita'), ('excepcion', 'Cambio en la Agenda del Doctor'), ('otro', 'Otro')], default='otro', max_length=20, verbose_name='Tipo')),
+                ('destinatario', models.CharField(help_text='Correo electrónico o número de teléfono según el canal', max_length=254, verbose_name='Destinatario')),
+                ('asunto', models.CharField(blank=True, max_length=200, verbose_name='Asunto')),
+                ('cuerpo', models.TextField(verbose_name='Cuerpo')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('enviada', 'Enviada'), ('fallida', 'Fallida')], default='pendiente', max_length=12, verbose_name='Estado')),
+                ('intentos', models.PositiveIntegerField(default=0, verbose_name='Intentos')),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now, help_text='Momento a partir del cual se puede (re)intentar el envío', verbose_name='Disponible Desde')),
+                ('reclamada_por', models.CharField(blank=True, editable=False, help_text='Lote del trabajador que la está enviando', max_length=100, verbose_name='Reclamada Por')),
+                ('reclamada_en', models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Reclamada En')),
+                ('ultimo_error', models.TextField(blank=True, verbose_name='Último Error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_envio', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Envío')),
+            ],
+            options={
+                'verbose_name': 'Notificación',
+                'verbose_name_plural': 'Notificaciones',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(condition=models.Q(('estado', 'pendiente')), fields=['disponible_desde', 'id'], name='notificacion_pendiente_idx'), models.Index(condition=models.Q(('estado', 'procesando')), fields=['reclamada_en'], name='notificacion_procesando_idx')],
+            },
+        ),
+    ]
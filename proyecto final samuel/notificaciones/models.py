@@ -1,3 +1,135 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 
-# Create your models here.
+
+class Notificacion(models.Model):
+    """
+    Bandeja de salida de notificaciones. Las vistas y servicios solo insertan
+    filas (ver services.encolar); el comando `procesar_notificaciones` las
+    reclama por lotes, las envía y reintenta las fallidas con espera
+    exponencial.
+    """
+    CANAL_CHOICES = [
+        ('email', 'Correo Electrónico'),
+        ('sms', 'SMS'),
+    ]
+
+    TIPO_CHOICES = [
+        ('recordatorio', 'Recordatorio'),
+        ('cancelacion', 'Cancelación de Cita'),
+        ('excepcion', 'Cambio en la Agenda del Doctor'),
+        ('otro', 'Otro'),
+    ]
+
+    ESTADO_PENDIENTE = 'pendiente'
+    ESTADO_PROCESANDO = 'procesando'
+    ESTADO_ENVIADA = 'enviada'
+    ESTADO_FALLIDA = 'fallida'
+
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, 'Pendiente'),
+        (ESTADO_PROCESANDO, 'Procesando'),
+        (ESTADO_ENVIADA, 'Enviada'),
+        (ESTADO_FALLIDA, 'Fallida'),
+    ]
+
+    canal = models.CharField(
+        max_length=10,
+        choices=CANAL_CHOICES,
+        default='email',
+        verbose_name='Canal'
+    )
+
+    tipo = models.CharField(
+        max_length=20,
+        choices=TIPO_CHOICES,
+        default='otro',
+        verbose_name='Tipo'
+    )
+
+    destinatario = models.CharField(
+        max_length=254,
+        verbose_name='Destinatario',
+        help_text='Correo electrónico o número de teléfono según el canal'
+    )
+
+    asunto = models.CharField(
+        max_length=200,
+        blank=True,
+        verbose_name='Asunto'
+    )
+
+    cuerpo = models.TextField(
+        verbose_name='Cuerpo'
+    )
+
+    estado = models.CharField(
+        max_length=12,
+        choices=ESTADO_CHOICES,
+        default=ESTADO_PENDIENTE,
+        verbose_name='Estado'
+    )
+
+    intentos = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Intentos'
+    )
+
+    disponible_desde = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Disponible Desde',
+        help_text='Momento a partir del cual se puede (re)intentar el envío'
+    )
+
+    reclamada_por = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False,
+        verbose_name='Reclamada Por',
+        help_text='Lote del trabajador que la está enviando'
+    )
+
+    reclamada_en = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Reclamada En'
+    )
+
+    ultimo_error = models.TextField(
+        blank=True,
+        verbose_name='Último Error'
+    )
+
+    fecha_creacion = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de Creación'
+    )
+
+    fecha_envio = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Fecha de Envío'
+    )
+
+    class Meta:
+        verbose_name = 'Notificación'
+        verbose_name_plural = 'Notificaciones'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            # Cola de trabajo: solo las filas que un trabajador puede reclamar
+            models.Index(
+                fields=['disponible_desde', 'id'],
+                condition=Q(estado='pendiente'),
+                name='notificacion_pendiente_idx'
+            ),
+            models.Index(
+                fields=['reclamada_en'],
+                condition=Q(estado='procesando'),
+                name='notificacion_procesando_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} a {self.destinatario} ({self.get_estado_display()})"
@@ -0,0 +1,102 @@
+"""
+Recordatorios por correo de las citas confirmadas
+
+Cada cita recibe un recordatorio del día anterior y otro 1 hora antes. El
+cron corre cada hora y cada recordatorio cubre una franja de inicio que
+llega hasta su anticipación más una hora (el intervalo del cron):
+
+- 1 hora: citas que empiezan en [ahora, ahora + 2h).
+- 24 horas: citas que empiezan en [ahora + 2h, ahora + 25h).
+
+Las franjas no se solapan. Una cita agendada con menos de 24 horas de
+anticipación recibe el recordatorio del día anterior en la siguiente
+ejecución, salvo que empiece antes de 2 horas; en ese caso solo recibe el
+de 1 hora.
+
+Las citas pendientes se leen por lotes con una consulta de rango sobre
+fecha_hora_inicio (índices parciales cita_recordatorio_*_idx). Cada lote
+se encola en la bandeja de salida (ver services.py) y sus citas se marcan
+en la misma transacción, con un INSERT y un UPDATE. Este cron no envía
+correos: el trabajador procesar_notificaciones los envía con reintentos y
+espera exponencial, así que un destinatario que el servidor SMTP rechaza
+no detiene los recordatorios de las demás citas. Una cita marcada ya no
+vuelve a aparecer, así que repetir la ejecución no duplica recordatorios.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import get_template
+from django.utils import timezone
+
+from citas.models import Cita
+from .models import Notificacion
+from .services import encolar_varias
+
+# Intervalo entre ejecuciones del cron (ver CRONJOBS)
+INTERVALO_CRON = timedelta(hours=1)
+
+# (campo de la marca, anticipación), del más lejano al más cercano
+RECORDATORIOS = [
+    ('recordatorio_24h_enviado', timedelta(hours=24)),
+    ('recordatorio_1h_enviado', timedelta(hours=1)),
+]
+
+
+def ventanas_recordatorio(ahora):
+    """Retorna [(campo, desde, hasta)] con la franja de inicio de cada recordatorio"""
+    ventanas = []
+    for indice, (campo, anticipacion) in enumerate(RECORDATORIOS):
+        if indice + 1 < len(RECORDATORIOS):
+            desde = ahora + RECORDATORIOS[indice + 1][1] + INTERVALO_CRON
+        else:
+            desde = ahora
+        ventanas.append((campo, desde, ahora + anticipacion + INTERVALO_CRON))
+    return ventanas
+
+
+def citas_pendientes(campo, desde, hasta):
+    return Cita.objects.filter(
+        estado='confirmada',
+        fecha_hora_inicio__gte=desde,
+        fecha_hora_inicio__lt=hasta,
+        **{f'{campo}__isnull': True}
+    ).select_related(
+        'paciente', 'doctor__usuario', 'doctor__especialidad'
+    ).order_by('fecha_hora_inicio', 'id')
+
+
+def mensaje_recordatorio(plantilla, cita):
+    """Notificación (sin guardar) con el recordatorio de la cita"""
+    inicio = timezone.localtime(cita.fecha_hora_inicio)
+    return Notificacion(
+        tipo='recordatorio',
+        destinatario=cita.paciente.email,
+        asunto=f'Recordatorio: cita médica el {inicio:%d/%m/%Y} a las {inicio:%H:%M}',
+        cuerpo=plantilla.render({'cita': cita, 'inicio': inicio}),
+    )
+
+
+def enviar_recordatorios(ahora=None, por_lote=None):
+    """
+    Encola los recordatorios pendientes. Retorna {campo: cantidad encolada}.
+    """
+    ahora = ahora or timezone.now()
+    por_lote = por_lote or settings.RECORDATORIOS_POR_LOTE
+    plantilla = get_template('notificaciones/recordatorio_cita.txt')
+    enviados = {}
+
+    for campo, desde, hasta in ventanas_recordatorio(ahora):
+        enviados[campo] = 0
+        pendientes = citas_pendientes(campo, desde, hasta)
+        while True:
+            lote = list(pendientes[:por_lote])
+            if not lote:
+                break
+            with transaction.atomic():
+                encolar_varias([mensaje_recordatorio(plantilla, cita) for cita in lote])
+                # Sin señales: la marca no cambia la disponibilidad del doctor
+                Cita.objects.filter(pk__in=[cita.pk for cita in lote]).update(**{campo: timezone.now()})
+            enviados[campo] += len(lote)
+
+    return enviados
@@ -0,0 +1,251 @@
+"""
+Bandeja de salida de notificaciones
+
+Los servicios que necesitan avisar a alguien llaman a encolar() dentro de
+su propia transacción: la notificación queda guardada junto con el cambio
+que la origina y nunca se envía durante la petición web.
+
+El comando `procesar_notificaciones` ejecuta el ciclo:
+
+1. reclamar_lote(): toma hasta N filas pendientes cuyo disponible_desde ya
+   llegó. En PostgreSQL las selecciona con FOR UPDATE SKIP LOCKED; en todos
+   los motores las marca con un UPDATE condicionado a estado='pendiente',
+   de modo que dos trabajadores nunca reclaman la misma fila.
+2. enviar_lote(): reparte el lote entre varios hilos; cada hilo abre su
+   propia conexión del backend del canal. Los hilos no tocan la base de
+   datos; mientras envían, el hilo principal renueva reclamada_en del lote
+   cada tercio de NOTIFICACIONES_RECLAMO_SEGUNDOS (latido), así un lote
+   lento no vence mientras su trabajador sigue vivo.
+3. registrar_resultados(): un UPDATE para las enviadas; las fallidas
+   vuelven a pendiente con espera exponencial, o quedan como fallidas al
+   agotar los intentos. Solo se escriben las filas que siguen reclamadas
+   por el lote.
+
+Si un trabajador muere con un lote reclamado, sus filas vuelven a ser
+reclamables pasados NOTIFICACIONES_RECLAMO_SEGUNDOS sin latido. La entrega
+es al menos una vez: las notificaciones que alcanzaron a salir antes de que
+el trabajador muriera (o antes de que un latido se retrasara más que el
+plazo) se envían de nuevo.
+"""
+import random
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Min, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from agenda_medica import metricas
+from agenda_medica.basedatos import transaccion_inmediata
+from .backends import obtener_backend
+from .models import Notificacion
+
+
+def encolar(destinatario, cuerpo, asunto='', tipo='otro', canal='email', disponible_desde=None):
+    """Agrega una notificación a la bandeja de salida (un INSERT)"""
+    notificacion = Notificacion.objects.create(
+        canal=canal,
+        tipo=tipo,
+        destinatario=destinatario,
+        asunto=asunto[:200],
+        cuerpo=cuerpo,
+        disponible_desde=disponible_desde or timezone.now()
+    )
+    transaction.on_commit(lambda: metricas.notificaciones.inc(evento='encolada'))
+    return notificacion
+
+
+def encolar_varias(notificaciones):
+    """Agrega varias notificaciones (instancias sin guardar) en un solo INSERT"""
+    creadas = Notificacion.objects.bulk_create(notificaciones, batch_size=500)
+    transaction.on_commit(lambda: metricas.notificaciones.inc(len(creadas), evento='encolada'))
+    return creadas
+
+
+def encolar_cancelacion(cita):
+    """Avisa al paciente y al doctor que la cita fue cancelada"""
+    inicio = timezone.localtime(cita.fecha_hora_inicio)
+    asunto = f'Cita cancelada: {inicio:%d/%m/%Y} a las {inicio:%H:%M}'
+    destinatarios = [cita.paciente, cita.doctor.usuario]
+    return encolar_varias([
+        Notificacion(
+            tipo='cancelacion',
+            destinatario=usuario.email,
+            asunto=asunto,
+            cuerpo=render_to_string('notificaciones/cancelacion_cita.txt', {
+                'cita': cita,
+                'inicio': inicio,
+                'destinatario_nombre': usuario.get_full_name() or usuario.email,
+            })
+        )
+        for usuario in destinatarios
+    ])
+
+
+def _reclamables(ahora):
+    vencimiento = ahora - timedelta(seconds=settings.NOTIFICACIONES_RECLAMO_SEGUNDOS)
+    return (
+        Q(estado=Notificacion.ESTADO_PENDIENTE, disponible_desde__lte=ahora) |
+        Q(estado=Notificacion.ESTADO_PROCESANDO, reclamada_en__lt=vencimiento)
+    )
+
+
+def reclamar_lote(trabajador, cantidad):
+    """
+    Reclama hasta `cantidad` notificaciones para el trabajador.
+    Retorna (lote_id, [notificaciones]).
+    """
+    ahora = timezone.now()
+    lote_id = f'{trabajador}:{uuid.uuid4().hex[:12]}'
+    reclamables = _reclamables(ahora)
+
+    # Varios trabajadores leen y marcan las mismas filas
+    with transaccion_inmediata():
+        candidatas = Notificacion.objects.filter(reclamables).order_by('disponible_desde', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            candidatas = candidatas.select_for_update(skip_locked=True)
+        ids = list(candidatas.values_list('id', flat=True)[:cantidad])
+        if not ids:
+            return lote_id, []
+        # La condición se vuelve a evaluar al escribir: si otro trabajador
+        # tomó la fila entre la lectura y el UPDATE, aquí no se reclama
+        Notificacion.objects.filter(reclamables, id__in=ids).update(
+            estado=Notificacion.ESTADO_PROCESANDO,
+            reclamada_por=lote_id,
+            reclamada_en=ahora
+        )
+
+    return lote_id, list(Notificacion.objects.filter(
+        reclamada_por=lote_id,
+        estado=Notificacion.ESTADO_PROCESANDO
+    ))
+
+
+def _enviar_grupo(canal, notificaciones):
+    """Envía un grupo por una sola conexión; retorna [(notificacion, error o None)]"""
+    resultados = []
+    try:
+        with obtener_backend(canal) as backend:
+            for notificacion in notificaciones:
+                try:
+                    backend.enviar(notificacion)
+                except Exception as error:
+                    resultados.append((notificacion, error))
+                else:
+                    resultados.append((notificacion, None))
+    except Exception as error:
+        # Falló abrir o cerrar la conexión: las que no alcanzaron a salir fallan
+        procesadas = {notificacion.pk for notificacion, _ in resultados}
+        resultados.extend(
+            (notificacion, error) for notificacion in notificaciones
+            if notificacion.pk not in procesadas
+        )
+    return resultados
+
+
+def renovar_reclamo(lote_id):
+    """Latido: extiende el reclamo de las filas del lote que siguen en proceso"""
+    return Notificacion.objects.filter(
+        reclamada_por=lote_id,
+        estado=Notificacion.ESTADO_PROCESANDO
+    ).update(reclamada_en=timezone.now())
+
+
+def enviar_lote(notificaciones, hilos, lote_id=None):
+    """
+    Reparte el lote por canal y entre los hilos; retorna [(notificacion, error o None)].
+    Con `lote_id`, renueva el reclamo mientras los hilos envían.
+    """
+    por_canal = defaultdict(list)
+    for notificacion in notificaciones:
+        por_canal[notificacion.canal].append(notificacion)
+
+    grupos = []
+    for canal, del_canal in por_canal.items():
+        partes = min(hilos, len(del_canal))
+        grupos.extend((canal, del_canal[indice::partes]) for indice in range(partes))
+
+    latido = settings.NOTIFICACIONES_RECLAMO_SEGUNDOS / 3
+    resultados = []
+    with ThreadPoolExecutor(max_workers=max(hilos, 1)) as pool:
+        futuros = [pool.submit(_enviar_grupo, *grupo) for grupo in grupos]
+        pendientes = futuros
+        while pendientes:
+            _, pendientes = wait(pendientes, timeout=latido)
+            if pendientes and lote_id:
+                renovar_reclamo(lote_id)
+        for futuro in futuros:
+            resultados.extend(futuro.result())
+    return resultados
+
+
+def espera_reintento(intentos):
+    """Espera exponencial con variación aleatoria de ±20% antes del siguiente intento"""
+    segundos = min(
+        settings.NOTIFICACIONES_REINTENTO_BASE_SEGUNDOS * 2 ** max(intentos - 1, 0),
+        settings.NOTIFICACIONES_REINTENTO_MAX_SEGUNDOS
+    )
+    return timedelta(seconds=segundos * random.uniform(0.8, 1.2))
+
+
+def registrar_resultados(lote_id, resultados):
+    """Guarda el resultado del lote; retorna (enviadas, reintentos, fallidas)"""
+    ahora = timezone.now()
+    enviadas = [notificacion.pk for notificacion, error in resultados if error is None]
+    Notificacion.objects.filter(pk__in=enviadas, reclamada_por=lote_id).update(
+        estado=Notificacion.ESTADO_ENVIADA,
+        intentos=F('intentos') + 1,
+        fecha_envio=ahora,
+        ultimo_error=''
+    )
+
+    fallidas = [notificacion.pk for notificacion, error in resultados if error is not None]
+    # Si el reclamo venció y otro trabajador tomó la fila, el resultado es suyo
+    reclamadas = set(Notificacion.objects.filter(
+        pk__in=fallidas,
+        reclamada_por=lote_id,
+        estado=Notificacion.ESTADO_PROCESANDO
+    ).values_list('pk', flat=True)) if fallidas else set()
+
+    con_error = []
+    agotadas = 0
+    for notificacion, error in resultados:
+        if error is None or notificacion.pk not in reclamadas:
+            continue
+        notificacion.intentos += 1
+        notificacion.ultimo_error = f'{type(error).__name__}: {error}'[:1000]
+        if notificacion.intentos >= settings.NOTIFICACIONES_MAX_INTENTOS:
+            notificacion.estado = Notificacion.ESTADO_FALLIDA
+            agotadas += 1
+        else:
+            notificacion.estado = Notificacion.ESTADO_PENDIENTE
+            notificacion.disponible_desde = ahora + espera_reintento(notificacion.intentos)
+        con_error.append(notificacion)
+    Notificacion.objects.bulk_update(
+        con_error, ['estado', 'intentos', 'ultimo_error', 'disponible_desde'], batch_size=500
+    )
+
+    metricas.notificaciones.inc(len(enviadas), evento='enviada')
+    metricas.notificaciones.inc(len(con_error) - agotadas, evento='reintento')
+    metricas.notificaciones.inc(agotadas, evento='fallida')
+    return len(enviadas), len(con_error) - agotadas, agotadas
+
+
+def estado_cola():
+    """Cantidad por estado y retraso de la notificación pendiente más antigua"""
+    ahora = timezone.now()
+    por_estado = dict(
+        Notificacion.objects.values_list('estado').annotate(total=Count('id')).order_by()
+    )
+    mas_antigua = Notificacion.objects.filter(
+        estado=Notificacion.ESTADO_PENDIENTE,
+        disponible_desde__lte=ahora
+    ).aggregate(minimo=Min('disponible_desde'))['minimo']
+    return {
+        'por_estado': por_estado,
+        'retraso': (ahora - mas_antigua) if mas_antigua else timedelta(0),
+    }
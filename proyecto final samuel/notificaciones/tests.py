@@ -1,3 +1,201 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from agenda_medica import metricas
+from citas.models import Cita
+from doctores.models import Doctor, Especialidad
+from usuarios.models import Usuario
+from . import recordatorios, services
+from .models import Notificacion
+
+
+def crear_usuario(nombre, tipo_usuario='paciente'):
+    return Usuario.objects.create_user(
+        email=f'{nombre}@agenda.com', username=nombre,
+        first_name=nombre.capitalize(), last_name='Prueba', tipo_usuario=tipo_usuario
+    )
+
+
+@override_settings(RECORDATORIOS_POR_LOTE=2)
+class RecordatoriosTest(TestCase):
+    """Cada cita recibe cada recordatorio una sola vez, aunque falle un envío"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ahora = timezone.now().replace(microsecond=0)
+        cls.doctor = Doctor.objects.create(
+            usuario=crear_usuario('doctor', 'doctor'),
+            especialidad=Especialidad.objects.create(nombre='Medicina General'),
+            numero_licencia='LIC-doctor'
+        )
+        cls.citas = {}
+        # Horas hasta el inicio de cada cita
+        for horas in (0.5, 1.5, 3, 12, 24.5, 26):
+            inicio = cls.ahora + timedelta(hours=horas)
+            cls.citas[horas] = Cita.objects.create(
+                paciente=crear_usuario(f'paciente{len(cls.citas)}'), doctor=cls.doctor,
+                fecha_hora_inicio=inicio, fecha_hora_fin=inicio + timedelta(minutes=30)
+            )
+        Cita.objects.filter(pk=cls.citas[3].pk).update(estado='cancelada')
+
+    def destinatarios(self):
+        return sorted(Notificacion.objects.filter(tipo='recordatorio').values_list('destinatario', flat=True))
+
+    def correo(self, horas):
+        return self.citas[horas].paciente.email
+
+    def test_ventanas(self):
+        self.assertEqual(recordatorios.ventanas_recordatorio(self.ahora), [
+            ('recordatorio_24h_enviado', self.ahora + timedelta(hours=2), self.ahora + timedelta(hours=25)),
+            ('recordatorio_1h_enviado', self.ahora, self.ahora + timedelta(hours=2)),
+        ])
+
+    def test_encola_cada_recordatorio_una_vez(self):
+        enviados = recordatorios.enviar_recordatorios(self.ahora)
+
+        self.assertEqual(enviados, {'recordatorio_24h_enviado': 2, 'recordatorio_1h_enviado': 2})
+        self.assertEqual(self.destinatarios(), sorted(self.correo(horas) for horas in (0.5, 1.5, 12, 24.5)))
+
+        # Repetir la ejecución no duplica recordatorios
+        self.assertEqual(
+            recordatorios.enviar_recordatorios(self.ahora),
+            {'recordatorio_24h_enviado': 0, 'recordatorio_1h_enviado': 0}
+        )
+        self.assertEqual(Notificacion.objects.count(), 4)
+
+    def test_destinatario_rechazado_no_bloquea_a_los_demas(self):
+        # La primera cita de la ventana de 24 horas tiene un correo que el servidor rechaza
+        Usuario.objects.filter(pk=self.citas[12].paciente_id).update(email='falla@agenda.com')
+        recordatorios.enviar_recordatorios(self.ahora)
+
+        with mock.patch.object(services, 'obtener_backend', side_effect=lambda canal: BackendLento()):
+            lote_id, lote = services.reclamar_lote('a', 10)
+            services.registrar_resultados(lote_id, services.enviar_lote(lote, hilos=1, lote_id=lote_id))
+
+        self.assertEqual(
+            dict(Notificacion.objects.values_list('destinatario', 'estado')),
+            {
+                'falla@agenda.com': Notificacion.ESTADO_PENDIENTE,
+                **{self.correo(horas): Notificacion.ESTADO_ENVIADA for horas in (0.5, 1.5, 24.5)},
+            }
+        )
+        # La cita rechazada también quedó marcada: su reintento es cosa de la bandeja
+        self.assertIsNotNone(Cita.objects.get(pk=self.citas[12].pk).recordatorio_24h_enviado)
+
+
+class BackendLento:
+    """Backend de prueba que tarda en cada envío y falla con los destinatarios 'falla@...'"""
+
+    demora = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def enviar(self, notificacion):
+        time.sleep(self.demora)
+        if notificacion.destinatario.startswith('falla@'):
+            raise ConnectionError('rechazado')
+
+
+@override_settings(
+    NOTIFICACIONES_RECLAMO_SEGUNDOS=300,
+    NOTIFICACIONES_MAX_INTENTOS=3,
+    NOTIFICACIONES_REINTENTO_BASE_SEGUNDOS=30,
+    NOTIFICACIONES_REINTENTO_MAX_SEGUNDOS=100,
+)
+class BandejaSalidaTest(TestCase):
+    """Reclamo por lotes, reintentos con espera y recuperación de reclamos vencidos"""
+
+    def setUp(self):
+        self.notificaciones = [
+            services.encolar(f'{nombre}@agenda.com', 'Cuerpo', asunto='Aviso')
+            for nombre in ('uno', 'dos', 'tres', 'falla')
+        ]
+        parche = mock.patch.object(services, 'obtener_backend', side_effect=lambda canal: BackendLento())
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def estados(self):
+        return dict(Notificacion.objects.values_list('destinatario', 'estado'))
+
+    def test_reclamo_no_repite_filas(self):
+        lote_a, primeras = services.reclamar_lote('a', 3)
+        lote_b, resto = services.reclamar_lote('b', 3)
+
+        self.assertEqual(len(primeras), 3)
+        self.assertEqual(len(resto), 1)
+        self.assertFalse({n.pk for n in primeras} & {n.pk for n in resto})
+        self.assertEqual(services.reclamar_lote('c', 3)[1], [])
+        self.assertEqual(
+            Notificacion.objects.filter(reclamada_por=lote_a, estado=Notificacion.ESTADO_PROCESANDO).count(), 3
+        )
+
+    def test_no_reclama_antes_de_disponible_desde(self):
+        Notificacion.objects.update(disponible_desde=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(services.reclamar_lote('a', 10)[1], [])
+
+    def test_reintento_con_espera_exponencial_y_fallida_al_agotar(self):
+        for intento in range(1, 4):
+            Notificacion.objects.filter(destinatario='falla@agenda.com').update(disponible_desde=timezone.now())
+            lote_id, lote = services.reclamar_lote('a', 10)
+            antes = timezone.now()
+            services.registrar_resultados(lote_id, services.enviar_lote(lote, hilos=2, lote_id=lote_id))
+
+            fallida = Notificacion.objects.get(destinatario='falla@agenda.com')
+            self.assertEqual(fallida.intentos, intento)
+            self.assertIn('ConnectionError', fallida.ultimo_error)
+            if intento < 3:
+                self.assertEqual(fallida.estado, Notificacion.ESTADO_PENDIENTE)
+                espera = (fallida.disponible_desde - antes).total_seconds()
+                esperada = min(30 * 2 ** (intento - 1), 100)
+                self.assertTrue(esperada * 0.8 - 1 <= espera <= esperada * 1.2 + 1, espera)
+            else:
+                self.assertEqual(fallida.estado, Notificacion.ESTADO_FALLIDA)
+
+        self.assertEqual(
+            [estado for destinatario, estado in sorted(self.estados().items()) if destinatario != 'falla@agenda.com'],
+            [Notificacion.ESTADO_ENVIADA] * 3
+        )
+
+    def test_reclamo_vencido_vuelve_a_la_cola(self):
+        lote_a, lote = services.reclamar_lote('a', 10)
+        self.assertEqual(services.reclamar_lote('b', 10)[1], [])
+
+        # El trabajador 'a' murió hace más del plazo
+        Notificacion.objects.update(reclamada_en=timezone.now() - timedelta(seconds=301))
+        lote_b, recuperadas = services.reclamar_lote('b', 10)
+        self.assertEqual(len(recuperadas), 4)
+
+        # Si 'a' revive, sus resultados ya no escriben sobre las filas de 'b'
+        services.registrar_resultados(lote_a, [(notificacion, ConnectionError('tarde')) for notificacion in lote])
+        self.assertEqual(
+            Notificacion.objects.filter(reclamada_por=lote_b, estado=Notificacion.ESTADO_PROCESANDO, intentos=0).count(), 4
+        )
+
+    @override_settings(NOTIFICACIONES_RECLAMO_SEGUNDOS=0.3)
+    def test_latido_renueva_el_reclamo_de_un_lote_lento(self):
+        lote_id, lote = services.reclamar_lote('a', 10)
+        reclamada_en = Notificacion.objects.values_list('reclamada_en', flat=True).first()
+
+        with mock.patch.object(BackendLento, 'demora', 0.15), \
+                mock.patch.object(services, 'renovar_reclamo', wraps=services.renovar_reclamo) as renovar:
+            services.enviar_lote(lote, hilos=1, lote_id=lote_id)
+
+        self.assertGreater(renovar.call_count, 0)
+        self.assertGreater(Notificacion.objects.values_list('reclamada_en', flat=True).first(), reclamada_en)
+
+    def test_trabajador_vuelca_las_metricas_en_cada_vuelta(self):
+        with mock.patch.object(metricas.registro, 'volcar_si_corresponde') as volcar:
+            call_command('procesar_notificaciones', '--una-vez', '--hilos=1', stdout=StringIO())
+
+        self.assertTrue(volcar.called)
+        self.assertEqual(Notificacion.objects.filter(estado=Notificacion.ESTADO_ENVIADA).count(), 3)
@@ -0,0 +1,115 @@
+"""
+Búsqueda indexada de usuarios por nombre, apellido y email
+
+La búsqueda es la de siempre: el texto completo como subcadena de alguna de
+las tres columnas, sin distinguir mayúsculas (icontains).
+
+En SQLite se usa la tabla FTS5 `usuarios_usuario_fts` con el tokenizador
+trigram (contenido externo sobre usuarios_usuario, mantenida por triggers;
+ver la migración 0003), que resuelve subcadenas de 3 o más
+caracteres con el índice; los textos más cortos usan icontains. En
+PostgreSQL la búsqueda es un icontains respaldado por índices de trigramas.
+En cualquier otro caso, o si SQLite no tiene FTS5 con trigram, se usa
+icontains sin índice.
+
+SQLite reconstruye la tabla usuarios_usuario en muchas migraciones
+(AddField, AlterField...) y al hacerlo borra sus triggers; la señal
+post_migrate los vuelve a crear (ver restaurar_triggers).
+"""
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+TABLA_FTS = 'usuarios_usuario_fts'
+
+# El tokenizador trigram no encuentra textos más cortos
+MINIMO_CARACTERES_FTS = 3
+
+TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS usuarios_usuario_fts_ai AFTER INSERT ON usuarios_usuario BEGIN
+        INSERT INTO usuarios_usuario_fts(rowid, first_name, last_name, email)
+        VALUES (new.id, new.first_name, new.last_name, new.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS usuarios_usuario_fts_ad AFTER DELETE ON usuarios_usuario BEGIN
+        INSERT INTO usuarios_usuario_fts(usuarios_usuario_fts, rowid, first_name, last_name, email)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS usuarios_usuario_fts_au AFTER UPDATE OF first_name, last_name, email
+    ON usuarios_usuario BEGIN
+        INSERT INTO usuarios_usuario_fts(usuarios_usuario_fts, rowid, first_name, last_name, email)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email);
+        INSERT INTO usuarios_usuario_fts(rowid, first_name, last_name, email)
+        VALUES (new.id, new.first_name, new.last_name, new.email);
+    END
+    """,
+]
+
+_tablas_fts = {}
+
+
+def _tiene_tabla_fts(connection):
+    with connection.cursor() as cursor:
+        return TABLA_FTS in connection.introspection.table_names(cursor)
+
+
+def fts_disponible():
+    """Indica si la base de datos actual tiene la tabla FTS5 de usuarios"""
+    if connection.vendor != 'sqlite':
+        return False
+    clave = (connection.alias, str(connection.settings_dict['NAME']))
+    if clave not in _tablas_fts:
+        _tablas_fts[clave] = _tiene_tabla_fts(connection)
+    return _tablas_fts[clave]
+
+
+def restaurar_triggers(using='default', **kwargs):
+    """
+    Receptor de post_migrate: vuelve a crear los triggers de sincronización
+    si una migración reconstruyó usuarios_usuario. Los cambios hechos
+    mientras faltaban los triggers no llegaron al índice, así que en ese
+    caso también se reconstruye.
+    """
+    conexion = connections[using]
+    if conexion.vendor != 'sqlite' or not _tiene_tabla_fts(conexion):
+        return
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'usuarios_usuario' "
+            "AND name LIKE 'usuarios_usuario_fts_%'"
+        )
+        if cursor.fetchone()[0] == len(TRIGGERS):
+            return
+        for sentencia in TRIGGERS:
+            cursor.execute(sentencia)
+        cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+
+
+def consulta_fts(texto):
+    """
+    Convierte el texto en una frase FTS5, que con el tokenizador trigram
+    equivale a buscarlo como subcadena: 'ana g' -> '"ana g"'
+    """
+    return '"{}"'.format(texto.replace('"', '""'))
+
+
+def buscar_usuarios(usuarios, texto):
+    """Filtra el queryset de usuarios por el texto buscado"""
+    texto = texto.strip()
+    if not texto:
+        return usuarios
+
+    if len(texto) >= MINIMO_CARACTERES_FTS and fts_disponible():
+        return usuarios.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s', [consulta_fts(texto)]
+        ))
+
+    return usuarios.filter(
+        Q(first_name__icontains=texto) |
+        Q(last_name__icontains=texto) |
+        Q(email__icontains=texto)
+    )
@@ -0,0 +1,101 @@
+"""
+Índices de búsqueda de usuarios (ver usuarios/busqueda.py)
+
+- SQLite: tabla FTS5 de contenido externo con triggers de sincronización y
+  el tokenizador trigram, que busca el texto como subcadena, igual que
+  icontains. Si la compilación de SQLite no incluye FTS5 o trigram (existe
+  desde SQLite 3.34) la migración no hace nada y la búsqueda usa icontains.
+- PostgreSQL: índices GIN de trigramas sobre las expresiones que genera
+  icontains (UPPER(columna::text)).
+"""
+from django.db import migrations, OperationalError
+
+COLUMNAS = ('first_name', 'last_name', 'email')
+
+SQLITE_CREAR = [
+    """
+    CREATE VIRTUAL TABLE usuarios_usuario_fts USING fts5(
+        first_name, last_name, email,
+        content='usuarios_usuario', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER usuarios_usuario_fts_ai AFTER INSERT ON usuarios_usuario BEGIN
+        INSERT INTO usuarios_usuario_fts(rowid, first_name, last_name, email)
+        VALUES (new.id, new.first_name, new.last_name, new.email);
+    END
+    """,
+    """
+    CREATE TRIGGER usuarios_usuario_fts_ad AFTER DELETE ON usuarios_usuario BEGIN
+        INSERT INTO usuarios_usuario_fts(usuarios_usuario_fts, rowid, first_name, last_name, email)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email);
+    END
+    """,
+    # Solo los cambios en las columnas indexadas (no last_login) tocan el índice
+    """
+    CREATE TRIGGER usuarios_usuario_fts_au AFTER UPDATE OF first_name, last_name, email
+    ON usuarios_usuario BEGIN
+        INSERT INTO usuarios_usuario_fts(usuarios_usuario_fts, rowid, first_name, last_name, email)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email);
+        INSERT INTO usuarios_usuario_fts(rowid, first_name, last_name, email)
+        VALUES (new.id, new.first_name, new.last_name, new.email);
+    END
+    """,
+    "INSERT INTO usuarios_usuario_fts(usuarios_usuario_fts) VALUES ('rebuild')",
+]
+
+SQLITE_ELIMINAR = [
+    'DROP TRIGGER IF EXISTS usuarios_usuario_fts_ai',
+    'DROP TRIGGER IF EXISTS usuarios_usuario_fts_ad',
+    'DROP TRIGGER IF EXISTS usuarios_usuario_fts_au',
+    'DROP TABLE IF EXISTS usuarios_usuario_fts',
+]
+
+POSTGRESQL_CREAR = ['CREATE EXTENSION IF NOT EXISTS pg_trgm'] + [
+    f'CREATE INDEX IF NOT EXISTS usuario_{columna}_trgm_idx ON usuarios_usuario '
+    f'USING gin ((UPPER({columna}::text)) gin_trgm_ops)'
+    for columna in COLUMNAS
+]
+
+POSTGRESQL_ELIMINAR = [
+    f'DROP INDEX IF EXISTS usuario_{columna}_trgm_idx' for columna in COLUMNAS
+]
+
+
+def _ejecutar(schema_editor, sentencias):
+    for sentencia in sentencias:
+        schema_editor.execute(sentencia)
+
+
+def crear_indices_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            try:
+                cursor.execute("CREATE VIRTUAL TABLE temp.prueba_fts5 USING fts5(texto, tokenize='trigram')")
+                cursor.execute('DROP TABLE temp.prueba_fts5')
+            except OperationalError:
+                return
+        _ejecutar(schema_editor, SQLITE_CREAR)
+    elif vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRESQL_CREAR)
+
+
+def eliminar_indices_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _ejecutar(schema_editor, SQLITE_ELIMINAR)
+    elif vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRESQL_ELIMINAR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0002_remove_usuario_email_verificado_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices_busqueda, eliminar_indices_busqueda),
+    ]
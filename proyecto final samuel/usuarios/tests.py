@@ -1,3 +1,94 @@
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
 
-# Create your tests here.
+from .busqueda import TABLA_FTS, buscar_usuarios, fts_disponible, restaurar_triggers
+from .models import Usuario
+
+
+def triggers_busqueda():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'usuarios_usuario' ORDER BY name"
+        )
+        return [nombre for nombre, in cursor.fetchall()]
+
+
+class BusquedaUsuariosTest(TestCase):
+    """La búsqueda indexada devuelve lo mismo que icontains sobre nombre, apellido y email"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for nombre, apellido, email in [
+            ('Ana', 'Gonzalez', 'ana.gonzalez@agenda.com'),
+            ('Mariana', 'Ruiz', 'mruiz@correo.com'),
+            ('Pedro', 'Anaya', 'pedro@agenda.com'),
+            ('Luis', 'Pérez', 'lperez@correo.com'),
+        ]:
+            Usuario.objects.create_user(
+                email=email, username=email.split('@')[0],
+                first_name=nombre, last_name=apellido, tipo_usuario='paciente'
+            )
+
+    def buscar(self, texto):
+        return sorted(buscar_usuarios(Usuario.objects.all(), texto).values_list('first_name', flat=True))
+
+    def test_busca_subcadenas_como_icontains(self):
+        if connection.vendor == 'sqlite':
+            self.assertTrue(fts_disponible())
+        casos = ['ana', 'ANA', 'onza', 'iana', '@agenda', 'correo.com', 'ana g', 'ez', 'é', 'nadie']
+        for texto in casos:
+            with self.subTest(texto=texto):
+                esperados = sorted(
+                    Usuario.objects.filter(first_name__icontains=texto).union(
+                        Usuario.objects.filter(last_name__icontains=texto),
+                        Usuario.objects.filter(email__icontains=texto),
+                    ).values_list('first_name', flat=True)
+                )
+                self.assertEqual(self.buscar(texto), esperados)
+        self.assertEqual(self.buscar('ana'), ['Ana', 'Mariana', 'Pedro'])
+
+    def test_indice_sigue_los_cambios(self):
+        usuario = Usuario.objects.get(first_name='Luis')
+        usuario.last_name = 'Quintero'
+        usuario.save()
+        self.assertEqual(self.buscar('quinter'), ['Luis'])
+        self.assertEqual(self.buscar('Pérez'), [])
+
+        usuario.delete()
+        self.assertEqual(self.buscar('luis'), [])
+
+
+class TriggersBusquedaTest(TestCase):
+    """Una reconstrucción de usuarios_usuario no deja el índice desactualizado"""
+
+    def setUp(self):
+        if not fts_disponible():
+            self.skipTest('La base de datos no tiene la tabla FTS5 de usuarios')
+
+    def test_migraciones_dejan_los_triggers(self):
+        self.assertEqual(triggers_busqueda(), [f'{TABLA_FTS}_ad', f'{TABLA_FTS}_ai', f'{TABLA_FTS}_au'])
+
+    def test_post_migrate_restaura_triggers_y_reconstruye(self):
+        with connection.cursor() as cursor:
+            for sufijo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER {TABLA_FTS}_{sufijo}')
+        # Un usuario creado sin triggers no llega al índice
+        Usuario.objects.create_user(
+            email='tardio@agenda.com', username='tardio',
+            first_name='Tardío', last_name='Sinindice', tipo_usuario='paciente'
+        )
+
+        restaurar_triggers(using=connection.alias)
+
+        self.assertEqual(len(triggers_busqueda()), 3)
+        self.assertEqual(
+            list(buscar_usuarios(Usuario.objects.all(), 'sinindice').values_list('username', flat=True)),
+            ['tardio']
+        )
+
+    def test_migrate_conecta_el_receptor(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {TABLA_FTS}_au')
+        call_command('migrate', verbosity=0)
+        self.assertEqual(len(triggers_busqueda()), 3)